@@ -1,15 +1,75 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import logging
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from langchain_core.runnables import RunnableBinding
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
 from routes.routes import router
 from services.mognodb_service import MongoDBService
 from config import Config
 from graph.graph_builder import GraphBuilder
+from graph.agents import analytics_agent, validation_agent
+from graph.checkpointer import create_checkpointer
+from graph.intent_router import IntentClassifier
+from graph.llm import get_config, get_gateway, get_llm, provider_url
+from graph.query_templates import match_template
+from graph.result_renderer import ResultRenderer
+from services.conversation_service import GRAPH_NODES
+from services.approximate import ApproximateExecutor
+from services.columnar_engine import load_columnar_engine
+from services.single_flight import SingleFlight
+from services import tracing
+
+# Time spent importing the app and its dependencies, a floor on how fast a worker can start.
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(config: Config, mongo_client: MongoDBService) -> dict:
+    """
+    Opens the MongoDB and LLM provider connections and builds the models, chains and indexes
+    that the first requests would otherwise pay for.
+
+    :return: Whether MongoDB is reachable and the time each step took, in milliseconds.
+    """
+    timings = {"import_ms": IMPORT_SECONDS * 1000}
+
+    started = time.perf_counter()
+    mongo_ready = await mongo_client.warm_up()
+    timings["mongo_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    get_llm()
+    url = provider_url(config)
+    if url:
+        await get_gateway().warm_up(url)
+    timings["llm_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    analytics_agent.get_prompt_assembler()
+    analytics_agent.get_write_query_chain()
+    validation_agent.get_prompt_assembler()
+    validation_agent.get_validation_chain()
+    resolver = analytics_agent.get_entity_resolver()
+    if resolver is not None:
+        await resolver.resolve("office supplies")
+    match_template("Total number of orders in 2013")
+    timings["caches_ms"] = (time.perf_counter() - started) * 1000
+
+    logger.info(f"Warm-up finished: MongoDB reachable: {mongo_ready}, timings: {timings}")
+    return {"mongo": mongo_ready, "timings": timings}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    config = Config()
+    config = get_config()
     mongo_client = MongoDBService(
         host=config.mongodb.HOST,
         port=config.mongodb.PORT,
@@ -17,11 +77,73 @@ async def lifespan(app: FastAPI):
         password=config.mongodb.PASSWORD,
         db_name=config.mongodb.DB_NAME,
         orders_collection="Orders",
+        max_time_ms=config.query_guardrails.MAX_TIME_MS,
+        default_limit=config.query_guardrails.DEFAULT_LIMIT,
+        allow_disk_use=config.query_guardrails.ALLOW_DISK_USE,
+        explain_before_run=config.query_guardrails.EXPLAIN_BEFORE_RUN,
+        max_docs_examined=config.query_guardrails.MAX_DOCS_EXAMINED,
+        profile_sample_rate=(
+            config.query_profiling.SAMPLE_RATE
+            if config.query_profiling.ENABLED
+            else None
+        ),
+        min_pool_size=config.mongodb.MIN_POOL_SIZE,
     )
-    graph_builder = GraphBuilder(mongo_client)
+    app.state.mongo_client = mongo_client
+    app.state.ready = False
+    warm_up_result = await warm_up(config, mongo_client)
+    checkpointer = await create_checkpointer(
+        config.checkpointer, mongo_client.db, workers=config.serving.WORKERS
+    )
+    intent_classifier = (
+        IntentClassifier(min_confidence=config.intent_router.MIN_CONFIDENCE)
+        if config.intent_router.ENABLED
+        else None
+    )
+    result_renderer = (
+        ResultRenderer(
+            max_rows=config.result_rendering.MAX_ROWS,
+            summary_rows=config.result_rendering.SUMMARY_ROWS,
+        )
+        if config.result_rendering.ENABLED
+        else None
+    )
+    approximate_executor = (
+        ApproximateExecutor(
+            mongo_client,
+            mode=config.approximate_queries.MODE,
+            sample_size=config.approximate_queries.SAMPLE_SIZE,
+            sample_collection=config.approximate_queries.SAMPLE_COLLECTION or None,
+        )
+        if config.approximate_queries.MODE != "off"
+        else None
+    )
+    columnar_engine = await load_columnar_engine(
+        config.columnar.SOURCE, mongo_client, config.columnar.PARQUET_PATH
+    )
+    graph_builder = GraphBuilder(
+        mongo_client,
+        checkpointer,
+        intent_classifier,
+        execution_flight=SingleFlight() if config.coalescing.ENABLED else None,
+        max_repair_attempts=config.repair.MAX_ATTEMPTS,
+        result_renderer=result_renderer,
+        approximate_executor=approximate_executor,
+        columnar_engine=columnar_engine,
+    )
+    # Shared by all requests so that identical questions of new threads are answered once.
+    app.state.question_flight = SingleFlight() if config.coalescing.ENABLED else None
     graph = await graph_builder.initialize_graph()
+    if config.tracing.ENABLED:
+        tracing.configure(config.tracing.EVENT_SAMPLE_RATE)
+        # Bound rather than `with_config`: the compiled graph lets the callbacks of a call, such as
+        # the event handler of `astream_events`, replace its own instead of adding to them.
+        graph = RunnableBinding(bound=graph, config={"callbacks": [tracing.TracingHandler(GRAPH_NODES)]})
     app.state.graph = graph
+    app.state.startup = warm_up_result["timings"]
+    app.state.ready = True
     yield
+    app.state.ready = False
     await mongo_client.close_connection()
 
 
@@ -43,3 +165,32 @@ app.include_router(router)
 @app.get("/")
 async def health_check():
     return "Welcome to the Procurement Chatbot Assistant!"
+
+
+@app.get("/metrics")
+async def metrics():
+    # Under gunicorn each worker writes its metrics to PROMETHEUS_MULTIPROC_DIR, so that any of
+    # them can report the totals of all the workers.
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Answers 200 once the worker finished warming up and while MongoDB is reachable, 503
+    otherwise, so that load balancers only route requests to warm workers.
+    """
+    mongo_client = getattr(app.state, "mongo_client", None)
+    checks = {
+        "warm": getattr(app.state, "ready", False),
+        "mongo": mongo_client is not None and await mongo_client.ping(),
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        {"ready": ready, "checks": checks, "startup": getattr(app.state, "startup", None)},
+        status_code=200 if ready else 503,
+    )
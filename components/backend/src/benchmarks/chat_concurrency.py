@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import statistics
+import time
+from uuid import uuid4
+import httpx
+
+
+async def send_chat(client: httpx.AsyncClient, url: str, message: str) -> float:
+    """
+    Sends one chat request on a fresh thread and returns its latency in seconds.
+    """
+    payload = {"user_message": message, "thread_id": str(uuid4())}
+    started = time.perf_counter()
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the latency of one /bot/v1/chat request with N simultaneous ones."
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--message", default="Total number of orders created during Q1 of 2013."
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    url = f"{args.base_url}/bot/v1/chat"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        single = await send_chat(client, url, args.message)
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(
+            *[send_chat(client, url, args.message) for _ in range(args.concurrency)]
+        )
+        wall_time = time.perf_counter() - started
+
+    print(f"Single request:            {single:.2f}s")
+    print(f"{args.concurrency} concurrent requests:    {wall_time:.2f}s wall time")
+    print(f"  median request latency:  {statistics.median(latencies):.2f}s")
+    print(f"  slowest request latency: {max(latencies):.2f}s")
+    print(f"Wall time / single:        {wall_time / single:.2f}x (1.0x means fully concurrent)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
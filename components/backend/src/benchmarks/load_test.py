@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+from uuid import uuid4
+import httpx
+from services.instrumentation import NodeTimer, latency_summary
+
+DEFAULT_QUESTIONS = [
+    "Total number of orders created during Q1 of 2013.",
+    "Find the top 3 most frequently ordered line items in 2013, including their order count",
+    "Total spending grouped by acquisition type in 2013",
+    "Which supplier received the most money in 2014?",
+    "How many orders did the Department of Corrections place in 2013?",
+    "Hello!",
+]
+
+
+async def run_load(
+    send: Callable[[str], Awaitable[None]], questions: List[str], rps: float, duration: float
+) -> Dict[str, object]:
+    """
+    Sends requests at a fixed rate for `duration` seconds, independently of how fast they are
+    answered, and waits for all of them to finish.
+
+    :return: The latencies of the successful requests in milliseconds, the errors and the
+        elapsed time in seconds.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def timed(question: str):
+        started = time.perf_counter()
+        try:
+            await send(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            errors.append(repr(e))
+
+    tasks = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        tasks.append(asyncio.create_task(timed(questions[len(tasks) % len(questions)])))
+        await asyncio.sleep(max(started + len(tasks) / rps - time.perf_counter(), 0))
+    await asyncio.gather(*tasks)
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def print_report(result: Dict[str, object], node_summary: Dict[str, Dict[str, float]], rps: float):
+    latencies, errors, elapsed = result["latencies"], result["errors"], result["elapsed"]
+    overall = latency_summary(latencies)
+    print(f"Target rate:      {rps:.1f} req/s")
+    print(f"Requests:         {len(latencies) + len(errors)} ({len(errors)} failed)")
+    print(f"Throughput:       {len(latencies) / elapsed:.2f} req/s over {elapsed:.1f}s")
+    print(
+        f"Request latency:  p50 {overall['p50']:.0f}ms  p95 {overall['p95']:.0f}ms  "
+        f"p99 {overall['p99']:.0f}ms"
+    )
+    if errors:
+        print(f"First error:      {errors[0]}")
+    if node_summary:
+        print()
+        print(f"{'Node':<20}{'runs':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for node, stats in node_summary.items():
+            print(
+                f"{node:<20}{stats['count']:>8}{stats['errors']:>8}"
+                f"{stats['p50']:>10.0f}{stats['p95']:>10.0f}{stats['p99']:>10.0f}"
+            )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Drive /bot/v1/chat at a target request rate and report throughput and latency "
+            "percentiles. Without --base-url the app runs in-process, by default on the offline "
+            "fake LLM, and the latency of each graph node is reported too."
+        )
+    )
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--questions", help="JSON file with a list of questions")
+    parser.add_argument("--base-url", help="Load test a running server instead")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as questions_file:
+            questions = json.load(questions_file)
+
+    timer = None
+    if args.base_url:
+        transport, base_url, lifespan = None, args.base_url, None
+    else:
+        os.environ.setdefault("MODEL_PROVIDER", "fake")
+        from app import app
+        from services.conversation_service import GRAPH_NODES
+
+        transport, base_url = httpx.ASGITransport(app=app), "http://load-test"
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        timer = NodeTimer(GRAPH_NODES)
+        app.state.graph = app.state.graph.with_config(callbacks=[timer])
+
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=args.timeout
+        ) as client:
+
+            async def send(question: str):
+                response = await client.post(
+                    "/bot/v1/chat", json={"user_message": question, "thread_id": str(uuid4())}
+                )
+                response.raise_for_status()
+
+            result = await run_load(send, questions, args.rps, args.duration)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    node_summary = timer.summary() if timer else {}
+    print_report(result, node_summary, args.rps)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(
+                {
+                    "rps": args.rps,
+                    "elapsed": result["elapsed"],
+                    "errors": len(result["errors"]),
+                    "latency": latency_summary(result["latencies"]),
+                    "nodes": node_summary,
+                },
+                output_file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+from uuid import uuid4
+import httpx
+from services.instrumentation import latency_summary
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONVERSATION = [
+    "Total number of orders created during Q1 of 2013.",
+    "And during Q2 of 2013?",
+]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"The server was not ready after {timeout:.0f}s")
+
+
+async def drive(
+    client: httpx.AsyncClient, concurrency: int, duration: float
+) -> Dict[str, object]:
+    """
+    Runs `concurrency` users, each holding multi-turn conversations back to back for `duration`
+    seconds. The turns of a thread can land on any worker, so they only succeed if the
+    conversation state is shared.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            thread_id = str(uuid4())
+            for message in CONVERSATION:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/bot/v1/chat", json={"user_message": message, "thread_id": thread_id}
+                    )
+                    response.raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except httpx.HTTPError as e:
+                    errors.append(repr(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+async def measure(workers: int, args) -> Dict[str, object]:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "CHECKPOINTER_BACKEND": "mongo",
+    }
+    env.setdefault("MODEL_PROVIDER", "fake")
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app:app",
+            "--workers", str(workers), "--port", str(args.port), "--log-level", "warning",
+        ],
+        cwd=SRC_DIR,
+        env=env,
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_until_ready(client, args.startup_timeout)
+            return await drive(client, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the /bot/v1/chat throughput of 1 to N workers on this host, sharing the "
+            "conversation state through the MongoDB checkpointer. Uses the offline fake LLM "
+            "unless MODEL_PROVIDER is set, and needs the local MongoDB."
+        )
+    )
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        result = await measure(workers, args)
+        throughput = len(result["latencies"]) / result["elapsed"]
+        baseline = baseline or throughput
+        summary = latency_summary(result["latencies"])
+        print(
+            f"{workers:>8}{throughput:>10.2f}{throughput / baseline:>8.2f}x"
+            f"{summary['p50']:>9.0f}{summary['p95']:>9.0f}{len(result['errors']):>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
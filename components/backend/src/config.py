@@ -20,6 +20,202 @@ class MongoDB(BaseSettings):
     USERNAME: str = Field(default="root", alias="MONGO_USERNAME")
     PASSWORD: str = Field(default="password", alias="MONGO_PASSWORD")
     DB_NAME: str = Field(default="procurementDB", alias="MONGO_DB_NAME")
+    MIN_POOL_SIZE: int = Field(default=5, alias="MONGO_MIN_POOL_SIZE")
+
+
+class QueryGuardrails(BaseSettings):
+    """
+    Server-side limits applied to generated aggregation pipelines.
+    """
+
+    MAX_TIME_MS: int = Field(default=30000, alias="QUERY_MAX_TIME_MS")
+    DEFAULT_LIMIT: int = Field(default=1000, alias="QUERY_DEFAULT_LIMIT")
+    ALLOW_DISK_USE: bool = Field(default=False, alias="QUERY_ALLOW_DISK_USE")
+    EXPLAIN_BEFORE_RUN: bool = Field(default=False, alias="QUERY_EXPLAIN_BEFORE_RUN")
+    MAX_DOCS_EXAMINED: int = Field(default=2000000, alias="QUERY_MAX_DOCS_EXAMINED")
+
+
+class QueryProfiling(BaseSettings):
+    """
+    Explain-plan capture for executed pipelines, consumed by `index_advisor.py`.
+    """
+
+    ENABLED: bool = Field(default=False, alias="QUERY_PROFILING_ENABLED")
+    SAMPLE_RATE: float = Field(default=0.1, alias="QUERY_PROFILING_SAMPLE_RATE")
+    SLOW_MS: float = Field(default=500.0, alias="QUERY_PROFILING_SLOW_MS")
+
+
+class Checkpointer(BaseSettings):
+    """
+    Storage of the conversation state. `mongo` persists threads, `memory` keeps them in-process.
+    """
+
+    BACKEND: str = Field(default="mongo", alias="CHECKPOINTER_BACKEND")
+    TTL_SECONDS: int = Field(default=7 * 24 * 3600, alias="CHECKPOINTER_TTL_SECONDS")
+    MAX_CHECKPOINTS_PER_THREAD: int = Field(
+        default=20, alias="CHECKPOINTER_MAX_CHECKPOINTS_PER_THREAD"
+    )
+    COMPRESS_THRESHOLD_BYTES: int = Field(
+        default=4096, alias="CHECKPOINTER_COMPRESS_THRESHOLD_BYTES"
+    )
+
+
+class Serving(BaseSettings):
+    """
+    Server processes, set by the gunicorn configuration.
+    """
+
+    WORKERS: int = Field(default=1, alias="WEB_CONCURRENCY")
+
+
+class Context(BaseSettings):
+    """
+    Conversation history sent to the agents' LLM calls.
+    """
+
+    MAX_EXCHANGES: int = Field(default=3, alias="CONTEXT_MAX_EXCHANGES")
+    MAX_TOKENS: int = Field(default=6000, alias="CONTEXT_MAX_TOKENS")
+
+
+class IntentRouter(BaseSettings):
+    """
+    Local intent classification of new turns ahead of the Greeting_Agent.
+    """
+
+    ENABLED: bool = Field(default=True, alias="INTENT_ROUTER_ENABLED")
+    MIN_CONFIDENCE: float = Field(default=0.6, alias="INTENT_ROUTER_MIN_CONFIDENCE")
+
+
+class QueryTemplates(BaseSettings):
+    """
+    Canonical pipelines filled locally for common question shapes instead of generated by the LLM.
+    """
+
+    ENABLED: bool = Field(default=True, alias="QUERY_TEMPLATES_ENABLED")
+
+
+class PromptAssembly(BaseSettings):
+    """
+    Retrieval of the few-shot examples and schema sections sent to the query generator.
+    """
+
+    FEW_SHOT_K: int = Field(default=3, alias="PROMPT_FEW_SHOT_K")
+    SCHEMA_SECTIONS_K: int = Field(default=6, alias="PROMPT_SCHEMA_SECTIONS_K")
+
+
+class EntityResolution(BaseSettings):
+    """
+    Resolution of the names mentioned in questions against the ETL's vector index.
+    """
+
+    ENABLED: bool = Field(default=True, alias="ENTITY_RESOLUTION_ENABLED")
+    INDEX_PATH: str = Field(default="", alias="ENTITY_INDEX_PATH")
+    EMBEDDING_MODEL: str = Field(
+        default="sentence-transformers/all-mpnet-base-v2", alias="EMBEDDING_EMBEDDING_MODEL"
+    )
+    MIN_SCORE: float = Field(default=0.8, alias="ENTITY_RESOLUTION_MIN_SCORE")
+    SEARCH_MAX_BATCH_SIZE: int = Field(default=256, alias="VECTOR_SEARCH_MAX_BATCH_SIZE")
+    SEARCH_MAX_WAIT_MS: float = Field(default=2.0, alias="VECTOR_SEARCH_MAX_WAIT_MS")
+    EMBEDDING_CACHE_SIZE: int = Field(default=4096, alias="VECTOR_SEARCH_EMBEDDING_CACHE_SIZE")
+
+
+class Repair(BaseSettings):
+    """
+    Bounded repair of invalid or failing pipelines.
+    """
+
+    MAX_ATTEMPTS: int = Field(default=2, alias="REPAIR_MAX_ATTEMPTS")
+
+
+class ResultRendering(BaseSettings):
+    """
+    Local rendering of query results, answering without the Analytics_Agent's formatting call.
+    """
+
+    ENABLED: bool = Field(default=True, alias="RESULT_RENDERING_ENABLED")
+    MAX_ROWS: int = Field(default=20, alias="RESULT_RENDERING_MAX_ROWS")
+    SUMMARY_ROWS: int = Field(default=5, alias="RESULT_RENDERING_SUMMARY_ROWS")
+
+
+class ApproximateQueries(BaseSettings):
+    """
+    Estimation of eligible queries from a sample of the orders.
+    """
+
+    MODE: str = Field(default="on_request", alias="APPROXIMATE_MODE")
+    SAMPLE_SIZE: int = Field(default=20000, alias="APPROXIMATE_SAMPLE_SIZE")
+    SAMPLE_COLLECTION: str = Field(default="", alias="APPROXIMATE_SAMPLE_COLLECTION")
+
+
+class Columnar(BaseSettings):
+    """
+    In-memory columnar snapshot of the line items answering the common aggregations.
+    """
+
+    SOURCE: str = Field(default="off", alias="COLUMNAR_SOURCE")
+    PARQUET_PATH: str = Field(default="", alias="COLUMNAR_PARQUET_PATH")
+
+
+class Export(BaseSettings):
+    """
+    Streaming exports of the complete results of a thread's last query.
+    """
+
+    BATCH_SIZE: int = Field(default=1000, alias="EXPORT_BATCH_SIZE")
+    MAX_TIME_MS: int = Field(default=300000, alias="EXPORT_MAX_TIME_MS")
+
+
+class StructuredResponses(BaseSettings):
+    """
+    Query results included in chat responses that ask for them.
+    """
+
+    MAX_ROWS: int = Field(default=1000, alias="RESPONSE_MAX_ROWS")
+
+
+class Coalescing(BaseSettings):
+    """
+    Sharing of in-flight computations between identical concurrent requests.
+    """
+
+    ENABLED: bool = Field(default=True, alias="COALESCING_ENABLED")
+
+
+class Tracing(BaseSettings):
+    """
+    Spans of the graph nodes, LLM and tool calls and MongoDB aggregations.
+    """
+
+    ENABLED: bool = Field(default=True, alias="TRACING_ENABLED")
+    EVENT_SAMPLE_RATE: float = Field(default=0.1, alias="TRACING_EVENT_SAMPLE_RATE")
+
+
+class Batch(BaseSettings):
+    """
+    Limits of the batch chat endpoint.
+    """
+
+    MAX_CONCURRENCY: int = Field(default=8, alias="BATCH_MAX_CONCURRENCY")
+    MAX_ITEMS: int = Field(default=100, alias="BATCH_MAX_ITEMS")
+
+
+class LLMGateway(BaseSettings):
+    """
+    Connection pool, concurrency and rate limits, and retries of the LLM provider calls. The
+    concurrency and rate limits are shared by the server's workers.
+    """
+
+    MAX_CONCURRENCY: int = Field(default=16, alias="LLM_MAX_CONCURRENCY")
+    MAX_CONCURRENCY_PER_MODEL: int = Field(default=8, alias="LLM_MAX_CONCURRENCY_PER_MODEL")
+    REQUESTS_PER_SECOND: float = Field(default=5.0, alias="LLM_REQUESTS_PER_SECOND")
+    BURST: int = Field(default=10, alias="LLM_BURST")
+    MAX_RETRIES: int = Field(default=4, alias="LLM_MAX_RETRIES")
+    BACKOFF_BASE_SECONDS: float = Field(default=0.5, alias="LLM_BACKOFF_BASE_SECONDS")
+    BACKOFF_MAX_SECONDS: float = Field(default=20.0, alias="LLM_BACKOFF_MAX_SECONDS")
+    MAX_CONNECTIONS: int = Field(default=50, alias="LLM_MAX_CONNECTIONS")
+    MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, alias="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    KEEPALIVE_EXPIRY_SECONDS: float = Field(default=60.0, alias="LLM_KEEPALIVE_EXPIRY_SECONDS")
+    TIMEOUT_SECONDS: float = Field(default=60.0, alias="LLM_TIMEOUT_SECONDS")
 
 
 class AzureLLMConfig(BaseSettings):
@@ -39,8 +235,38 @@ class OpenAILLMConfig(BaseSettings):
     API_KEY: str = Field(default="", alias="OPENAI_API_KEY")
 
 
+class FakeLLMConfig(BaseSettings):
+    """
+    Offline stand-in for the provider, selected with `MODEL_PROVIDER=fake` for benchmarks.
+    """
+
+    LATENCY_MS: float = Field(default=300.0, alias="FAKE_LLM_LATENCY_MS")
+    JITTER_MS: float = Field(default=100.0, alias="FAKE_LLM_JITTER_MS")
+    SCRIPT_PATH: str = Field(default="", alias="FAKE_LLM_SCRIPT_PATH")
+
+
 class Config(BaseSettings):
     project: Project = Field(default_factory=Project)
     mongodb: MongoDB = Field(default_factory=MongoDB)
+    query_guardrails: QueryGuardrails = Field(default_factory=QueryGuardrails)
+    query_profiling: QueryProfiling = Field(default_factory=QueryProfiling)
+    checkpointer: Checkpointer = Field(default_factory=Checkpointer)
+    serving: Serving = Field(default_factory=Serving)
+    context: Context = Field(default_factory=Context)
+    prompt_assembly: PromptAssembly = Field(default_factory=PromptAssembly)
+    query_templates: QueryTemplates = Field(default_factory=QueryTemplates)
+    entity_resolution: EntityResolution = Field(default_factory=EntityResolution)
+    repair: Repair = Field(default_factory=Repair)
+    result_rendering: ResultRendering = Field(default_factory=ResultRendering)
+    approximate_queries: ApproximateQueries = Field(default_factory=ApproximateQueries)
+    columnar: Columnar = Field(default_factory=Columnar)
+    export: Export = Field(default_factory=Export)
+    structured_responses: StructuredResponses = Field(default_factory=StructuredResponses)
+    batch: Batch = Field(default_factory=Batch)
+    coalescing: Coalescing = Field(default_factory=Coalescing)
+    tracing: Tracing = Field(default_factory=Tracing)
+    intent_router: IntentRouter = Field(default_factory=IntentRouter)
+    llm_gateway: LLMGateway = Field(default_factory=LLMGateway)
     openai_llm: OpenAILLMConfig = Field(default_factory=OpenAILLMConfig)
     azure_llm: AzureLLMConfig = Field(default_factory=AzureLLMConfig)
+    fake_llm: FakeLLMConfig = Field(default_factory=FakeLLMConfig)
@@ -1,10 +1,22 @@
 from graph.graph_state import AgentState
 from langchain_core.messages import HumanMessage
 from graph.graph_builder import GraphBuilder
+from graph.intent_router import IntentClassifier
+from graph.result_renderer import ResultRenderer
+from services.instrumentation import RunStats, RunStatsHandler, current_run_stats, latency_summary
+from services.approximate import ApproximateExecutor
+from services.columnar_engine import load_columnar_engine
 from services.mognodb_service import MongoDBService
 from config import Config
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+import argparse
 import asyncio
+import json
 import logging
+import statistics
+import sys
+import time
 
 
 EXPECTED_RESULTS = {
@@ -18,49 +30,215 @@ EXPECTED_RESULTS = {
 }
 
 
-async def get_query_result(query: str, graph):
+def load_question_set(path: str) -> Dict[str, Optional[List[Dict[str, Any]]]]:
     """
-    Execute the query and return the predicted results.
+    Loads questions from a JSON file, either an object mapping each question to its expected
+    results or a list of questions, or of `{"question": ..., "expected": ...}` objects.
+    Questions without expected results are timed but not scored.
+    """
+    with open(path, "r", encoding="utf-8") as questions_file:
+        data = json.load(questions_file)
+    if isinstance(data, dict):
+        return data
+    questions = {}
+    for item in data:
+        if isinstance(item, str):
+            questions[item] = None
+        else:
+            questions[item["question"]] = item.get("expected")
+    return questions
+
+
+async def get_query_result(query: str, graph, thread_id: str = "test_thread_id"):
+    """
+    Execute the query and return the final state.
     """
     state = await graph.ainvoke(
         {"messages": [HumanMessage(content=query, name="User")]},
-        {"configurable": {"thread_id": "test_thread_id"}}
+        {"configurable": {"thread_id": thread_id}}
     )
 
-    query_result = state.get("query_result")
-    generated_query = state.get("generated_query")
-    print("generated_query ", generated_query)
+    logging.debug(f"generated_query: {state.get('generated_query')}")
+    logging.debug(f"query_result: {state.get('query_result')}")
+    return state
+
+
+async def evaluate_query(query: str, expected_results, graph, repeat: int = 0) -> Dict[str, Any]:
+    """
+    Runs the query on a new thread and compares its results with the expected ones.
+
+    :return: The run's correctness (None when there is nothing to compare with), wall time,
+        LLM calls, tokens and MongoDB time.
+    """
+    stats = RunStats()
+    token = current_run_stats.set(stats)
+    started = time.perf_counter()
+    error = None
+    predicted_results = None
+    try:
+        state = await get_query_result(
+            query, graph.with_config(callbacks=[RunStatsHandler(stats)]), thread_id=str(uuid4())
+        )
+        predicted_results = state.get("query_result")
+    except Exception as e:
+        logging.error(f"Query failed: {query}: {e!r}")
+        error = repr(e)
+    finally:
+        current_run_stats.reset(token)
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    correct = None
+    if expected_results is not None:
+        correct = predicted_results == expected_results
+        if not correct and error is None:
+            logging.error(
+                f"Query results do not match for query: {query}\n"
+                f"Expected: {expected_results}\n"
+                f"Predicted: {predicted_results}"
+            )
 
-    print("query_result: ", query_result)
-    return query_result
+    return {
+        "question": query,
+        "repeat": repeat,
+        "correct": correct,
+        "error": error,
+        "wall_ms": wall_ms,
+        "llm_calls": stats.llm_calls,
+        "input_tokens": stats.input_tokens,
+        "output_tokens": stats.output_tokens,
+        "mongo_queries": stats.mongo_queries,
+        "mongo_ms": stats.mongo_ms,
+    }
 
 
-async def evaluate_query(query: str, graph):
+async def run_evaluation(
+    graph, questions: Dict[str, Any], repeats: int = 1, concurrency: int = 4
+) -> List[Dict[str, Any]]:
     """
-    Evaluate the query results by comparing the predicted results with expected results.
+    Runs every question `repeats` times, up to `concurrency` runs at a time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(query: str, repeat: int):
+        async with semaphore:
+            return await evaluate_query(query, questions[query], graph, repeat)
+
+    return await asyncio.gather(
+        *(run(query, repeat) for repeat in range(repeats) for query in questions)
+    )
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregates the runs of each question: accuracy over its scored runs, wall time percentiles
+    and spread, and mean LLM calls, tokens and MongoDB time.
+    """
+    by_question: Dict[str, List[Dict[str, Any]]] = {}
+    for run in runs:
+        by_question.setdefault(run["question"], []).append(run)
+
+    report = {}
+    for question, question_runs in by_question.items():
+        scored = [run["correct"] for run in question_runs if run["correct"] is not None]
+        wall = [run["wall_ms"] for run in question_runs]
+        report[question] = {
+            "runs": len(question_runs),
+            "errors": sum(1 for run in question_runs if run["error"]),
+            "accuracy": sum(scored) / len(scored) if scored else None,
+            "wall_ms": {
+                **latency_summary(wall),
+                "stdev": statistics.stdev(wall) if len(wall) > 1 else 0.0,
+            },
+            **{
+                key: statistics.mean(run[key] for run in question_runs)
+                for key in ("llm_calls", "input_tokens", "output_tokens", "mongo_queries", "mongo_ms")
+            },
+        }
+    return report
+
+
+def check_regressions(
+    report: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    max_latency_increase: float = 0.2,
+    max_cost_increase: float = 0.1,
+) -> List[str]:
     """
-    logging.info(f"Evaluating query: {query}")
-    predicted_results = await get_query_result(query, graph)
-    expected_results = EXPECTED_RESULTS.get(query)
-    if expected_results is None:
-        logging.warning(f"No expected results found for query: {query}")
-        return
-
-    if predicted_results == expected_results:
-        logging.info(f"Query results match for query: {query}")
-        return True
-    else:
-        logging.error(
-            f"Query results do not match for query: {query}\n"
-            f"Expected: {expected_results}\n"
-            f"Predicted: {predicted_results}"
+    Compares a report with a baseline report of the same questions.
+
+    :param max_latency_increase: Tolerated relative increase of a question's p50 wall time.
+    :param max_cost_increase: Tolerated relative increase of its LLM calls and tokens.
+    :return: A description of each regression.
+    """
+    regressions = []
+    for question, current in report.items():
+        previous = baseline.get(question)
+        if previous is None:
+            continue
+        if (
+            previous["accuracy"] is not None
+            and current["accuracy"] is not None
+            and current["accuracy"] < previous["accuracy"]
+        ):
+            regressions.append(
+                f"{question}: accuracy {previous['accuracy']:.2f} -> {current['accuracy']:.2f}"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{question}: errors {previous['errors']} -> {current['errors']}")
+        before, after = previous["wall_ms"]["p50"], current["wall_ms"]["p50"]
+        if before and after > before * (1 + max_latency_increase):
+            regressions.append(f"{question}: p50 wall time {before:.0f}ms -> {after:.0f}ms")
+        for key in ("llm_calls", "input_tokens", "output_tokens"):
+            before, after = previous[key], current[key]
+            if before and after > before * (1 + max_cost_increase):
+                regressions.append(f"{question}: {key} {before:.1f} -> {after:.1f}")
+    return regressions
+
+
+def print_report(report: Dict[str, Dict[str, Any]]):
+    print(
+        f"{'accuracy':>9}{'p50 ms':>9}{'p95 ms':>9}{'stdev':>8}{'LLM':>6}{'tokens':>8}"
+        f"{'mongo ms':>10}  question"
+    )
+    for question, item in report.items():
+        accuracy = "-" if item["accuracy"] is None else f"{item['accuracy']:.2f}"
+        tokens = item["input_tokens"] + item["output_tokens"]
+        print(
+            f"{accuracy:>9}{item['wall_ms']['p50']:>9.0f}{item['wall_ms']['p95']:>9.0f}"
+            f"{item['wall_ms']['stdev']:>8.0f}{item['llm_calls']:>6.1f}{tokens:>8.0f}"
+            f"{item['mongo_ms']:>10.1f}  {question}"
         )
-    return False
+    scored = [item["accuracy"] for item in report.values() if item["accuracy"] is not None]
+    if scored:
+        print(f"Number of correct queries: {sum(scored):.1f}/{len(scored)}")
 
 
 async def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Evaluate the assistant on question sets, each run on its own thread, and report "
+            "correctness, wall time, LLM calls, tokens and MongoDB time per question."
+        )
+    )
+    parser.add_argument(
+        "--questions", nargs="*", default=[], help="JSON question set files (default: built-in set)"
+    )
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Exit with status 1 if the report regresses against this JSON report"
+    )
+    parser.add_argument("--max-latency-increase", type=float, default=0.2)
+    parser.add_argument("--max-cost-increase", type=float, default=0.1)
+    args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
 
+    questions = {}
+    for path in args.questions:
+        questions.update(load_question_set(path))
+    questions = questions or EXPECTED_RESULTS
+
     config = Config()
     mongo_client = MongoDBService(
         host=config.mongodb.HOST,
@@ -69,18 +247,72 @@ async def main():
         password=config.mongodb.PASSWORD,
         db_name=config.mongodb.DB_NAME,
         orders_collection="Orders",
+        max_time_ms=config.query_guardrails.MAX_TIME_MS,
+        default_limit=config.query_guardrails.DEFAULT_LIMIT,
+        allow_disk_use=config.query_guardrails.ALLOW_DISK_USE,
+        explain_before_run=config.query_guardrails.EXPLAIN_BEFORE_RUN,
+        max_docs_examined=config.query_guardrails.MAX_DOCS_EXAMINED,
+        profile_sample_rate=(
+            config.query_profiling.SAMPLE_RATE
+            if config.query_profiling.ENABLED
+            else None
+        ),
+    )
+    intent_classifier = (
+        IntentClassifier(min_confidence=config.intent_router.MIN_CONFIDENCE)
+        if config.intent_router.ENABLED
+        else None
+    )
+    result_renderer = (
+        ResultRenderer(
+            max_rows=config.result_rendering.MAX_ROWS,
+            summary_rows=config.result_rendering.SUMMARY_ROWS,
+        )
+        if config.result_rendering.ENABLED
+        else None
+    )
+    approximate_executor = (
+        ApproximateExecutor(
+            mongo_client,
+            mode=config.approximate_queries.MODE,
+            sample_size=config.approximate_queries.SAMPLE_SIZE,
+            sample_collection=config.approximate_queries.SAMPLE_COLLECTION or None,
+        )
+        if config.approximate_queries.MODE != "off"
+        else None
+    )
+    columnar_engine = await load_columnar_engine(
+        config.columnar.SOURCE, mongo_client, config.columnar.PARQUET_PATH
+    )
+    graph_builder = GraphBuilder(
+        mongo_client,
+        intent_classifier=intent_classifier,
+        max_repair_attempts=config.repair.MAX_ATTEMPTS,
+        result_renderer=result_renderer,
+        approximate_executor=approximate_executor,
+        columnar_engine=columnar_engine,
     )
-    graph_builder = GraphBuilder(mongo_client)
     graph = await graph_builder.initialize_graph()
 
-    queries = list(EXPECTED_RESULTS.keys())
-    total_eval = 0
-    for query in queries:
-        is_correct = await evaluate_query(query, graph)
-        total_eval += 1 if is_correct else 0
-    
-    print(f"Number of correct queries: {total_eval}/{len(queries)}")
-        
+    runs = await run_evaluation(graph, questions, args.repeats, args.concurrency)
+    report = summarize(runs)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"questions": report, "runs": runs}, output_file, indent=2, default=str)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["questions"]
+        regressions = check_regressions(
+            report, baseline, args.max_latency_increase, args.max_cost_increase
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
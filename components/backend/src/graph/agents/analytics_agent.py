@@ -4,8 +4,14 @@ from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from graph.graph_state import ANALYTICS_AGENT
 from graph.utils import create_tool_calling_agent
-from graph.llm import llm
+from graph.llm import get_config, get_llm
+from graph.context import ConversationContext
 from graph.config_llm import ConfigLLM
+from graph.entity_resolver import EntityResolver, load_entity_resolver
+from graph.prompt_assembly import create_prompt_assembler
+from graph.query_templates import match_template, render_pipeline
+from services.tracing import record_cache, span
+from functools import lru_cache
 import datetime
 
 logger = logging.getLogger(__name__)
@@ -14,55 +20,104 @@ class MongoSchema(BaseModel):
     mongodb_query: str = Field(description="MongoDB query to run")
 
 
+# The system message only depends on the schema, so it is an identical prefix across calls and
+# can be served from the provider's prompt cache. Retrieved sections and examples come after it.
+WRITE_QUERY_SYSTEM_PROMPT = (
+    """
+    You are an expert in crafting advanced MongoDB aggregation pipelines in Python.
+    Your task is to generate a MongoDB aggregation pipeline in Python syntax based on the `user_question`.
+    Use the provided `ORDER Table Schema` and the relevant schema fields as references to construct the pipeline.
+    For date using python date like this `datetime.datetime(2010, 1, 1)` and add in the beginning of the pipeline `import datetime`.
+    Note: You have to just return the python pipeline query nothing else. Don't return any additional text with the python pipeline query.
+
+    ORDER Table schema:"""
+    + ConfigLLM.ORDER_SCHEMA
+    + ConfigLLM.ORDER_SCHEMA_OVERVIEW
+)
+
+WRITE_QUERY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", WRITE_QUERY_SYSTEM_PROMPT),
+        (
+            "human",
+            "Relevant schema fields:\n{schema_sections}\n\n"
+            "Here are some examples:\n{examples}\n\n"
+            "{entities}"
+            "Input: {user_query}",
+        ),
+    ]
+)
+
+
+@lru_cache(maxsize=None)
+def get_prompt_assembler():
+    config = get_config()
+    return create_prompt_assembler(
+        examples_k=config.prompt_assembly.FEW_SHOT_K,
+        sections_k=config.prompt_assembly.SCHEMA_SECTIONS_K,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_entity_resolver():
+    settings = get_config().entity_resolution
+    if not settings.ENABLED:
+        return None
+    return load_entity_resolver(settings)
+
+
+async def resolve_entities(user_query: str) -> str:
+    """
+    Looks up the names mentioned in the question in the entity index.
+
+    :return: The prompt section listing their stored values, empty when nothing was resolved.
+    """
+    resolver = get_entity_resolver()
+    if resolver is None:
+        return ""
+    with span("entity", "resolve") as resolve_span:
+        entities = await resolver.resolve(user_query)
+        resolve_span.set(resolved=len(entities))
+    if entities:
+        logger.info(f"Resolved entities: {entities}")
+    description = EntityResolver.describe(entities)
+    return f"{description}\n\n" if description else ""
+
+
+@lru_cache(maxsize=None)
+def get_write_query_chain():
+    return WRITE_QUERY_PROMPT | get_llm().with_structured_output(MongoSchema)
+
+
 @tool(parse_docstring=True, response_format="content_and_artifact")
-def write_query_tool(user_query: str) -> str:
+async def write_query_tool(user_query: str) -> str:
     """
     Writes a MongoDB query based on user request.
 
     Args:
         user_query: The user's question or request about data.
     """
-    prompt = (
-        """
-        You are an expert in crafting advanced MongoDB aggregation pipelines in Python.
-        Your task is to generate a MongoDB aggregation pipeline in Python syntax based on the `user_question`.
-        Use the provided `ORDER Table Schema` and `Schema Description` as references to construct the pipeline.
-        For date using python date like this `datetime.datetime(2010, 1, 1)` and add in the beginning of the pipeline `import datetime`. 
-
-        ORDER Table schema:"""
-        + ConfigLLM.ORDER_SCHEMA
-        + """
-        ORDER Schema Description: """
-        + ConfigLLM.ORDER_SCHEMA_DESCRIPTION
-        + """
-
-        Here are some example:
-        Input: what is Total number of orders created during 2010 to 2013
-        Output: {json_ex_string_1}
-
-        Input: what is sum of all values in total price field
-        Output: {json_ex_string_2}
-
-        Input: what is Identification of the quarter with the highest spending
-        Output: {json_ex_string_3}
-
-        Input: Total spending grouped by Acquisition Type
-        Output: {json_ex_string_4}
-
-        Note: You have to just return the python pipeline query nothing else. Don't return any additional text with the python pipeline query.
-        Input: {user_query}
-        """
-    )
-    PROMPT = ChatPromptTemplate.from_template(prompt)
-    chain = PROMPT | llm.with_structured_output(MongoSchema)
+    template = None
+    if get_config().query_templates.ENABLED:
+        template = match_template(user_query)
+        record_cache("query_template", template is not None)
+    if template:
+        generated_query = render_pipeline(template.pipeline)
+        logger.info(f"Filled the {template.name} query template: {generated_query}")
+        return "MongoDB query has been generated successfully.", {
+            "generated_query": generated_query,
+            "user_query": user_query,
+            "current_route": ANALYTICS_AGENT,
+            "query_trusted": True,
+        }
 
-    resp = chain.invoke(
+    prompt_assembler = get_prompt_assembler()
+    resp = await get_write_query_chain().ainvoke(
         {
             "user_query": user_query,
-            "json_ex_string_1": ConfigLLM.FEW_SHOT_EXAMPLE_1,
-            "json_ex_string_2": ConfigLLM.FEW_SHOT_EXAMPLE_2,
-            "json_ex_string_3": ConfigLLM.FEW_SHOT_EXAMPLE_3,
-            "json_ex_string_4": ConfigLLM.FEW_SHOT_EXAMPLE_4,
+            "schema_sections": prompt_assembler.schema_sections(user_query),
+            "examples": prompt_assembler.few_shot_examples(user_query),
+            "entities": await resolve_entities(user_query),
         }
     )
     logger.info(f"Generated MongoDB query: {resp.mongodb_query}")
@@ -71,6 +126,7 @@ def write_query_tool(user_query: str) -> str:
         "generated_query": resp.mongodb_query,
         "user_query": user_query,
         "current_route": ANALYTICS_AGENT,
+        "query_trusted": False,
     }
 
 
@@ -83,7 +139,7 @@ You have these tools to help you:
 Your process:
 1. First, validate the user's request. If the request specifies a year outside the range of 2012 to 2015, clarify this to the user without proposing a schema.
 2. Write or propose a MongoDB schema/query (use write_query_tool) if it's required.
-3. Format the results for the user in a nice way.
+3. Format the results for the user in a nice way. Large results are summarized by their first rows and statistics over all rows, comment on these rather than listing rows.
 
 Important Constraints:
 - The minimum year for queries is 2012.
@@ -105,10 +161,17 @@ Current Date: {current_date}
     current_date=datetime.datetime.now().strftime("%Y-%m-%d")
 )
 
-analytics_agent = create_tool_calling_agent(
-    llm,
-    analytics_agent_prompt,
-    ANALYTICS_AGENT,
-    [write_query_tool],
-    call_after_tool=False,
-)
+
+def create_analytics_agent():
+    config = get_config()
+    return create_tool_calling_agent(
+        get_llm(),
+        analytics_agent_prompt,
+        ANALYTICS_AGENT,
+        [write_query_tool],
+        call_after_tool=False,
+        context=ConversationContext(
+            max_exchanges=config.context.MAX_EXCHANGES,
+            max_tokens=config.context.MAX_TOKENS,
+        ),
+    )
@@ -1,30 +1,140 @@
+import asyncio
 import logging
-from langchain_core.messages import AIMessage
+import time
+from typing import Optional
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 from graph.graph_state import AgentState, EXECUTION_AGENT
+from graph.result_renderer import ResultRenderer
 from graph.utils import eval_mongodb_query
 from services.mognodb_service import MongoDBService
+from services.approximate import ApproximateExecutor
+from services.columnar_engine import ColumnarEngine
+from services.query_guardrails import QueryRejectedError, ensure_limit_with_lookahead, truncate_results
+from services.single_flight import SingleFlight, pipeline_hash
+from services.tracing import record_cache, span
 
 logger = logging.getLogger(__name__)
 
 
+def _last_human_message(state: AgentState) -> Optional[HumanMessage]:
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            return message
+    return None
+
+
+def _question(state: AgentState) -> str:
+    message = _last_human_message(state)
+    return message.content if message is not None else state.get("user_query") or ""
+
+
 async def execution_agent(
-    state: AgentState, config: RunnableConfig, mongo_client: MongoDBService
+    state: AgentState,
+    config: RunnableConfig,
+    mongo_client: MongoDBService,
+    single_flight: Optional[SingleFlight] = None,
+    renderer: Optional[ResultRenderer] = None,
+    approximate: Optional[ApproximateExecutor] = None,
+    columnar: Optional[ColumnarEngine] = None,
 ):
+    """
+    Runs the generated pipeline. With a `renderer`, results of questions that only ask for the
+    figures are rendered as the answer, ending the turn, and the other questions get a compact
+    summary of the results to comment on instead of every document. With `approximate`, eligible
+    pipelines of questions asking for an estimate run over a sample of the orders. With
+    `columnar`, the pipelines it supports run on the in-memory snapshot instead of MongoDB.
+    """
     generated_query = state.get("generated_query")
     query_result = None
+    truncated = False
+    execution_error = None
+    result_rendered = False
+    estimate = None
+    source = "mongo"
     try:
-        query_pipeline = eval_mongodb_query(generated_query)
-        query_result = await mongo_client.aggregate_orders(query_pipeline)
-        formatted_results = "\n".join([str(result) for result in query_result])
-        response = f"The query results are as follows:\n {formatted_results}"
+        with span("parse", "eval_mongodb_query"):
+            query_pipeline = eval_mongodb_query(generated_query)
+        started = time.perf_counter()
+        if approximate is not None and approximate.wants_estimate(_question(state)):
+            try:
+                with span("mongo", "estimate") as estimate_span:
+                    estimate = await approximate.run(query_pipeline)
+                    estimate_span.set(estimated=estimate is not None)
+            except Exception as e:
+                logger.warning(f"Estimating the query failed, running it exactly: {str(e)}")
+        if estimate is not None:
+            query_result = estimate.rows
+            source = "estimate"
+        elif columnar is not None:
+            # Runs on the snapshot with the guardrails' limit, None when MongoDB has to run it.
+            with span("columnar", "aggregate", stages=len(query_pipeline)) as columnar_span:
+                limited, keep = ensure_limit_with_lookahead(query_pipeline, mongo_client.default_limit)
+                query_result = await asyncio.to_thread(columnar.aggregate, limited)
+                record_cache("columnar", query_result is not None)
+                if query_result is not None:
+                    query_result, truncated = truncate_results(query_result, keep)
+                    columnar_span.set(rows=len(query_result), truncated=truncated)
+                    source = "columnar"
+        if query_result is None and single_flight is not None:
+            # Threads running the same pipeline at the same time share one aggregation.
+            (query_result, truncated), shared = await single_flight.do(
+                pipeline_hash(query_pipeline),
+                lambda: mongo_client.aggregate_orders(query_pipeline),
+            )
+            record_cache("pipeline_flight", shared)
+            query_result = list(query_result)
+        elif query_result is None:
+            query_result, truncated = await mongo_client.aggregate_orders(query_pipeline)
+        execution_ms = (time.perf_counter() - started) * 1000
+        if renderer is None:
+            formatted_results = "\n".join([str(result) for result in query_result])
+            response = f"The query results are as follows:\n {formatted_results}"
+            if truncated:
+                response += f"\nOnly the first {len(query_result)} rows were returned."
+        elif renderer.needs_narrative(_question(state)):
+            with span("render", "summarize", rows=len(query_result)):
+                response = (
+                    f"The query results are as follows:\n{renderer.summarize(query_result, truncated)}"
+                )
+        else:
+            with span("render", "render", rows=len(query_result)):
+                response = renderer.render(query_result, truncated)
+            result_rendered = True
+        if estimate is not None:
+            response = f"{response}\n\n{estimate.describe()}"
+    except QueryRejectedError as e:
+        logger.warning(f"The query was rejected by the guardrails: {str(e)}")
+        execution_error = str(e)
+        user_query = state.get("user_query")
+        response = f"The query for: {user_query} was rejected by the database guardrails: {str(e)} Try to generate a new, more selective query."
     except Exception as e:
         logger.error(f"An error occurred while executing the query: {str(e)}")
+        execution_error = str(e)
         user_query = state.get("user_query")
         response = f"An error occurred while executing the query: {user_query}, beacuse of this error: {str(e)}. try to generate a new query."
 
-    return {
+    update = {
         "messages": [AIMessage(content=response, name=EXECUTION_AGENT)],
         "query_result": query_result,
+        "execution_error": execution_error,
+        "result_rendered": result_rendered,
+        "query_estimate": (
+            {"source": estimate.source, "sampled": estimate.sampled, "population": estimate.population}
+            if estimate is not None
+            else None
+        ),
         "current_route": EXECUTION_AGENT,
     }
+    if execution_error is None:
+        # The pipeline exports of the thread run, kept until another pipeline runs successfully.
+        update["executed_query"] = generated_query
+        turn = _last_human_message(state)
+        update["query_execution"] = {
+            "turn": turn.id if turn is not None else None,
+            "pipeline_hash": pipeline_hash(query_pipeline),
+            "source": source,
+            "truncated": truncated,
+            "execution_ms": execution_ms,
+        }
+    return update
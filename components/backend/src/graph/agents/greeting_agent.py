@@ -1,7 +1,8 @@
 from typing import Dict
 from langchain_core.tools import tool
 
-from graph.llm import llm
+from graph.llm import get_config, get_llm
+from graph.context import ConversationContext
 from graph.utils import create_tool_calling_agent
 from graph.graph_state import GREETING_AGENT, ANALYTICS_AGENT
 
@@ -29,7 +30,7 @@ def greeting_agent_prompt(routes: Dict[str, str]) -> str:
 
 
 @tool(parse_docstring=True, response_format="content_and_artifact")
-def redirect_tool(
+async def redirect_tool(
     next_agent: str,
 ) -> dict:
     """A tool that redirects to a specific agent.
@@ -40,14 +41,20 @@ def redirect_tool(
     return f"You will be redirected to {next_agent}", {"current_route": next_agent}
 
 
-greeting_agent = create_tool_calling_agent(
-    llm,
-    greeting_agent_prompt(
-        {
-            ANALYTICS_AGENT: "Can analyze the data.",
-        }
-    ),
-    GREETING_AGENT,
-    [redirect_tool],
-    call_after_tool=False,
-)
+def create_greeting_agent():
+    config = get_config()
+    return create_tool_calling_agent(
+        get_llm(),
+        greeting_agent_prompt(
+            {
+                ANALYTICS_AGENT: "Can analyze the data.",
+            }
+        ),
+        GREETING_AGENT,
+        [redirect_tool],
+        call_after_tool=False,
+        context=ConversationContext(
+            max_exchanges=config.context.MAX_EXCHANGES,
+            max_tokens=config.context.MAX_TOKENS,
+        ),
+    )
@@ -1,11 +1,14 @@
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessage
 from graph.graph_state import VALIDATION_AGENT
 from graph.graph_state import AgentState
-from graph.llm import llm
+from graph.llm import get_config, get_llm
 from graph.config_llm import ConfigLLM
+from graph.prompt_assembly import create_prompt_assembler
+from services.tracing import span
 
 
 class QueryValidation(BaseModel):
@@ -19,53 +22,82 @@ class QueryValidation(BaseModel):
     )
 
 
-def validation_agent(state: AgentState, config: RunnableConfig):
-    validation_agent_prompt = (
-        """
-        You are an Expert Validation Agent. Your task is to validate the MongoDB Python aggregation pipeline proposed by the Analytics Agent.
-        Review the following:
-        1. Ensure the pipeline references only the single existing collection (`ORDER`).
-        2. Ensure the pipeline does not contain destructive operations (e.g., insert, update, delete, drop, rename).
-        3. Ensure the pipeline does not pose security risks or attempt to access system collections.
-        4. Validate that any predicates or stages in the pipeline correctly match the fields described in the schema.
-        5. Validate that the pipeline structure adheres to valid MongoDB aggregation syntax in Python format.
-
-        ORDER Table schema:
-        """
-        + ConfigLLM.ORDER_SCHEMA
-        + """
-        ORDER Schema Description: """
-        + ConfigLLM.ORDER_SCHEMA_DESCRIPTION
-        + """
-
-        Validation Guidelines and Rules:
-        1. Pipelines must be **read-only** and use aggregation stages exclusively.
-        2. Prohibited operations include:
-        - `insert`
-        - `update`
-        - `delete`
-        - `drop`
-        - `rename`
-        3. The pipeline must not alter the database state or modify data in any form.
-        4. If the user question cannot be fully answered with the aggregation pipeline, validate if the pipeline retrieves the closest relevant data without modifying the database.
-        5. The pipeline must use proper Python syntax for MongoDB aggregation, including the correct use of data types like `datetime` where applicable.
-
-        User asked query:
-        {user_query}
-
-        Generated pipeline:
-        {generated_query}
-
-        Now, based on this information, determine if the generated pipeline is valid or not.
-        If the pipeline is valid, explain why it is valid.
-        If the pipeline is invalid, provide reasoning and highlight which parts are incorrect, pose security issues, or deviate from the schema concisely.
-        """
-    )
-    PROMPT = ChatPromptTemplate.from_template(validation_agent_prompt)
-    chain = PROMPT | llm.with_structured_output(QueryValidation)
+VALIDATION_SYSTEM_PROMPT = (
+    """
+    You are an Expert Validation Agent. Your task is to validate the MongoDB Python aggregation pipeline proposed by the Analytics Agent.
+    Review the following:
+    1. Ensure the pipeline references only the single existing collection (`ORDER`).
+    2. Ensure the pipeline does not contain destructive operations (e.g., insert, update, delete, drop, rename).
+    3. Ensure the pipeline does not pose security risks or attempt to access system collections.
+    4. Validate that any predicates or stages in the pipeline correctly match the fields described in the schema.
+    5. Validate that the pipeline structure adheres to valid MongoDB aggregation syntax in Python format.
+
+    Validation Guidelines and Rules:
+    1. Pipelines must be **read-only** and use aggregation stages exclusively.
+    2. Prohibited operations include:
+    - `insert`
+    - `update`
+    - `delete`
+    - `drop`
+    - `rename`
+    3. The pipeline must not alter the database state or modify data in any form.
+    4. If the user question cannot be fully answered with the aggregation pipeline, validate if the pipeline retrieves the closest relevant data without modifying the database.
+    5. The pipeline must use proper Python syntax for MongoDB aggregation, including the correct use of data types like `datetime` where applicable.
+
+    ORDER Table schema:"""
+    + ConfigLLM.ORDER_SCHEMA
+    + ConfigLLM.ORDER_SCHEMA_OVERVIEW
+)
+
+VALIDATION_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", VALIDATION_SYSTEM_PROMPT),
+        (
+            "human",
+            """
+            Relevant schema fields:
+            {schema_sections}
+
+            User asked query:
+            {user_query}
+
+            Generated pipeline:
+            {generated_query}
+
+            Now, based on this information, determine if the generated pipeline is valid or not.
+            If the pipeline is valid, explain why it is valid.
+            If the pipeline is invalid, provide reasoning and highlight which parts are incorrect, pose security issues, or deviate from the schema concisely.
+            """,
+        ),
+    ]
+)
+
+
+@lru_cache(maxsize=None)
+def get_prompt_assembler():
+    return create_prompt_assembler(sections_k=get_config().prompt_assembly.SCHEMA_SECTIONS_K)
+
+
+@lru_cache(maxsize=None)
+def get_validation_chain():
+    return VALIDATION_PROMPT | get_llm().with_structured_output(QueryValidation)
+
+
+async def validation_agent(state: AgentState, config: RunnableConfig):
     user_query = state.get("user_query")
     generated_query = state.get("generated_query")
-    resp = chain.invoke({"generated_query": generated_query, "user_query": user_query})
+    with span("validation", VALIDATION_AGENT) as validation:
+        resp = await get_validation_chain().ainvoke(
+            {
+                "generated_query": generated_query,
+                "user_query": user_query,
+                "schema_sections": get_prompt_assembler().schema_sections(
+                    user_query or "", generated_query
+                ),
+            },
+            config,
+        )
+        validation.set(is_valid=resp.is_valid)
     bot_response = "The generated query is valid. It adheres to the schema, security standards, and MongoDB aggregation syntax."
     if not resp.is_valid:
         bot_response = f"The generated query: {generated_query} is invalid for user query: {user_query}, the following issues were identified: {resp.explanation}. Please try again and generate a valid query."
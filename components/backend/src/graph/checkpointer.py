@@ -0,0 +1,482 @@
+import datetime
+import logging
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+import bson
+import ormsgpack
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde import jsonplus
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+ZLIB_SUFFIX = "+zlib"
+BSON_TYPE = "bson"
+BSON_MSGPACK_TYPE = "bson+msgpack"
+# msgpack extension code of BSON values, after the codes used by `JsonPlusSerializer`.
+BSON_EXT = 64
+BSON_VALUE_TYPES = (bson.ObjectId, bson.Decimal128, bson.Timestamp, bson.Regex)
+# Same options as `JsonPlusSerializer`, so that datetimes, enums and UUIDs keep their types.
+MSGPACK_OPTIONS = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_ENUM
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+)
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def _bson_msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, BSON_VALUE_TYPES):
+        return ormsgpack.Ext(BSON_EXT, bson.encode({"value": obj}))
+    return jsonplus._msgpack_default(obj)
+
+
+def _bson_msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == BSON_EXT:
+        return bson.decode(data)["value"]
+    return jsonplus._msgpack_ext_hook(code, data)
+
+
+class CompactSerializer(SerializerProtocol):
+    """
+    Serializer for checkpoint payloads that keeps large values small.
+
+    Lists of documents such as `query_result` are BSON-encoded, which preserves `ObjectId`,
+    `Decimal128` and `datetime` values. Other values that the wrapped serializer rejects, such as
+    checkpoint metadata embedding query results, are encoded with msgpack like
+    `JsonPlusSerializer` does, BSON values being stored as BSON in msgpack extensions. Nothing
+    is pickled, so loading a checkpoint never runs code. Any payload above `compress_threshold`
+    bytes is zlib-compressed.
+    """
+
+    def __init__(
+        self,
+        serde: Optional[SerializerProtocol] = None,
+        compress_threshold: int = 4096,
+        compression_level: int = 6,
+    ):
+        self.serde = serde or JsonPlusSerializer()
+        self.compress_threshold = compress_threshold
+        self.compression_level = compression_level
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = None, None
+        if isinstance(obj, list) and obj and all(isinstance(doc, dict) for doc in obj):
+            try:
+                type_, data = BSON_TYPE, bson.encode({"rows": obj})
+            except (bson.errors.InvalidDocument, TypeError, OverflowError):
+                pass
+        if data is None:
+            try:
+                type_, data = self.serde.dumps_typed(obj)
+            except TypeError:
+                type_ = BSON_MSGPACK_TYPE
+                data = ormsgpack.packb(obj, default=_bson_msgpack_default, option=MSGPACK_OPTIONS)
+
+        if len(data) >= self.compress_threshold:
+            return type_ + ZLIB_SUFFIX, zlib.compress(data, self.compression_level)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(ZLIB_SUFFIX):
+            type_ = type_[: -len(ZLIB_SUFFIX)]
+            payload = zlib.decompress(payload)
+        if type_ == BSON_TYPE:
+            return bson.decode(payload)["rows"]
+        if type_ == BSON_MSGPACK_TYPE:
+            return ormsgpack.unpackb(
+                payload, ext_hook=_bson_msgpack_ext_hook, option=ormsgpack.OPT_NON_STR_KEYS
+            )
+        return self.serde.loads_typed((type_, payload))
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """
+    Async LangGraph checkpointer that persists conversation state in MongoDB.
+
+    Channel values are stored once per version in a blobs collection, so unchanged channels
+    such as the message history are not rewritten with every checkpoint. Each thread keeps at
+    most `max_checkpoints_per_thread` checkpoints, and every document carries an `updatedAt`
+    field covered by a TTL index, so inactive threads expire after `ttl_seconds`. Each new
+    checkpoint also refreshes the blobs it references, so that an unchanged channel does not
+    expire while the thread is still active.
+    """
+
+    def __init__(
+        self,
+        db,
+        ttl_seconds: Optional[int] = None,
+        max_checkpoints_per_thread: Optional[int] = None,
+        serde: Optional[SerializerProtocol] = None,
+        collection_prefix: str = "Checkpoint",
+    ):
+        """
+        Args:
+            db: Motor database where the checkpoints are stored.
+            ttl_seconds (Optional[int]): Seconds of inactivity after which a thread expires.
+            max_checkpoints_per_thread (Optional[int]): Number of checkpoints kept per thread.
+            serde (Optional[SerializerProtocol]): Serializer, defaults to `CompactSerializer`.
+            collection_prefix (str): Prefix of the checkpoint, blob and write collections.
+        """
+        super().__init__(serde=serde or CompactSerializer())
+        self.checkpoints = db[f"{collection_prefix}s"]
+        self.blobs = db[f"{collection_prefix}Blobs"]
+        self.writes = db[f"{collection_prefix}Writes"]
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+
+    async def setup(self) -> None:
+        """
+        Creates the lookup and TTL indexes, updating the TTL of existing indexes if it changed.
+        """
+        await self.checkpoints.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)],
+            unique=True,
+        )
+        await self.blobs.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("channel", ASCENDING), ("version", ASCENDING)],
+            unique=True,
+        )
+        await self.writes.create_index(
+            [
+                ("thread_id", ASCENDING),
+                ("checkpoint_ns", ASCENDING),
+                ("checkpoint_id", ASCENDING),
+                ("task_id", ASCENDING),
+                ("idx", ASCENDING),
+            ],
+            unique=True,
+        )
+        if self.ttl_seconds:
+            for collection in (self.checkpoints, self.blobs, self.writes):
+                await self._ensure_ttl_index(collection)
+
+    async def _ensure_ttl_index(self, collection) -> None:
+        try:
+            await collection.create_index(
+                "updatedAt", name="updatedAt_ttl", expireAfterSeconds=self.ttl_seconds
+            )
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            await collection.database.command(
+                "collMod",
+                collection.name,
+                index={"name": "updatedAt_ttl", "expireAfterSeconds": self.ttl_seconds},
+            )
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    async def _load_channel_values(
+        self, thread_id: str, checkpoint_ns: str, channel_versions: ChannelVersions
+    ) -> Dict[str, Any]:
+        if not channel_versions:
+            return {}
+        cursor = self.blobs.find(
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "$or": [
+                    {"channel": channel, "version": version}
+                    for channel, version in channel_versions.items()
+                ],
+            }
+        )
+        values = {}
+        async for blob in cursor:
+            if blob["type"] != "empty":
+                values[blob["channel"]] = self.serde.loads_typed((blob["type"], blob["value"]))
+        return values
+
+    async def _load_tuple(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = (
+            doc["thread_id"],
+            doc["checkpoint_ns"],
+            doc["checkpoint_id"],
+        )
+        checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
+        checkpoint["channel_values"] = await self._load_channel_values(
+            thread_id, checkpoint_ns, checkpoint["channel_versions"]
+        )
+        writes_cursor = self.writes.find(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+        ).sort([("task_id", ASCENDING), ("idx", ASCENDING)])
+        pending_writes = [
+            (write["task_id"], write["channel"], self.serde.loads_typed((write["type"], write["value"])))
+            async for write in writes_cursor
+        ]
+        parent_checkpoint_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((doc["metadata_type"], doc["metadata"])),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Returns the requested checkpoint, or the latest one of the thread.
+        """
+        query = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        doc = await self.checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        if doc is None:
+            return None
+        return await self._load_tuple(doc)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """
+        Lists checkpoints from newest to oldest.
+        """
+        query = {}
+        if config is not None:
+            query["thread_id"] = config["configurable"]["thread_id"]
+            if "checkpoint_ns" in config["configurable"]:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query["checkpoint_id"] = {"$lt": before_id}
+
+        cursor = self.checkpoints.find(query).sort("checkpoint_id", DESCENDING)
+        returned = 0
+        async for doc in cursor:
+            checkpoint_tuple = await self._load_tuple(doc)
+            if filter and not all(
+                checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()
+            ):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit is not None and returned >= limit:
+                break
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Stores a checkpoint and the channel values that changed, refreshes the expiry of the
+        unchanged ones, then prunes old checkpoints.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        now = self._now()
+
+        checkpoint_copy = checkpoint.copy()
+        values = checkpoint_copy.pop("channel_values", {})
+        for channel, version in new_versions.items():
+            type_, value = (
+                self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            )
+            await self.blobs.update_one(
+                {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "channel": channel,
+                    "version": version,
+                },
+                {"$set": {"type": type_, "value": value, "updatedAt": now}},
+                upsert=True,
+            )
+
+        unchanged = [
+            {"channel": channel, "version": version}
+            for channel, version in checkpoint["channel_versions"].items()
+            if channel not in new_versions
+        ]
+        if self.ttl_seconds and unchanged:
+            await self.blobs.update_many(
+                {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "$or": unchanged},
+                {"$set": {"updatedAt": now}},
+            )
+
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint_copy)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        await self.checkpoints.update_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]},
+            {
+                "$set": {
+                    "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                    "type": type_,
+                    "checkpoint": serialized_checkpoint,
+                    "metadata_type": metadata_type,
+                    "metadata": serialized_metadata,
+                    "channel_versions": list(checkpoint["channel_versions"].items()),
+                    "updatedAt": now,
+                }
+            },
+            upsert=True,
+        )
+        if self.max_checkpoints_per_thread:
+            await self._prune(thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        thread_query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        cursor = self.checkpoints.find(
+            thread_query, projection={"checkpoint_id": 1, "channel_versions": 1}
+        ).sort("checkpoint_id", DESCENDING)
+        docs = [doc async for doc in cursor]
+        kept, stale = (
+            docs[: self.max_checkpoints_per_thread],
+            docs[self.max_checkpoints_per_thread :],
+        )
+        if not stale:
+            return
+
+        stale_ids = [doc["checkpoint_id"] for doc in stale]
+        await self.checkpoints.delete_many({**thread_query, "checkpoint_id": {"$in": stale_ids}})
+        await self.writes.delete_many({**thread_query, "checkpoint_id": {"$in": stale_ids}})
+
+        referenced = {
+            (channel, version) for doc in kept for channel, version in doc["channel_versions"]
+        }
+        blob_cursor = self.blobs.find(thread_query, projection={"channel": 1, "version": 1})
+        stale_blobs = [
+            blob["_id"]
+            async for blob in blob_cursor
+            if (blob["channel"], blob["version"]) not in referenced
+        ]
+        if stale_blobs:
+            await self.blobs.delete_many({"_id": {"$in": stale_blobs}})
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Stores the intermediate writes of a task linked to a checkpoint.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        now = self._now()
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, serialized_value = self.serde.dumps_typed(value)
+            query = {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "task_id": task_id,
+                "idx": write_idx,
+            }
+            update = {
+                "channel": channel,
+                "type": type_,
+                "value": serialized_value,
+                "task_path": task_path,
+                "updatedAt": now,
+            }
+            if write_idx >= 0:
+                # Regular writes are idempotent, special writes (errors, interrupts) overwrite.
+                await self.writes.update_one(query, {"$setOnInsert": update}, upsert=True)
+            else:
+                await self.writes.update_one(query, {"$set": update}, upsert=True)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """
+        Deletes every checkpoint, blob and write of a thread.
+        """
+        for collection in (self.checkpoints, self.blobs, self.writes):
+            await collection.delete_many({"thread_id": thread_id})
+
+
+async def create_checkpointer(settings, db, workers: int = 1) -> BaseCheckpointSaver:
+    """
+    Builds the checkpointer selected in the configuration.
+
+    :param settings: The `Checkpointer` settings.
+    :param db: Motor database used by the MongoDB backend.
+    :param workers: Number of server processes sharing the conversations.
+    :return: A ready-to-use checkpointer.
+    :raises ValueError: If the backend is unknown, or keeps the state in-process while several
+        workers serve the same threads.
+    """
+    if settings.BACKEND == "memory":
+        if workers > 1:
+            raise ValueError(
+                f"The memory checkpointer cannot be shared by {workers} workers: a thread's next "
+                "message may reach a worker that never saw it. Use CHECKPOINTER_BACKEND=mongo or "
+                "a single worker."
+            )
+        return MemorySaver()
+    if settings.BACKEND != "mongo":
+        raise ValueError(f"Unsupported checkpointer backend: {settings.BACKEND}")
+
+    checkpointer = MongoCheckpointSaver(
+        db,
+        ttl_seconds=settings.TTL_SECONDS,
+        max_checkpoints_per_thread=settings.MAX_CHECKPOINTS_PER_THREAD,
+        serde=CompactSerializer(compress_threshold=settings.COMPRESS_THRESHOLD_BYTES),
+    )
+    await checkpointer.setup()
+    return checkpointer
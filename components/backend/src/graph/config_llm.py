@@ -31,76 +31,37 @@ class ConfigLLM:
         ]
     }}
     """
-    ORDER_SCHEMA_DESCRIPTION = """
-    This schema describes the structure and purpose of the fields in a unified collection containing purchase order details and their associated line items. Line items are stored as a nested array within the purchase order document to maintain a hierarchical relationship.
+    ORDER_SCHEMA_OVERVIEW = (
+        "The collection holds one document per purchase order. Line items are stored as a nested "
+        "`lineItems` array within the purchase order document, so pipelines that filter, group or "
+        "sum line item fields must `$unwind` `$lineItems` first. creationDate is the primary date "
+        "reference."
+    )
 
-    Purchase Order Fields:
-    1. Field Name: _id
-      Field Description: Unique identifier for the document in the collection.
-
-    2. Field Name: creationDate
-      Field Description: System-generated date indicating when the purchase order was created.
-
-    3. Field Name: purchaseDate
-      Field Description: User-provided date of the purchase. It can be earlier than creationDate; therefore, creationDate serves as the primary reference.
-
-    4. Field Name: fiscalYear
-      Field Description: Fiscal year derived from the creationDate. For example, in the State of California, the fiscal year starts on July 1 and ends on June 30.
-
-    5. Field Name: purchaseOrderNumber
-      Field Description: Identifier for the purchase order, unique within a department but not globally across all departments.
-
-    6. Field Name: departmentName
-      Field Description: Normalized name of the department making the purchase.
-
-    7. Field Name: supplierName
-      Field Description: Name of the supplier, as registered during account setup.
-
-    8. Field Name: supplierCode
-      Field Description: Numeric code uniquely identifying the supplier.
-
-    9. Field Name: supplierQualifications
-      Field Description: Certifications or qualifications of the supplier, such as SB (Small Business), DVBE (Disabled Veteran Business Enterprise), SBE (Small Business Enterprise), NP (Non-Profit), or MB (Micro Business).
-
-    10. Field Name: acquisitionType
-        Field Description: Category of the acquisition, such as it goods, non-it goods, it services, etc.
-
-    11. Field Name: acquisitionMethod
-        Field Description: The specific method or process used to acquire the items, varying by organizational context.
-
-    12. Field Name: calCardUsed
-        Field Description: Indicates whether a state-issued credit card (CalCard) was used for the purchase. Values are "Yes" or "No".
-
-    Line Item Fields:
-    The field lineItems is an array within the purchase order document that contains the details of individual items associated with the order. Each line item includes the following fields:
-
-    1. Field Name: itemName
-      Field Description: Name of the purchased item.
-
-    2. Field Name: itemDescription
-      Field Description: Detailed description of the purchased item.
-
-    3. Field Name: itemDescriptionUUID
-      Field Description: Unique identifier for the item description, used for normalization.
-
-    4. Field Name: quantity
-      Field Description: Number of units purchased for this line item.
-
-    5. Field Name: unitPrice
-      Field Description: Cost per unit of the item.
-
-    6. Field Name: totalPrice
-      Field Description: Total cost for the line item, excluding additional charges like taxes and shipping.
-
-    7. Field Name: normalizedUNSPSC
-      Field Description: Normalized code from the United Nations Standard Products and Services Code (UNSPSC) for classifying products or services.
-
-    8. Field Name: commodityTitle
-      Field Description: Title associated with the normalized UNSPSC.
-
-    9. Field Name: commodityTitleUUID
-      Field Description: Unique identifier for the commodityTitle, used for normalization.
-    """
+    # Field path -> description, retrieved per question to build the schema section of the prompts.
+    ORDER_FIELD_DESCRIPTIONS = {
+        "_id": "Unique identifier for the document in the collection.",
+        "creationDate": "System-generated date indicating when the purchase order was created.",
+        "purchaseDate": "User-provided date of the purchase. It can be earlier than creationDate; therefore, creationDate serves as the primary reference.",
+        "fiscalYear": "Fiscal year derived from the creationDate. For example, in the State of California, the fiscal year starts on July 1 and ends on June 30.",
+        "purchaseOrderNumber": "Identifier for the purchase order, unique within a department but not globally across all departments.",
+        "departmentName": "Normalized name of the department making the purchase.",
+        "supplierName": "Name of the supplier, as registered during account setup.",
+        "supplierCode": "Numeric code uniquely identifying the supplier.",
+        "supplierQualifications": "Certifications or qualifications of the supplier, such as SB (Small Business), DVBE (Disabled Veteran Business Enterprise), SBE (Small Business Enterprise), NP (Non-Profit), or MB (Micro Business).",
+        "acquisitionType": "Category of the acquisition, such as it goods, non-it goods, it services, etc.",
+        "acquisitionMethod": "The specific method or process used to acquire the items, varying by organizational context.",
+        "calCardUsed": 'Indicates whether a state-issued credit card (CalCard) was used for the purchase. Values are "Yes" or "No".',
+        "lineItems.itemName": "Name of the purchased item.",
+        "lineItems.itemDescription": "Detailed description of the purchased item.",
+        "lineItems.itemDescriptionUUID": "Unique identifier for the item description, used for normalization.",
+        "lineItems.quantity": "Number of units purchased for this line item.",
+        "lineItems.unitPrice": "Cost per unit of the item.",
+        "lineItems.totalPrice": "Total cost (spending) for the line item, excluding additional charges like taxes and shipping.",
+        "lineItems.normalizedUNSPSC": "Normalized code from the United Nations Standard Products and Services Code (UNSPSC) for classifying products or services.",
+        "lineItems.commodityTitle": "Title associated with the normalized UNSPSC.",
+        "lineItems.commodityTitleUUID": "Unique identifier for the commodityTitle, used for normalization.",
+    }
 
     FEW_SHOT_EXAMPLE_1 = {
         "query": "Total number of orders created during Q1 of 2013.",
@@ -221,3 +182,113 @@ class ConfigLLM:
             {"$sort": {"total_spending": -1}},
         ],
     }
+
+    FEW_SHOT_EXAMPLE_5 = {
+        "query": "Top 3 most frequently ordered line items in 2013.",
+        "pipeline": [
+            {
+                "$match": {
+                    "creationDate": {
+                        "$gte": datetime(2013, 1, 1, 0, 0, 0),
+                        "$lte": datetime(2013, 12, 31, 23, 59, 59),
+                    }
+                }
+            },
+            {"$unwind": "$lineItems"},
+            {"$group": {"_id": "$lineItems.itemName", "order_count": {"$sum": 1}}},
+            {"$sort": {"order_count": -1}},
+            {"$limit": 3},
+            {"$project": {"_id": 0, "itemName": "$_id", "order_count": 1}},
+        ],
+    }
+
+    FEW_SHOT_EXAMPLE_6 = {
+        "query": "Top 5 suppliers by total spending in 2014.",
+        "pipeline": [
+            {
+                "$match": {
+                    "creationDate": {
+                        "$gte": datetime(2014, 1, 1, 0, 0, 0),
+                        "$lte": datetime(2014, 12, 31, 23, 59, 59),
+                    }
+                }
+            },
+            {"$unwind": "$lineItems"},
+            {
+                "$group": {
+                    "_id": "$supplierName",
+                    "total_spending": {"$sum": "$lineItems.totalPrice"},
+                }
+            },
+            {"$sort": {"total_spending": -1}},
+            {"$limit": 5},
+            {"$project": {"_id": 0, "supplierName": "$_id", "total_spending": 1}},
+        ],
+    }
+
+    FEW_SHOT_EXAMPLE_7 = {
+        "query": "Number of orders per month placed by the Department of Corrections in 2013.",
+        "pipeline": [
+            {
+                "$match": {
+                    "departmentName": {"$regex": "corrections", "$options": "i"},
+                    "creationDate": {
+                        "$gte": datetime(2013, 1, 1, 0, 0, 0),
+                        "$lte": datetime(2013, 12, 31, 23, 59, 59),
+                    },
+                }
+            },
+            {"$group": {"_id": {"$month": "$creationDate"}, "total_orders": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "month": "$_id", "total_orders": 1}},
+        ],
+    }
+
+    FEW_SHOT_EXAMPLE_8 = {
+        "query": "Average unit price of items whose commodity title mentions paper.",
+        "pipeline": [
+            {"$unwind": "$lineItems"},
+            {"$match": {"lineItems.commodityTitle": {"$regex": "paper", "$options": "i"}}},
+            {
+                "$group": {
+                    "_id": None,
+                    "average_unit_price": {"$avg": "$lineItems.unitPrice"},
+                }
+            },
+            {"$project": {"_id": 0, "average_unit_price": 1}},
+        ],
+    }
+
+    FEW_SHOT_EXAMPLE_9 = {
+        "query": "Spending paid with a CalCard by small business suppliers per fiscal year.",
+        "pipeline": [
+            {
+                "$match": {
+                    "calCardUsed": "Yes",
+                    "supplierQualifications": {"$regex": "SB", "$options": "i"},
+                }
+            },
+            {"$unwind": "$lineItems"},
+            {
+                "$group": {
+                    "_id": "$fiscalYear",
+                    "total_spending": {"$sum": "$lineItems.totalPrice"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "fiscalYear": "$_id", "total_spending": 1}},
+        ],
+    }
+
+    # Example bank the query generator retrieves its few-shot examples from.
+    FEW_SHOT_EXAMPLES = [
+        FEW_SHOT_EXAMPLE_1,
+        FEW_SHOT_EXAMPLE_2,
+        FEW_SHOT_EXAMPLE_3,
+        FEW_SHOT_EXAMPLE_4,
+        FEW_SHOT_EXAMPLE_5,
+        FEW_SHOT_EXAMPLE_6,
+        FEW_SHOT_EXAMPLE_7,
+        FEW_SHOT_EXAMPLE_8,
+        FEW_SHOT_EXAMPLE_9,
+    ]
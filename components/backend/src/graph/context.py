@@ -0,0 +1,159 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+)
+from graph.graph_state import VALIDATION_AGENT
+
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """
+    Approximates the number of prompt tokens of a list of messages without a tokenizer.
+
+    :param messages: The messages sent to the LLM.
+    :return: The estimated token count.
+    """
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += TOKENS_PER_MESSAGE + len(content) // CHARS_PER_TOKEN
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += len(str(tool_call.get("args", ""))) // CHARS_PER_TOKEN
+    return total
+
+
+def split_exchanges(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Splits a message history into exchanges, each starting with a user message.
+    """
+    exchanges: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not exchanges:
+            exchanges.append([message])
+        else:
+            exchanges[-1].append(message)
+    return exchanges
+
+
+def final_answer(exchange: List[BaseMessage]) -> Optional[AIMessage]:
+    """
+    Returns the last answer addressed to the user in an exchange, skipping tool calls and
+    validation chatter.
+    """
+    for message in reversed(exchange):
+        if (
+            isinstance(message, AIMessage)
+            and not message.tool_calls
+            and message.name != VALIDATION_AGENT
+            and message.content
+        ):
+            return message
+    return None
+
+
+def _truncate(text: Any, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+class ConversationContext:
+    """
+    Builds the message list sent to an agent's LLM within a token budget.
+
+    The exchange in progress is always sent in full. The `max_exchanges` previous exchanges are
+    reduced to the user question and the final answer, and older exchanges are collapsed into a
+    summary that is cached in the state and only extended when new exchanges age out.
+    """
+
+    def __init__(
+        self,
+        max_exchanges: int = 3,
+        max_tokens: int = 6000,
+        summary_question_chars: int = 200,
+        summary_answer_chars: int = 300,
+    ):
+        """
+        :param max_exchanges: Number of previous exchanges kept verbatim.
+        :param max_tokens: Token budget of the history, older exchanges are dropped to fit.
+        :param summary_question_chars: Length of each question in the summary.
+        :param summary_answer_chars: Length of each answer in the summary.
+        """
+        self.max_exchanges = max_exchanges
+        self.max_tokens = max_tokens
+        self.summary_question_chars = summary_question_chars
+        self.summary_answer_chars = summary_answer_chars
+
+    def _summary_line(self, exchange: List[BaseMessage]) -> str:
+        question = _truncate(exchange[0].content, self.summary_question_chars)
+        answer = final_answer(exchange)
+        answer_text = (
+            _truncate(answer.content, self.summary_answer_chars) if answer else "no answer"
+        )
+        return f"- User: {question} -> Assistant: {answer_text}"
+
+    def _summarize(
+        self, older: List[List[BaseMessage]], state: Dict[str, Any]
+    ) -> Tuple[str, int]:
+        summary = state.get("context_summary") or ""
+        summarized = state.get("summarized_exchanges") or 0
+        if summarized > len(older):
+            summary, summarized = "", 0
+        new_lines = [self._summary_line(exchange) for exchange in older[summarized:]]
+        if new_lines:
+            summary = "\n".join(filter(None, [summary, *new_lines]))
+        return summary, len(older)
+
+    def build(
+        self, system_prompt: str, state: Dict[str, Any]
+    ) -> Tuple[List[BaseMessage], int, Dict[str, Any]]:
+        """
+        Assembles the prompt messages for an agent call.
+
+        :param system_prompt: The agent's system prompt.
+        :param state: The current graph state.
+        :return: The messages, their estimated token count and the state updates caching the summary.
+        """
+        exchanges = split_exchanges(state["messages"])
+        current = exchanges[-1] if exchanges else []
+        previous = exchanges[:-1]
+        split_at = max(len(previous) - self.max_exchanges, 0)
+        older, recent = previous[:split_at], previous[split_at:]
+
+        summary, summarized = self._summarize(older, state)
+        compact_recent = []
+        for exchange in recent:
+            answer = final_answer(exchange)
+            compact_recent.append([exchange[0], answer] if answer else [exchange[0]])
+
+        def assemble() -> List[BaseMessage]:
+            messages = [SystemMessage(system_prompt)]
+            if summary:
+                messages.append(
+                    SystemMessage(f"Summary of the earlier conversation:\n{summary}")
+                )
+            for exchange in compact_recent:
+                messages.extend(exchange)
+            messages.extend(current)
+            return messages
+
+        messages = assemble()
+        token_count = estimate_tokens(messages)
+        while compact_recent and token_count > self.max_tokens:
+            compact_recent.pop(0)
+            messages = assemble()
+            token_count = estimate_tokens(messages)
+
+        return (
+            messages,
+            token_count,
+            {"context_summary": summary, "summarized_exchanges": summarized},
+        )
@@ -0,0 +1,173 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from config import EntityResolution
+from graph.query_templates import FILLER_WORDS, GROUP_FIELDS, MONTHS, QUARTERS, TIME_BUCKETS
+from graph.text_index import STOPWORDS
+from services.vector_search import VectorSearchService
+
+
+logger = logging.getLogger(__name__)
+
+# Fields whose distinct values the ETL indexes, as `source` of the vector store documents.
+ENTITY_FIELDS = ("supplierName", "departmentName", "lineItems.itemName", "lineItems.commodityTitle")
+
+# Words that never belong to an entity name and split the question into candidate mentions.
+BOUNDARY_WORDS = (
+    FILLER_WORDS
+    | STOPWORDS
+    | set(MONTHS)
+    | set(QUARTERS)
+    | set(TIME_BUCKETS)
+    | {word for phrase, _ in GROUP_FIELDS for word in phrase.split()}
+    | {"between", "after", "before", "since", "until", "than", "more", "less", "vs", "versus"}
+    | {"suppliers", "vendors", "departments", "items", "commodities", "quarters", "months", "years"}
+)
+
+
+@dataclass(frozen=True)
+class ResolvedEntity:
+    field: str
+    mention: str
+    value: str
+    score: float
+
+
+def _is_boundary(token: str) -> bool:
+    return token in BOUNDARY_WORDS or token.isdigit() or re.fullmatch(r"q[1-4]", token) is not None
+
+
+def candidate_mentions(question: str, max_words: int = 4) -> List[Tuple[int, int, str]]:
+    """
+    Splits the question on words that cannot be part of a name, such as stopwords, field names,
+    dates and numbers, and returns every phrase of up to `max_words` words of the remaining runs.
+
+    :return: Triples of first word index, end word index and phrase.
+    """
+    tokens = re.findall(r"[a-z0-9&'\-]+", question.lower())
+    mentions = []
+    start = 0
+    for end in range(len(tokens) + 1):
+        if end < len(tokens) and not _is_boundary(tokens[end]):
+            continue
+        for first in range(start, end):
+            for last in range(first + 1, min(first + max_words, end) + 1):
+                mentions.append((first, last, " ".join(tokens[first:last])))
+        start = end + 1
+    return mentions
+
+
+class EntityResolver:
+    """
+    Resolves the supplier, department, item and commodity names mentioned in a question to the
+    values stored in the database, using the ETL's vector index of their distinct values, so that
+    the generated `$match` uses values that exist.
+    """
+
+    def __init__(
+        self,
+        search: VectorSearchService,
+        entries: Sequence[Tuple[str, str]],
+        min_score: float = 0.8,
+        k: int = 4,
+        max_words: int = 4,
+    ):
+        """
+        :param search: The search service over the index of the stored values.
+        :param entries: The field and value of each vector of the index, in index order.
+        :param min_score: Cosine similarity below which a mention is left unresolved.
+        :param k: Neighbours retrieved per mention.
+        :param max_words: Longest mention considered, in words.
+        """
+        self.search = search
+        self.entries = list(entries)
+        self.min_score = min_score
+        self.k = k
+        self.max_words = max_words
+
+    async def resolve(self, question: str) -> List[ResolvedEntity]:
+        """
+        Searches the index for every candidate mention of the question in one request and keeps
+        the best scoring non-overlapping mentions.
+
+        :return: The resolved entities, in question order.
+        """
+        mentions = candidate_mentions(question, self.max_words)
+        if not mentions or not self.entries:
+            return []
+        distances, ids = await self.search.search(
+            [text for _, _, text in mentions], min(self.k, len(self.entries))
+        )
+
+        candidates = []
+        for (first, last, text), row_distances, row_ids in zip(mentions, distances, ids):
+            best = None
+            for distance, entry_id in zip(row_distances, row_ids):
+                if entry_id < 0 or self.entries[entry_id][0] not in ENTITY_FIELDS:
+                    continue
+                field, value = self.entries[entry_id]
+                # Squared L2 distance between unit vectors, mentions are lowercased.
+                score = 1.0 if value.lower() == text else 1.0 - float(distance) / 2.0
+                if best is None or score > best[0]:
+                    best = (score, field, value)
+            if best is not None and best[0] >= self.min_score:
+                score, field, value = best
+                candidates.append((score, last - first, first, last, text, field, value))
+
+        resolved = []
+        taken = set()
+        for score, _, first, last, text, field, value in sorted(candidates, key=lambda c: (-c[0], -c[1])):
+            words = set(range(first, last))
+            if words & taken:
+                continue
+            taken |= words
+            resolved.append((first, ResolvedEntity(field, text, value, round(score, 3))))
+        return [entity for _, entity in sorted(resolved, key=lambda item: item[0])]
+
+    @staticmethod
+    def describe(entities: Sequence[ResolvedEntity]) -> str:
+        """
+        Formats resolved entities for the query generation prompt.
+        """
+        if not entities:
+            return ""
+        lines = [
+            f'- "{entity.mention}" is {entity.field} "{entity.value}"' for entity in entities
+        ]
+        return "Values of the question as stored in the database, use them as is:\n" + "\n".join(lines)
+
+
+def load_entity_resolver(settings: EntityResolution) -> Optional[EntityResolver]:
+    """
+    Loads the FAISS snapshot written by the ETL and the embedding model it was built with.
+
+    :return: The resolver, or None when there is no snapshot at the configured path.
+    """
+    path = settings.INDEX_PATH
+    if not path or not Path(path).exists():
+        logger.info(f"No entity index at {path!r}, entity resolution is disabled")
+        return None
+
+    # Imported here so that the embedding model only loads when an index is configured.
+    from langchain_community.vectorstores import FAISS
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL, encode_kwargs={"normalize_embeddings": True}
+    )
+    store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    entries = []
+    for position in range(store.index.ntotal):
+        document = store.docstore.search(store.index_to_docstore_id[position])
+        entries.append((document.metadata.get("source"), document.page_content))
+    logger.info(f"Loaded {len(entries)} entities from {path}")
+    search = VectorSearchService(
+        store.index,
+        embeddings.embed_documents,
+        max_batch_size=settings.SEARCH_MAX_BATCH_SIZE,
+        max_wait_ms=settings.SEARCH_MAX_WAIT_MS,
+        cache_size=settings.EMBEDDING_CACHE_SIZE,
+    )
+    return EntityResolver(search, entries, min_score=settings.MIN_SCORE)
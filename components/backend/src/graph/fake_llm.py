@@ -0,0 +1,141 @@
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import uuid4
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+from graph.graph_state import ANALYTICS_AGENT, EXECUTION_AGENT
+from graph.intent_router import GREETING_TEMPLATES, IntentClassifier
+from graph.query_templates import match_template, render_pipeline
+from services.single_flight import normalize_question
+
+
+DEFAULT_PIPELINE = "[{'$count': 'total_orders'}]"
+
+
+def _tool_call(name: str, args: Dict[str, Any]) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": name, "args": args, "id": f"call_{uuid4().hex[:12]}", "type": "tool_call"}],
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline, deterministic stand-in for the provider's chat model.
+
+    It answers each agent according to the tools bound to it: the greeting agent answers small
+    talk and redirects everything else to the Analytics_Agent, the analytics agent calls `write_query_tool` and then reports the
+    execution results, the query generator returns the scripted pipeline of the question (or its
+    query template, or a count of all orders) and the validator accepts every pipeline. Each call
+    sleeps for the configured latency to simulate the provider.
+    """
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    pipelines: Dict[str, str] = Field(default_factory=dict)
+    answers: Dict[str, str] = Field(default_factory=dict)
+    tool_names: List[str] = Field(default_factory=list)
+
+    @classmethod
+    def from_script(
+        cls, script_path: Optional[str] = None, **kwargs: Any
+    ) -> "FakeChatModel":
+        """
+        Creates the model with the responses recorded in a JSON script, an object with
+        `pipelines` and `answers` keyed by question.
+        """
+        script = {}
+        if script_path:
+            with open(script_path, "r", encoding="utf-8") as script_file:
+                script = json.load(script_file)
+        return cls(
+            pipelines={normalize_question(q): p for q, p in script.get("pipelines", {}).items()},
+            answers={normalize_question(q): a for q, a in script.get("answers", {}).items()},
+            **kwargs,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    def _delay(self) -> float:
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(self.latency_ms + jitter, 0.0) / 1000
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        turn_start = max(
+            (index for index, message in enumerate(messages) if isinstance(message, HumanMessage)),
+            default=0,
+        )
+        question = messages[turn_start].content if messages else ""
+        execution = next(
+            (
+                message
+                for message in reversed(messages[turn_start:])
+                if getattr(message, "name", None) == EXECUTION_AGENT
+            ),
+            None,
+        )
+
+        if "QueryValidation" in self.tool_names:
+            return _tool_call("QueryValidation", {"is_valid": True, "explanation": "Scripted validation."})
+
+        if "MongoSchema" in self.tool_names:
+            user_query = question.rsplit("Input:", 1)[-1].strip()
+            pipeline = self.pipelines.get(normalize_question(user_query))
+            if pipeline is None:
+                template = match_template(user_query)
+                pipeline = render_pipeline(template.pipeline) if template else DEFAULT_PIPELINE
+            return _tool_call("MongoSchema", {"mongodb_query": pipeline})
+
+        if "redirect_tool" in self.tool_names and isinstance(last, HumanMessage):
+            small_talk = IntentClassifier._small_talk(re.findall(r"[a-z0-9]+", question.lower()))
+            if small_talk:
+                return AIMessage(content=GREETING_TEMPLATES[small_talk])
+            return _tool_call("redirect_tool", {"next_agent": ANALYTICS_AGENT})
+
+        if "write_query_tool" in self.tool_names and execution is None:
+            answer = self.answers.get(normalize_question(question))
+            if answer is not None:
+                return AIMessage(content=answer)
+            return _tool_call("write_query_tool", {"user_query": question})
+
+        if execution is not None:
+            return AIMessage(content=f"Here is what I found. {execution.content}")
+        return AIMessage(content="Hello! How can I help you with the procurement data?")
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        message = self._respond(messages)
+        # Rough token counts, so that cost reports are populated offline too.
+        input_tokens = sum(len(str(m.content).split()) for m in messages)
+        output_tokens = len(str(message.content).split()) + 10 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages)
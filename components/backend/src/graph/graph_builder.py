@@ -1,12 +1,18 @@
-from graph.agents.greeting_agent import greeting_agent
-from graph.agents.analytics_agent import analytics_agent
+from graph.agents.greeting_agent import create_greeting_agent
+from graph.agents.analytics_agent import create_analytics_agent
 from graph.agents.validation_agent import validation_agent
 from graph.agents.execution_agent import execution_agent
+from graph.intent_router import IntentClassifier, create_intent_router
+from graph.query_fixer import QueryFixer, create_query_fixer
+from graph.result_renderer import ResultRenderer
 from graph.graph_routes import (
     pre_greeting_routing,
+    intent_routing,
     post_greeting_routing,
     analytics_routing,
     validation_routing,
+    execution_routing,
+    repair_routing,
 )
 from graph.graph_state import (
     AgentState,
@@ -14,9 +20,16 @@ from graph.graph_state import (
     VALIDATION_AGENT,
     EXECUTION_AGENT,
     ANALYTICS_AGENT,
+    INTENT_ROUTER,
+    QUERY_FIXER,
 )
 from langgraph.graph import StateGraph, END, START
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
+from typing import Optional
+from services.approximate import ApproximateExecutor
+from services.columnar_engine import ColumnarEngine
+from services.single_flight import SingleFlight
 
 
 class GraphBuilder:
@@ -25,17 +38,56 @@ class GraphBuilder:
 
     Attributes:
         mongo_client: An instance of a MongoDB client for database interactions.
+        checkpointer: The checkpointer persisting the conversation state of each thread.
+        intent_classifier: The local classifier routing new turns ahead of the Greeting_Agent, if enabled.
+        execution_flight: Coalesces identical pipelines executed concurrently, if enabled.
+        max_repair_attempts: Repairs of an invalid or failing pipeline allowed per turn.
+        result_renderer: Renders query results as the answer without an LLM call, if enabled.
+        approximate_executor: Estimates eligible queries from a sample of the orders, if enabled.
+        columnar_engine: Runs the pipelines it supports on an in-memory snapshot, if loaded.
         graph: The state graph for handling agents and transitions.
         graph_builder: A compiled version of the state graph with checkpointing.
     """
 
-    def __init__(self, mongo_client):
+    def __init__(
+        self,
+        mongo_client,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        intent_classifier: Optional[IntentClassifier] = None,
+        execution_flight: Optional[SingleFlight] = None,
+        max_repair_attempts: int = 2,
+        result_renderer: Optional[ResultRenderer] = None,
+        approximate_executor: Optional[ApproximateExecutor] = None,
+        columnar_engine: Optional[ColumnarEngine] = None,
+    ):
         """
         Initializes the graph service with the provided MongoDB client.
 
         :param mongo_client: A MongoDB client for database interactions.
+        :param checkpointer: The checkpointer to compile the graph with, defaults to an in-process `MemorySaver`.
+        :param intent_classifier: When set, turns without a current route go through a local intent
+            router that answers small talk and sends analytical questions to the Analytics_Agent
+            without the Greeting_Agent's LLM call.
+        :param execution_flight: When set, threads executing the same pipeline concurrently share
+            one aggregation.
+        :param max_repair_attempts: Number of times per turn an invalid or failing pipeline is
+            corrected locally or regenerated before the question is given up.
+        :param result_renderer: When set, the Execution_Agent answers questions that only ask for
+            figures with a locally rendered table and gives the Analytics_Agent a compact summary
+            of the results for the others.
+        :param approximate_executor: When set, eligible pipelines of questions asking for an
+            estimate run over a sample and answer with confidence intervals.
+        :param columnar_engine: When set, the pipelines it supports run on its in-memory snapshot
+            of the line items and the others on MongoDB.
         """
         self.mongo_client = mongo_client
+        self.checkpointer = checkpointer or MemorySaver()
+        self.intent_classifier = intent_classifier
+        self.execution_flight = execution_flight
+        self.max_repair_attempts = max_repair_attempts
+        self.result_renderer = result_renderer
+        self.approximate_executor = approximate_executor
+        self.columnar_engine = columnar_engine
 
     async def initialize_graph(self) -> StateGraph:
         """
@@ -46,21 +98,45 @@ class GraphBuilder:
         graph = StateGraph(AgentState)
 
         # Add nodes
-        graph.add_node(GREETING_AGENT, greeting_agent)
-        graph.add_node(ANALYTICS_AGENT, analytics_agent)
+        graph.add_node(GREETING_AGENT, create_greeting_agent())
+        graph.add_node(ANALYTICS_AGENT, create_analytics_agent())
         graph.add_node(VALIDATION_AGENT, validation_agent)
 
         async def execution_agent_with_mongo(state: AgentState, config: dict):
-            return await execution_agent(state, config, self.mongo_client)
+            return await execution_agent(
+                state,
+                config,
+                self.mongo_client,
+                self.execution_flight,
+                self.result_renderer,
+                self.approximate_executor,
+                self.columnar_engine,
+            )
 
         graph.add_node(EXECUTION_AGENT, execution_agent_with_mongo)
+        graph.add_node(
+            QUERY_FIXER, create_query_fixer(QueryFixer(), self.max_repair_attempts)
+        )
 
         # Add conditional edges
-        graph.add_conditional_edges(
-            START,
-            pre_greeting_routing(GREETING_AGENT),
-            [GREETING_AGENT, ANALYTICS_AGENT, END],
-        )
+        if self.intent_classifier:
+            graph.add_node(INTENT_ROUTER, create_intent_router(self.intent_classifier))
+            graph.add_conditional_edges(
+                START,
+                pre_greeting_routing(INTENT_ROUTER),
+                [INTENT_ROUTER, GREETING_AGENT, ANALYTICS_AGENT, END],
+            )
+            graph.add_conditional_edges(
+                INTENT_ROUTER,
+                intent_routing,
+                [ANALYTICS_AGENT, GREETING_AGENT, END],
+            )
+        else:
+            graph.add_conditional_edges(
+                START,
+                pre_greeting_routing(GREETING_AGENT),
+                [GREETING_AGENT, ANALYTICS_AGENT, END],
+            )
         graph.add_conditional_edges(
             GREETING_AGENT,
             post_greeting_routing(END),
@@ -69,17 +145,23 @@ class GraphBuilder:
         graph.add_conditional_edges(
             ANALYTICS_AGENT,
             analytics_routing,
-            [VALIDATION_AGENT, END],
+            [VALIDATION_AGENT, EXECUTION_AGENT, END],
         )
         graph.add_conditional_edges(
             VALIDATION_AGENT,
             validation_routing,
-            [EXECUTION_AGENT, ANALYTICS_AGENT],
+            [EXECUTION_AGENT, QUERY_FIXER],
+        )
+        graph.add_conditional_edges(
+            EXECUTION_AGENT,
+            execution_routing,
+            [QUERY_FIXER, ANALYTICS_AGENT, END],
+        )
+        graph.add_conditional_edges(
+            QUERY_FIXER,
+            repair_routing,
+            [VALIDATION_AGENT, ANALYTICS_AGENT, END],
         )
 
-        # Add direct edge
-        graph.add_edge(EXECUTION_AGENT, ANALYTICS_AGENT)
-
-        memory = MemorySaver()
-        graph = graph.compile(checkpointer=memory)
+        graph = graph.compile(checkpointer=self.checkpointer)
         return graph
@@ -6,13 +6,15 @@ from graph.graph_state import (
     VALIDATION_AGENT,
     EXECUTION_AGENT,
     ANALYTICS_AGENT,
+    QUERY_FIXER,
 )
+from graph.intent_router import GREETING_TEMPLATES
 
 
 def pre_greeting_routing(default_route: str):
     def routing(state: AgentState) -> str:
         if "current_route" in state and state["current_route"]:
-            if state["current_route"] in [EXECUTION_AGENT, VALIDATION_AGENT]:
+            if state["current_route"] in [EXECUTION_AGENT, VALIDATION_AGENT, QUERY_FIXER]:
                 return ANALYTICS_AGENT
             return state["current_route"]
         else:
@@ -21,22 +23,37 @@ def pre_greeting_routing(default_route: str):
     return routing
 
 
+def intent_routing(
+    state: AgentState,
+) -> Literal["Analytics_Agent", "Greeting_Agent", "__end__"]:
+    if state.get("current_route") == ANALYTICS_AGENT:
+        return ANALYTICS_AGENT
+    elif state.get("intent") in GREETING_TEMPLATES:
+        return END
+    else:
+        return GREETING_AGENT
+
+
 def post_greeting_routing(default_route: str):
     def routing(state: AgentState) -> str:
         if "current_route" not in state or state["current_route"] == GREETING_AGENT:
             return default_route
         elif "current_route" in state and state["current_route"]:
-            if state["current_route"] in [EXECUTION_AGENT, VALIDATION_AGENT]:
+            if state["current_route"] in [EXECUTION_AGENT, VALIDATION_AGENT, QUERY_FIXER]:
                 return ANALYTICS_AGENT
             return state["current_route"]
 
     return routing
 
 
-def analytics_routing(state: AgentState) -> Literal["Validation_Agent", "__end__"]:
+def analytics_routing(
+    state: AgentState,
+) -> Literal["Validation_Agent", "Execution_Agent", "__end__"]:
     current_route = state.get("current_route")
     query_generated = state.get("generated_query")
-    if current_route == ANALYTICS_AGENT and query_generated:
+    if current_route == ANALYTICS_AGENT and query_generated and state.get("query_trusted"):
+        return EXECUTION_AGENT
+    elif current_route == ANALYTICS_AGENT and query_generated:
         return VALIDATION_AGENT
     else:
         return END
@@ -44,10 +61,26 @@ def analytics_routing(state: AgentState) -> Literal["Validation_Agent", "__end__
 
 def validation_routing(
     state: AgentState,
-) -> Literal["Analytics_Agent", "Execution_Agent"]:
+) -> Literal["Query_Fixer", "Execution_Agent"]:
     current_route = state.get("current_route")
     is_valid = state.get("query_correct")
     if current_route == VALIDATION_AGENT and is_valid:
         return EXECUTION_AGENT
     elif current_route == VALIDATION_AGENT and not is_valid:
-        return ANALYTICS_AGENT
+        return QUERY_FIXER
+
+
+def execution_routing(
+    state: AgentState,
+) -> Literal["Query_Fixer", "Analytics_Agent", "__end__"]:
+    if state.get("execution_error"):
+        return QUERY_FIXER
+    elif state.get("result_rendered"):
+        return END
+    return ANALYTICS_AGENT
+
+
+def repair_routing(
+    state: AgentState,
+) -> Literal["Validation_Agent", "Execution_Agent", "Analytics_Agent", "__end__"]:
+    return state.get("repair_route") or END
@@ -4,11 +4,25 @@ GREETING_AGENT = "Greeting_Agent"
 ANALYTICS_AGENT = "Analytics_Agent"
 VALIDATION_AGENT = "Validation_Agent"
 EXECUTION_AGENT = "Execution_Agent"
+INTENT_ROUTER = "Intent_Router"
+QUERY_FIXER = "Query_Fixer"
 
 
 class AgentState(MessagesState):
     current_route: str
+    intent: str
     user_query: str
     generated_query: str
     query_correct: bool
+    query_trusted: bool
     query_result: str
+    executed_query: str
+    execution_error: str
+    result_rendered: bool
+    query_estimate: dict
+    query_execution: dict
+    repair_attempts: int
+    repair_turn: str
+    repair_route: str
+    context_summary: str
+    summarized_exchanges: int
@@ -0,0 +1,181 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from langchain_core.messages import AIMessage, HumanMessage
+from graph.graph_state import AgentState, ANALYTICS_AGENT, GREETING_AGENT
+from graph.text_index import LocalTextIndex, tokenize
+
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+THANKS = "thanks"
+GOODBYE = "goodbye"
+ANALYTICS = "analytics"
+OTHER = "other"
+
+GREETING_TEMPLATES = {
+    GREETING: "Hello! Welcome to the Procurement Chatbot. How can I assist you today?",
+    THANKS: "You're welcome! Let me know if there is anything else I can help you with.",
+    GOODBYE: "Goodbye! Feel free to come back whenever you have questions about procurement data.",
+}
+
+SMALL_TALK_WORDS = {
+    GREETING: {
+        "hi", "hello", "hey", "hiya", "there", "good", "morning", "afternoon", "evening", "penny",
+        "greetings", "how", "are", "doing",
+    },
+    THANKS: {"thanks", "thank", "you", "thx", "very", "much", "great", "ok", "okay", "cool", "perfect"},
+    GOODBYE: {"bye", "goodbye", "see", "later", "cya", "night"},
+}
+
+ANALYTICS_KEYWORDS = {
+    "order", "orders", "ordered", "purchase", "purchases", "purchased", "spending", "spend", "spent",
+    "total", "count", "number", "many", "much", "sum", "average", "avg", "mean", "top", "highest",
+    "lowest", "most", "least", "supplier", "suppliers", "vendor", "vendors", "department",
+    "departments", "item", "items", "price", "prices", "cost", "costs", "quantity", "acquisition",
+    "quarter", "month", "monthly", "year", "yearly", "fiscal", "calcard", "commodity", "unspsc",
+}
+
+# Labelled exemplars of the nearest-neighbour fallback. Messages the rules miss are labelled by
+# their most similar exemplars, `other` requests are left to the Greeting_Agent's LLM.
+INTENT_EXEMPLARS: Dict[str, List[str]] = {
+    GREETING: [
+        "hello", "hi there", "hey penny", "good morning", "good evening", "hello, how are you?",
+    ],
+    THANKS: ["thank you", "thanks a lot", "great, thanks!", "thank you very much"],
+    GOODBYE: ["bye", "goodbye", "see you later", "have a good day, bye"],
+    ANALYTICS: [
+        "Total number of orders created during Q1 of 2013",
+        "How many purchase orders were placed in 2014?",
+        "Which supplier received the most money?",
+        "Show me the top 5 suppliers by spending",
+        "What was the total spending in 2013?",
+        "Which quarter had the highest spending?",
+        "List the most frequently ordered items",
+        "Average unit price of paper products",
+        "Spending grouped by acquisition type",
+        "Which department spent the most in fiscal year 2014-2015?",
+        "How many orders used a CalCard?",
+        "Monthly order volume for the Department of Corrections",
+        "Compare IT goods and IT services spending by year",
+        "What are the biggest purchases of 2012?",
+    ],
+    OTHER: [
+        "what can you do?",
+        "who are you?",
+        "can you help me?",
+        "I need some help",
+        "what kind of data do you have?",
+        "tell me a joke",
+    ],
+}
+
+
+@dataclass
+class Intent:
+    label: str
+    confidence: float
+    source: str
+
+
+class IntentClassifier:
+    """
+    Classifies the first message of a turn without calling the LLM.
+
+    Clear cases are decided by rules: messages made only of small-talk words, and messages
+    mentioning several procurement terms or a year with one. Other messages are labelled by a
+    similarity-weighted vote of their nearest exemplars.
+    """
+
+    def __init__(
+        self,
+        exemplars: Dict[str, List[str]] = INTENT_EXEMPLARS,
+        k: int = 5,
+        min_similarity: float = 0.2,
+        min_confidence: float = 0.6,
+    ):
+        """
+        :param exemplars: Example messages per intent label.
+        :param k: Number of neighbours voting on a label.
+        :param min_similarity: Similarity the best neighbour must reach for a vote to count.
+        :param min_confidence: Share of the vote the winning label must reach.
+        """
+        self.k = k
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self.index = LocalTextIndex(
+            [(text, label) for label, texts in exemplars.items() for text in texts]
+        )
+
+    @staticmethod
+    def _small_talk(words: List[str]) -> Optional[str]:
+        small_talk = set().union(*SMALL_TALK_WORDS.values())
+        if len(words) > 6 or not all(word in small_talk for word in words):
+            return None
+        for label, vocabulary in SMALL_TALK_WORDS.items():
+            if words[0] in vocabulary:
+                return label
+        return None
+
+    def classify(self, text: str) -> Intent:
+        """
+        :param text: The user message.
+        :return: The intent, `other` when no label is confident enough.
+        """
+        words = re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+        if not words:
+            return Intent(OTHER, 0.0, "rule")
+
+        small_talk = self._small_talk(words)
+        if small_talk:
+            return Intent(small_talk, 1.0, "rule")
+
+        keywords = {word for word in tokenize(text) if word in ANALYTICS_KEYWORDS}
+        has_year = re.search(r"\b20\d{2}\b", text) is not None
+        if len(keywords) >= 2 or (has_year and keywords):
+            return Intent(ANALYTICS, 1.0, "rule")
+
+        neighbours = self.index.search(text, self.k)
+        if not neighbours or neighbours[0][0] < self.min_similarity:
+            return Intent(OTHER, 0.0, "knn")
+        votes: Dict[str, float] = {}
+        for score, label in neighbours:
+            votes[label] = votes.get(label, 0.0) + max(score, 0.0)
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        confidence = weight / sum(votes.values())
+        if confidence < self.min_confidence:
+            return Intent(OTHER, confidence, "knn")
+        return Intent(label, confidence, "knn")
+
+
+def _last_user_message(state: AgentState) -> str:
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            return message.content
+    return ""
+
+
+def create_intent_router(classifier: IntentClassifier):
+    """
+    Creates the graph node running the intent classifier ahead of the Greeting_Agent.
+
+    Analytical questions set `current_route` to the Analytics_Agent, small talk is answered
+    from a template and anything else is left to the Greeting_Agent.
+    """
+
+    async def intent_router(state: AgentState) -> dict:
+        intent = classifier.classify(_last_user_message(state))
+        logger.info(
+            f"Intent router: {intent.label} ({intent.source}, confidence {intent.confidence:.2f})"
+        )
+        if intent.label == ANALYTICS:
+            return {"intent": intent.label, "current_route": ANALYTICS_AGENT}
+        if intent.label in GREETING_TEMPLATES:
+            answer = AIMessage(content=GREETING_TEMPLATES[intent.label], name=GREETING_AGENT)
+            return {"intent": intent.label, "messages": [answer]}
+        return {"intent": intent.label}
+
+    return intent_router
+
@@ -1,12 +1,18 @@
+from functools import lru_cache
+from typing import Optional
 from langchain.chat_models import init_chat_model
 from config import Config
+from graph.llm_gateway import LLMGateway
+from graph.fake_llm import FakeChatModel
 
 
-def initialize_llm(config: Config):
+def initialize_llm(config: Config, gateway: Optional[LLMGateway] = None):
     """
     Initializes the LLM based on the project configuration.
 
     :param config: The Config object containing all settings.
+    :param gateway: The gateway the model's requests go through. Retries are left to the gateway,
+        which honors the provider's rate limits.
     :return: An initialized LLM instance.
     """
     # Map model providers to their respective configurations
@@ -29,13 +35,47 @@ def initialize_llm(config: Config):
     }
 
     model_provider = config.project.model_provider
+    if model_provider == "fake":
+        return FakeChatModel.from_script(
+            config.fake_llm.SCRIPT_PATH or None,
+            latency_ms=config.fake_llm.LATENCY_MS,
+            jitter_ms=config.fake_llm.JITTER_MS,
+        )
     if model_provider not in provider_config_map:
         raise ValueError(f"Unsupported model provider: {model_provider}")
 
     user_config = provider_config_map[model_provider]
+    if gateway is not None:
+        user_config["http_async_client"] = gateway.client(user_config["model"])
+        user_config["max_retries"] = 0
 
     return init_chat_model(**user_config)
 
 
-config = Config()
-llm = initialize_llm(config)
+def provider_url(config: Config) -> Optional[str]:
+    """
+    :return: The base URL of the configured provider, None for the offline fake model.
+    """
+    if config.project.model_provider == "azure_openai":
+        return config.azure_llm.AZURE_ENDPOINT or None
+    if config.project.model_provider == "openai":
+        return "https://api.openai.com/v1"
+    return None
+
+
+# The configuration, gateway and model are created on first use rather than on import, so that
+# importing the graph stays cheap and the app creates them during its warm-up.
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    return Config()
+
+
+@lru_cache(maxsize=None)
+def get_gateway() -> LLMGateway:
+    config = get_config()
+    return LLMGateway.from_settings(config.llm_gateway, workers=config.serving.WORKERS)
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    return initialize_llm(get_config(), get_gateway())
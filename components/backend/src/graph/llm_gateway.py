@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, Optional
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Limits the rate of requests to `rate` per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class GatewayMetrics:
+    """
+    Counters of one model's calls, separating the time spent waiting for a slot from the time
+    spent in the provider. The model time runs until the response is closed, after the last
+    token of streamed completions.
+    """
+
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    queue_wait_ms: float = 0.0
+    max_queue_wait_ms: float = 0.0
+    model_ms: float = 0.0
+    max_model_ms: float = 0.0
+
+    def observe(self, queue_wait_ms: float, model_ms: float):
+        self.requests += 1
+        self.queue_wait_ms += queue_wait_ms
+        self.max_queue_wait_ms = max(self.max_queue_wait_ms, queue_wait_ms)
+        self.model_ms += model_ms
+        self.max_model_ms = max(self.max_model_ms, model_ms)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Reads the delay requested by the provider from `retry-after-ms` or `Retry-After`, given in
+    seconds or as an HTTP date.
+    """
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """
+    Response body calling `release` once it is closed, so that the gateway's slot of a streamed
+    completion stays taken until its last chunk has been read.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class GatewayTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport of one model's client, routing its requests through the gateway.
+    """
+
+    def __init__(self, gateway: "LLMGateway", model: str, transport: httpx.AsyncBaseTransport):
+        self.gateway = gateway
+        self.model = model
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        gateway = self.gateway
+        metrics = gateway.metrics_for(self.model)
+        model_semaphore = gateway.model_semaphore(self.model)
+        queue_wait = 0.0
+
+        def release():
+            metrics.in_flight -= 1
+            model_semaphore.release()
+            gateway.semaphore.release()
+
+        for attempt in range(gateway.max_retries + 1):
+            queued_at = time.perf_counter()
+            # The slots are released when the response is closed rather than when its headers
+            # arrive, so that streamed completions count against the limits until they end.
+            await gateway.semaphore.acquire()
+            try:
+                await model_semaphore.acquire()
+            except BaseException:
+                gateway.semaphore.release()
+                raise
+            metrics.in_flight += 1
+            try:
+                await gateway.bucket.acquire()
+                started_at = time.perf_counter()
+                queue_wait += started_at - queued_at
+                response = await self.transport.handle_async_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                release()
+                if attempt == gateway.max_retries:
+                    metrics.failures += 1
+                    raise
+                response, error = None, e
+            except BaseException:
+                release()
+                raise
+
+            if response is not None and (
+                response.status_code not in RETRY_STATUS_CODES or attempt == gateway.max_retries
+            ):
+                if response.status_code >= 400:
+                    metrics.failures += 1
+
+                def finish(queue_wait: float = queue_wait, started_at: float = started_at):
+                    release()
+                    metrics.observe(queue_wait * 1000, (time.perf_counter() - started_at) * 1000)
+
+                if response.is_closed:
+                    # Read in full by the transport, as mock transports do.
+                    finish()
+                else:
+                    response.stream = ReleasingStream(response.stream, finish)
+                return response
+
+            if response is None:
+                delay = gateway.backoff(attempt)
+                logger.warning(f"LLM request to {self.model} failed ({error!r}), retrying in {delay:.2f}s")
+            else:
+                try:
+                    await response.aclose()
+                finally:
+                    release()
+                if response.status_code == 429:
+                    metrics.rate_limited += 1
+                delay = gateway.backoff(attempt, retry_after_seconds(response))
+                logger.warning(
+                    f"LLM request to {self.model} returned {response.status_code}, "
+                    f"retrying in {delay:.2f}s"
+                )
+            metrics.retries += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        # The connection pool is shared with the other models' clients and closed by the gateway.
+        pass
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """
+    Sends requests over the gateway's pool without the gateway's limits, nor closing the pool.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+
+class LLMGateway:
+    """
+    Shares one pooled keep-alive HTTP connection pool, concurrency limits and a request rate
+    limit between all LLM clients, and retries throttled or failed requests with jittered
+    exponential backoff honoring the provider's `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_concurrency_per_model: int = 8,
+        requests_per_second: float = 5.0,
+        burst: int = 10,
+        max_retries: int = 4,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 20.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout_seconds: float = 60.0,
+    ):
+        """
+        :param max_concurrency: Maximum number of LLM requests in flight, all models together.
+        :param max_concurrency_per_model: Maximum number of requests in flight per model.
+        :param requests_per_second: Sustained request rate sent to the provider.
+        :param burst: Number of requests that can be sent at once after an idle period.
+        :param max_retries: Retries of a throttled, failed or timed out request.
+        :param backoff_base_seconds: Base of the exponential backoff.
+        :param backoff_max_seconds: Upper bound of any retry delay, `Retry-After` included.
+        :param max_connections: Size of the connection pool.
+        :param max_keepalive_connections: Idle connections kept open.
+        :param keepalive_expiry: Seconds an idle connection is kept open.
+        :param timeout_seconds: Timeout of a request.
+        """
+        self.max_concurrency_per_model = max_concurrency_per_model
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.timeout_seconds = timeout_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            )
+        )
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._metrics: Dict[str, GatewayMetrics] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def from_settings(cls, settings, workers: int = 1) -> "LLMGateway":
+        """
+        Creates the gateway from the `LLMGateway` settings of the configuration.
+
+        The concurrency and rate limits are set for the whole server, so each of its `workers`
+        processes gets an equal share of them. The connection pool is per process.
+        """
+        workers = max(workers, 1)
+        return cls(
+            max_concurrency=max(settings.MAX_CONCURRENCY // workers, 1),
+            max_concurrency_per_model=max(settings.MAX_CONCURRENCY_PER_MODEL // workers, 1),
+            requests_per_second=settings.REQUESTS_PER_SECOND / workers,
+            burst=max(settings.BURST // workers, 1),
+            max_retries=settings.MAX_RETRIES,
+            backoff_base_seconds=settings.BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=settings.BACKOFF_MAX_SECONDS,
+            max_connections=settings.MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.KEEPALIVE_EXPIRY_SECONDS,
+            timeout_seconds=settings.TIMEOUT_SECONDS,
+        )
+
+    def model_semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._model_semaphores:
+            self._model_semaphores[model] = asyncio.Semaphore(self.max_concurrency_per_model)
+        return self._model_semaphores[model]
+
+    def metrics_for(self, model: str) -> GatewayMetrics:
+        return self._metrics.setdefault(model, GatewayMetrics())
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: The counters of each model.
+        """
+        return {model: asdict(metrics) for model, metrics in self._metrics.items()}
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Returns the delay before a retry: the provider's `Retry-After` when given, otherwise a
+        full-jitter exponential backoff.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_seconds)
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt))
+
+    def client(self, model: str) -> httpx.AsyncClient:
+        """
+        Returns the async HTTP client of a model, sharing the gateway's connection pool and limits.
+        """
+        if model not in self._clients:
+            self._clients[model] = httpx.AsyncClient(
+                transport=GatewayTransport(self, model, self.transport),
+                timeout=self.timeout_seconds,
+            )
+        return self._clients[model]
+
+    async def warm_up(self, url: str) -> None:
+        """
+        Opens a keep-alive connection to the provider ahead of the first LLM call. The response
+        status does not matter and failures are only logged.
+        """
+        try:
+            async with httpx.AsyncClient(transport=_SharedTransport(self.transport), timeout=5) as client:
+                await client.head(url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not open a connection to {url}: {e!r}")
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,103 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from graph.config_llm import ConfigLLM
+from graph.text_index import LocalTextIndex
+
+
+def _field_text(path: str, description: str) -> str:
+    return f"{path.replace('.', ' ')}: {description}"
+
+
+class PromptAssembler:
+    """
+    Selects the few-shot examples and schema sections relevant to a question.
+
+    The example bank and the field descriptions are embedded once into local text indexes, so
+    only the `examples_k` closest examples and `sections_k` closest fields are sent to the LLM
+    instead of the whole schema description and every example.
+    """
+
+    def __init__(
+        self,
+        examples: List[Dict[str, Any]],
+        field_descriptions: Dict[str, str],
+        examples_k: int = 3,
+        sections_k: int = 6,
+        always_included: Tuple[str, ...] = ("creationDate",),
+        min_field_score: float = 0.1,
+    ):
+        """
+        :param examples: Example bank, dictionaries with a `query` and a `pipeline`.
+        :param field_descriptions: Field path to description.
+        :param examples_k: Number of examples selected per question.
+        :param sections_k: Number of schema sections selected per question.
+        :param always_included: Fields whose section is always selected.
+        :param min_field_score: Similarity below which a field is not considered relevant.
+        """
+        self.field_descriptions = field_descriptions
+        self.examples_k = examples_k
+        self.sections_k = sections_k
+        self.always_included = always_included
+        self.min_field_score = min_field_score
+        self.example_index = LocalTextIndex(
+            [(example["query"], example) for example in examples]
+        )
+        self.field_index = LocalTextIndex(
+            [(_field_text(path, text), path) for path, text in field_descriptions.items()]
+        )
+
+    def select_examples(self, question: str) -> List[Dict[str, Any]]:
+        """
+        Returns the examples closest to the question, best first.
+        """
+        return [example for _, example in self.example_index.search(question, self.examples_k)]
+
+    def select_fields(self, question: str, pipeline: Optional[str] = None) -> List[str]:
+        """
+        Returns the field paths relevant to the question, in schema order.
+
+        :param question: The user question.
+        :param pipeline: A generated pipeline, every field it references is selected too.
+        """
+        selected = set(self.always_included)
+        selected.update(
+            path
+            for score, path in self.field_index.search(question, self.sections_k)
+            if score >= self.min_field_score
+        )
+        if pipeline:
+            for path in self.field_descriptions:
+                leaf = path.rsplit(".", 1)[-1]
+                if re.search(rf"\b{re.escape(leaf)}\b", pipeline):
+                    selected.add(path)
+        return [path for path in self.field_descriptions if path in selected]
+
+    def schema_sections(self, question: str, pipeline: Optional[str] = None) -> str:
+        """
+        Renders the descriptions of the relevant fields for a prompt.
+        """
+        return "\n".join(
+            f"- {path}: {self.field_descriptions[path]}"
+            for path in self.select_fields(question, pipeline)
+        )
+
+    def few_shot_examples(self, question: str) -> str:
+        """
+        Renders the relevant examples for a prompt, pipelines in Python syntax.
+        """
+        return "\n\n".join(
+            f"Input: {example['query']}\nOutput: {example['pipeline']!r}"
+            for example in self.select_examples(question)
+        )
+
+
+def create_prompt_assembler(examples_k: int = 3, sections_k: int = 6) -> PromptAssembler:
+    """
+    Builds the assembler over the order schema and example bank of `ConfigLLM`.
+    """
+    return PromptAssembler(
+        ConfigLLM.FEW_SHOT_EXAMPLES,
+        ConfigLLM.ORDER_FIELD_DESCRIPTIONS,
+        examples_k=examples_k,
+        sections_k=sections_k,
+    )
@@ -0,0 +1,276 @@
+import datetime
+import difflib
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from langchain_core.messages import AIMessage, HumanMessage
+from graph.config_llm import ConfigLLM
+from graph.graph_state import (
+    AgentState,
+    ANALYTICS_AGENT,
+    QUERY_FIXER,
+    VALIDATION_AGENT,
+)
+from graph.query_templates import render_pipeline
+from graph.utils import eval_mongodb_query
+
+
+logger = logging.getLogger(__name__)
+
+# Stages whose keys name the fields they output rather than fields of the documents.
+OUTPUT_STAGES = {"$group", "$project", "$addFields", "$set", "$bucket", "$facet"}
+FIELD_KEY_STAGES = {"$match", "$sort"}
+LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%Y/%m/%d")
+
+
+def _schema_fields(schema: Dict[str, Any], prefix: str = "") -> Dict[str, str]:
+    fields = {}
+    for name, value in schema.items():
+        path = f"{prefix}{name}"
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            fields[path] = "array"
+            fields.update(_schema_fields(value[0], f"{path}."))
+        else:
+            fields[path] = value
+    return fields
+
+
+def schema_fields(schema: str = ConfigLLM.ORDER_SCHEMA) -> Dict[str, str]:
+    """
+    Parses the prompt's schema description into a mapping of field path to type.
+    """
+    return _schema_fields(json.loads(schema.replace("{{", "{").replace("}}", "}")))
+
+
+def parse_date(value: str) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+@dataclass
+class QueryFixer:
+    """
+    Cheap, deterministic corrections of common pipeline mistakes, tried before asking the LLM
+    for a new pipeline:
+
+    - misspelled field paths, fuzzy-matched against the schema, and line item fields used
+      without their `lineItems.` prefix;
+    - line item fields grouped, summed or sorted on without `$unwind` of `$lineItems`;
+    - dates compared as strings.
+    """
+
+    fields: Dict[str, str] = field(default_factory=schema_fields)
+    cutoff: float = 0.8
+
+    def __post_init__(self):
+        self.date_fields = {path for path, type_ in self.fields.items() if type_ == "Date"}
+        self._by_lower = {path.lower(): path for path in self.fields}
+        self._leaves = {}
+        for path in self.fields:
+            if "." in path:
+                self._leaves.setdefault(path.rsplit(".", 1)[1].lower(), path)
+
+    def fix(self, pipeline: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        :return: The corrected pipeline and a description of each correction, empty when the
+            pipeline was left as is.
+        """
+        fixes: List[str] = []
+        outputs = self._output_names(pipeline)
+        pipeline = [self._fix_node(stage, outputs, fixes) for stage in pipeline]
+        pipeline = self._fix_dates(pipeline, fixes)
+        pipeline = self._fix_unwind(pipeline, fixes)
+        return pipeline, fixes
+
+    @staticmethod
+    def _output_names(pipeline: List[Dict[str, Any]]) -> Set[str]:
+        names = {"_id"}
+        for stage in pipeline:
+            for operator, body in stage.items():
+                if operator in OUTPUT_STAGES and isinstance(body, dict):
+                    names.update(body)
+                elif operator in ("$count", "$sortByCount") and isinstance(body, str):
+                    names.add(body)
+                elif operator == "$unwind" and isinstance(body, dict):
+                    names.update(
+                        value for key, value in body.items() if key == "includeArrayIndex"
+                    )
+        return names
+
+    def _correct_path(self, path: str, outputs: Set[str]) -> Optional[str]:
+        if path in self.fields or path.split(".")[0] in outputs or path.startswith("_id."):
+            return None
+        lowered = path.lower()
+        if lowered in self._by_lower:
+            return self._by_lower[lowered]
+        if lowered in self._leaves:
+            return self._leaves[lowered]
+        matches = difflib.get_close_matches(path, list(self.fields), n=1, cutoff=self.cutoff)
+        if matches:
+            return matches[0]
+        leaf_matches = difflib.get_close_matches(lowered, list(self._leaves), n=1, cutoff=self.cutoff)
+        return self._leaves[leaf_matches[0]] if leaf_matches else None
+
+    def _fix_path(self, path: str, outputs: Set[str], fixes: List[str]) -> str:
+        corrected = self._correct_path(path, outputs)
+        if corrected is None or corrected == path:
+            return path
+        fixes.append(f"renamed field `{path}` to `{corrected}`")
+        return corrected
+
+    def _fix_node(self, node: Any, outputs: Set[str], fixes: List[str], field_keys: bool = False) -> Any:
+        if isinstance(node, list):
+            return [self._fix_node(item, outputs, fixes, field_keys) for item in node]
+        if isinstance(node, str):
+            if node.startswith("$") and not node.startswith("$$") and len(node) > 1:
+                return "$" + self._fix_path(node[1:], outputs, fixes)
+            return node
+        if not isinstance(node, dict):
+            return node
+        fixed = {}
+        for key, value in node.items():
+            if field_keys and not key.startswith("$"):
+                fixed[self._fix_path(key, outputs, fixes)] = self._fix_node(value, outputs, fixes)
+            else:
+                # Keys are field paths in `$match` and `$sort` bodies, and their `$and`/`$or`.
+                nested_field_keys = key in FIELD_KEY_STAGES or (field_keys and key in LOGICAL_OPERATORS)
+                fixed[key] = self._fix_node(value, outputs, fixes, nested_field_keys)
+        return fixed
+
+    def _fix_dates(self, pipeline: List[Dict[str, Any]], fixes: List[str]) -> List[Dict[str, Any]]:
+        def convert(value: Any, path: str) -> Any:
+            if isinstance(value, str):
+                date = parse_date(value)
+                if date is not None:
+                    fixes.append(f"converted `{path}` value {value!r} to a date")
+                    return date
+                return value
+            if isinstance(value, list):
+                return [convert(item, path) for item in value]
+            if isinstance(value, dict):
+                return {key: convert(item, path) for key, item in value.items()}
+            return value
+
+        def walk(node: Any) -> Any:
+            if isinstance(node, list):
+                return [walk(item) for item in node]
+            if not isinstance(node, dict):
+                return node
+            return {
+                key: convert(value, key) if key in self.date_fields else walk(value)
+                for key, value in node.items()
+            }
+
+        return [walk(stage) if "$match" in stage else stage for stage in pipeline]
+
+    @staticmethod
+    def _needs_unwind(stage: Dict[str, Any]) -> bool:
+        """
+        Whether a stage uses line item fields as if they were unwound: as a `$group` key, as a
+        `$sort` key, or as the operand of a `$sum` or `$avg` accumulator, which ignore arrays.
+        Expressions over the array, such as `{"$sum": "$lineItems.totalPrice"}` in a
+        `$project`, are valid per order and left alone.
+        """
+
+        def is_path(node: Any) -> bool:
+            return isinstance(node, str) and node.startswith("$lineItems.")
+
+        def in_key(node: Any) -> bool:
+            if isinstance(node, dict):
+                return any(in_key(value) for value in node.values())
+            if isinstance(node, list):
+                return any(in_key(item) for item in node)
+            return is_path(node)
+
+        if "$sort" in stage and isinstance(stage["$sort"], dict):
+            return any(key.startswith("lineItems.") for key in stage["$sort"])
+        group = stage.get("$group")
+        if not isinstance(group, dict):
+            return False
+        if in_key(group.get("_id")):
+            return True
+        return any(
+            isinstance(spec, dict) and any(
+                operator in ("$sum", "$avg") and is_path(operand) for operator, operand in spec.items()
+            )
+            for name, spec in group.items()
+            if name != "_id"
+        )
+
+    def _fix_unwind(self, pipeline: List[Dict[str, Any]], fixes: List[str]) -> List[Dict[str, Any]]:
+        for index, stage in enumerate(pipeline):
+            if "$unwind" in stage:
+                return pipeline
+            if self._needs_unwind(stage):
+                fixes.append("added `$unwind` of `$lineItems`")
+                return pipeline[:index] + [{"$unwind": "$lineItems"}] + pipeline[index:]
+        return pipeline
+
+
+def _turn_id(state: AgentState) -> Optional[str]:
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            return message.id
+    return None
+
+
+def create_query_fixer(fixer: QueryFixer, max_attempts: int):
+    """
+    Creates the graph node handling an invalid pipeline or a failed execution.
+
+    It first tries the local corrections of `fixer` and sends a corrected pipeline to the
+    Validation_Agent, whichever agent rejected it. Otherwise the Analytics_Agent regenerates
+    the pipeline. Each retry uses one of the `max_attempts` repairs of the turn, after which
+    the question is given up.
+    """
+
+    async def query_fixer(state: AgentState) -> dict:
+        turn_id = _turn_id(state)
+        attempts = state.get("repair_attempts", 0) if state.get("repair_turn") == turn_id else 0
+        update = {
+            "current_route": QUERY_FIXER,
+            "repair_turn": turn_id,
+            "repair_attempts": attempts + 1,
+        }
+
+        if attempts >= max_attempts:
+            logger.warning(f"Giving up on the query after {attempts} repairs")
+            answer = AIMessage(
+                content=(
+                    "I'm sorry, I could not build a working query for this question. "
+                    "Could you rephrase it or narrow it down, for example to a specific year?"
+                ),
+                name=ANALYTICS_AGENT,
+            )
+            return {**update, "repair_attempts": attempts, "repair_route": None, "messages": [answer]}
+
+        fixes: List[str] = []
+        try:
+            pipeline, fixes = fixer.fix(eval_mongodb_query(state.get("generated_query") or ""))
+        except Exception as e:
+            logger.info(f"The query could not be parsed for local repair: {str(e)}")
+
+        if not fixes:
+            return {**update, "repair_route": ANALYTICS_AGENT}
+
+        logger.info(f"Repaired the query locally: {'; '.join(fixes)}")
+        message = AIMessage(content=f"Corrected the query: {'; '.join(fixes)}.", name=QUERY_FIXER)
+        return {
+            **update,
+            "generated_query": render_pipeline(pipeline),
+            # A corrected pipeline is validated again, even after a failed execution.
+            "repair_route": VALIDATION_AGENT,
+            "messages": [message],
+        }
+
+    return query_fixer
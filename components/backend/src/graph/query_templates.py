@@ -0,0 +1,279 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from services.approximate import ESTIMATE_WORDS, EXACT_WORDS
+
+
+MONTHS = {
+    name: index
+    for index, names in enumerate(
+        [
+            ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+            ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+            ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"),
+            ("december", "dec"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+QUARTERS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+# Phrase -> grouping field, longer phrases first so that they win over their suffixes.
+GROUP_FIELDS = [
+    ("acquisition type", "acquisitionType"),
+    ("acquisition method", "acquisitionMethod"),
+    ("supplier qualification", "supplierQualifications"),
+    ("fiscal year", "fiscalYear"),
+    ("commodity title", "lineItems.commodityTitle"),
+    ("commodity", "lineItems.commodityTitle"),
+    ("department", "departmentName"),
+    ("supplier", "supplierName"),
+    ("vendor", "supplierName"),
+    ("line item", "lineItems.itemName"),
+    ("item", "lineItems.itemName"),
+]
+TIME_BUCKETS = ("quarter", "month", "year")
+# Years covered by the dataset, the Analytics_Agent answers questions about other years.
+DATA_YEARS = (2012, 2015)
+
+COUNT_WORDS = {"order", "orders", "ordered", "purchases", "purchased", "number", "count", "many", "frequently"}
+SPEND_WORDS = {"spending", "spend", "spent", "money", "cost", "costs", "price", "prices", "sum", "amount", "paid"}
+DESCENDING_WORDS = {"top", "highest", "most", "biggest", "largest"}
+ASCENDING_WORDS = {"lowest", "least", "smallest"}
+
+# Words that cannot restrict a question. A question containing any other word, e.g. a department
+# name, a price threshold or an average, falls back to the LLM.
+FILLER_WORDS = {
+    "a", "all", "an", "and", "are", "bought", "by", "calculate", "can", "count", "created", "did",
+    "do", "does", "during", "each", "find", "for", "frequently", "get", "give", "group", "grouped",
+    "had", "has", "have", "how", "identification", "identify", "in", "including", "is", "list",
+    "made", "many", "me", "much", "number", "of", "on", "order", "ordered", "orders", "our",
+    "over", "per", "placed", "please", "purchase", "purchased", "purchases", "received", "s",
+    "show", "tell", "the", "their", "total", "values", "was", "we", "were", "what", "whats",
+    "which", "you",
+} | COUNT_WORDS | SPEND_WORDS | DESCENDING_WORDS | ASCENDING_WORDS | ESTIMATE_WORDS | EXACT_WORDS
+
+
+@dataclass
+class TemplateMatch:
+    """
+    A question answered by a canonical pipeline, with the slots filled from the question.
+    """
+
+    name: str
+    slots: Dict[str, Any]
+    pipeline: List[Dict[str, Any]]
+
+
+def _period_end(start: datetime, months: int) -> datetime:
+    year, month = divmod(start.month - 1 + months, 12)
+    return datetime(start.year + year, month + 1, 1) - timedelta(seconds=1)
+
+
+def extract_period(text: str) -> Tuple[Optional[Tuple[datetime, datetime]], str]:
+    """
+    Extracts the creation date range a question refers to: a quarter, a month, a year or a range
+    of years.
+
+    :param text: The lowercased question.
+    :return: The `(start, end)` range or None for all time, and the text without the period.
+        A question naming several years outside a range is returned unchanged with no period.
+    """
+    patterns = [
+        (r"\b(?:q([1-4])|(first|1st|second|2nd|third|3rd|fourth|4th) quarter)(?: of)? (20\d{2})\b", "quarter"),
+        (rf"\b({'|'.join(MONTHS)})(?: of)? (20\d{{2}})\b", "month"),
+        (r"\b(?:from|between) (20\d{2}) (?:to|and|until|through) (20\d{2})\b", "range"),
+    ]
+    for pattern, kind in patterns:
+        match = re.search(pattern, text)
+        if not match:
+            continue
+        if kind == "quarter":
+            quarter = int(match.group(1)) if match.group(1) else QUARTERS[match.group(2)]
+            start = datetime(int(match.group(3)), 3 * quarter - 2, 1)
+            end = _period_end(start, 3)
+        elif kind == "month":
+            start = datetime(int(match.group(2)), MONTHS[match.group(1)], 1)
+            end = _period_end(start, 1)
+        else:
+            first, last = sorted(int(year) for year in match.groups())
+            start, end = datetime(first, 1, 1), datetime(last, 12, 31, 23, 59, 59)
+        return (start, end), text[: match.start()] + " " + text[match.end():]
+
+    years = set(re.findall(r"\b(20\d{2})\b", text))
+    if len(years) == 1:
+        year = int(years.pop())
+        rest = re.sub(rf"\b{year}\b", " ", text)
+        return (datetime(year, 1, 1), datetime(year, 12, 31, 23, 59, 59)), rest
+    return None, text
+
+
+def _plural(phrase: str) -> str:
+    """
+    Returns a pattern matching a phrase in singular or plural.
+    """
+    if phrase.endswith("y"):
+        return rf"{phrase[:-1]}(?:y|ies)"
+    return rf"{phrase}s?"
+
+
+def _extract_group(text: str) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    Returns the grouping field, the phrase naming it and the text without the phrase.
+    """
+    prefix = r"(?:^|\b(?:by|per|each|which|top(?: \w+)?|most(?: frequently)? \w+) )"
+    for phrase, field in GROUP_FIELDS:
+        match = re.search(rf"{prefix}(?:the )?({_plural(phrase)})\b", text)
+        if match:
+            return field, phrase, text[: match.start(1)] + " " + text[match.end(1):]
+    return None, None, text
+
+
+def _extract_limit(words: List[str]) -> Optional[int]:
+    for index, word in enumerate(words[:-1]):
+        if word == "top":
+            following = words[index + 1]
+            if following.isdigit():
+                return int(following)
+            return NUMBERS.get(following, 5)
+    if words and words[-1] == "top":
+        return 5
+    return None
+
+
+def build_pipeline(
+    period: Optional[Tuple[datetime, datetime]],
+    spend: bool,
+    group_field: Optional[str] = None,
+    time_bucket: Optional[str] = None,
+    direction: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Builds the canonical pipeline of a question shape.
+
+    :param period: Creation date range, None for all time.
+    :param spend: Sums `lineItems.totalPrice` when True, counts orders or line items otherwise.
+    :param group_field: Field to group by.
+    :param time_bucket: Calendar bucket to group by, `quarter`, `month` or `year`.
+    :param direction: Sort direction of the metric. By default calendar buckets are sorted
+        chronologically and fields by descending metric.
+    :param limit: Number of groups returned.
+    :return: The template name and the pipeline.
+    """
+    pipeline: List[Dict[str, Any]] = []
+    if period:
+        pipeline.append({"$match": {"creationDate": {"$gte": period[0], "$lte": period[1]}}})
+
+    grouped = group_field or time_bucket
+    if not grouped and not spend:
+        pipeline.append({"$count": "total_orders"})
+        return "order_count", pipeline
+
+    if spend or (group_field or "").startswith("lineItems."):
+        pipeline.append({"$unwind": "$lineItems"})
+    if spend:
+        metric, accumulator = "total_spending", {"$sum": "$lineItems.totalPrice"}
+    elif group_field and group_field.startswith("lineItems."):
+        metric, accumulator = "order_count", {"$sum": 1}
+    else:
+        metric, accumulator = "total_orders", {"$sum": 1}
+
+    if not grouped:
+        pipeline.append({"$group": {"_id": None, metric: accumulator}})
+        pipeline.append({"$project": {"_id": 0, metric: 1}})
+        return "total_spending", pipeline
+
+    if time_bucket:
+        group_id = {"year": {"$year": "$creationDate"}}
+        if time_bucket == "quarter":
+            group_id["quarter"] = {"$ceil": {"$divide": [{"$month": "$creationDate"}, 3]}}
+        elif time_bucket == "month":
+            group_id["month"] = {"$month": "$creationDate"}
+        projection = {key: f"$_id.{key}" for key in group_id}
+        sort = {metric: direction} if direction else {f"_id.{key}": 1 for key in group_id}
+    else:
+        group_id = f"${group_field}"
+        projection = {group_field.rsplit(".", 1)[-1]: "$_id"}
+        sort = {metric: direction or -1}
+
+    pipeline.append({"$group": {"_id": group_id, metric: accumulator}})
+    pipeline.append({"$sort": sort})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {"_id": 0, **projection, metric: 1}})
+    name = f"{'spend' if spend else 'count'}_by_{time_bucket or 'field'}"
+    return name, pipeline
+
+
+def match_template(question: str) -> Optional[TemplateMatch]:
+    """
+    Matches a question against the canonical shapes: order counts, total spending, and counts or
+    spending grouped by a field or a calendar bucket, optionally sorted and limited.
+
+    :param question: The user question.
+    :return: The filled template, or None when the question needs the LLM.
+    """
+    text = " ".join(re.findall(r"[a-z0-9]+", question.lower().replace("'", "")))
+    text = re.sub(r"\bwith the (highest|lowest|most|least|biggest|largest|smallest)\b", r"\1", text)
+    period, text = extract_period(text)
+    # A year the period was not taken from, such as 1999, is not a limit to extract.
+    if re.search(r"\b\d{4}\b", text):
+        return None
+    if period and (period[0].year < DATA_YEARS[0] or period[1].year > DATA_YEARS[1]):
+        return None
+
+    group_field, phrase, text = _extract_group(text)
+    buckets = [bucket for bucket in TIME_BUCKETS if re.search(rf"\b{bucket}(?:s|ly)?\b", text)]
+    if len(buckets) > 1 or (buckets and group_field):
+        return None
+    time_bucket = buckets[0] if buckets else None
+    if time_bucket:
+        text = re.sub(rf"\b{time_bucket}(?:s|ly)?\b", " ", text)
+
+    words = text.split()
+    limit = _extract_limit(words)
+    if limit is not None:
+        words = [word for word in words if not (word.isdigit() or word in NUMBERS)]
+    if any(word not in FILLER_WORDS for word in words):
+        return None
+
+    spend = any(word in SPEND_WORDS for word in words)
+    if not spend and not any(word in COUNT_WORDS for word in words):
+        return None
+    direction = None
+    if any(word in DESCENDING_WORDS for word in words):
+        direction = -1
+    elif any(word in ASCENDING_WORDS for word in words):
+        direction = 1
+    if direction and not (group_field or time_bucket):
+        return None
+    # "Which department spent the most" asks for one group, "departments with the most" for all.
+    if direction and limit is None:
+        singular = phrase or time_bucket
+        plural = f"{singular[:-1]}ies" if singular.endswith("y") else f"{singular}s"
+        if not re.search(rf"\b{plural}\b", question.lower()):
+            limit = 1
+
+    name, pipeline = build_pipeline(period, spend, group_field, time_bucket, direction, limit)
+    slots = {
+        "period": period,
+        "group_field": group_field,
+        "time_bucket": time_bucket,
+        "direction": direction,
+        "limit": limit,
+    }
+    return TemplateMatch(name=name, slots=slots, pipeline=pipeline)
+
+
+def render_pipeline(pipeline: List[Dict[str, Any]]) -> str:
+    """
+    Renders a pipeline in the Python syntax expected by `eval_mongodb_query`.
+    """
+    return repr(pipeline)
@@ -0,0 +1,256 @@
+import datetime
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+from bson import Decimal128, ObjectId
+
+
+# Questions asking for more than the figures, answered by the Analytics_Agent from a summary.
+NARRATIVE_WORDS = {
+    "why", "explain", "explanation", "insight", "insights", "analyze", "analyse", "analysis",
+    "interpret", "recommend", "recommendation", "suggest", "compare", "comparison", "trend",
+    "trends", "describe", "summarize", "summarise", "summary", "pattern", "patterns", "notable",
+}
+
+
+def format_value(value: Any) -> str:
+    """
+    Formats a value returned by MongoDB for display: grouped digits with at most two decimals,
+    dates without a midnight time, ObjectIds and nested documents as text.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, (float, Decimal)):
+        if value != value:  # NaN
+            return ""
+        if value == int(value):
+            return f"{int(value):,}"
+        return f"{value:,.2f}"
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.strftime("%Y-%m-%d")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return ", ".join(f"{column_label(key)}: {format_value(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ", ".join(format_value(item) for item in value)
+    return str(value)
+
+
+def column_label(name: str) -> str:
+    """
+    Turns a field name such as `totalSpent`, `total_spent` or `lineItems.itemName` into a
+    column header. A scalar `_id` holds the value grouped on.
+    """
+    if name == "_id":
+        return "Group"
+    name = name.rsplit(".", 1)[-1]
+    words = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name).replace("_", " ").split()
+    return " ".join(words).capitalize() if words else name
+
+
+def format_field(name: str, value: Any) -> str:
+    """
+    Formats the value of a field, keeping years, as grouped on with `$year`, without separators.
+    """
+    if isinstance(value, int) and not isinstance(value, bool) and name.lower().endswith("year"):
+        return str(value)
+    return format_value(value)
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    return None
+
+
+def flatten_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lifts the fields of a compound `_id`, as produced by grouping on several fields, into
+    columns of their own.
+    """
+    flat = {}
+    for key, value in row.items():
+        if key == "_id" and isinstance(value, dict):
+            flat.update(value)
+        else:
+            flat[key] = value
+    return flat
+
+
+def value_type(value: Any) -> str:
+    """
+    Names the JSON-level type of a value returned by MongoDB.
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, (float, Decimal, Decimal128)):
+        return "number"
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return "datetime"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    return "string"
+
+
+def describe_columns(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Describes the columns of flattened rows in first appearance order: the field name, its
+    header and the type of its values, `number` when integers and floats mix and `mixed` for
+    other combinations.
+    """
+    types: Dict[str, set] = {}
+    for row in rows:
+        for key, value in row.items():
+            types.setdefault(key, set())
+            if value is not None:
+                types[key].add(value_type(value))
+    columns = []
+    for key, kinds in types.items():
+        if kinds == {"integer", "number"}:
+            kinds = {"number"}
+        if not kinds:
+            kind = "null"
+        elif len(kinds) == 1:
+            kind = next(iter(kinds))
+        else:
+            kind = "mixed"
+        columns.append({"name": key, "label": column_label(key), "type": kind})
+    return columns
+
+
+class ResultRenderer:
+    """
+    Renders aggregation results locally: a sentence for a single value, a markdown table
+    otherwise, cut to the first rows with summary statistics of the numeric columns when the
+    result is large.
+    """
+
+    def __init__(self, max_rows: int = 20, summary_rows: int = 5):
+        """
+        :param max_rows: Rows shown in the answer's table.
+        :param summary_rows: Rows included in the summary sent to the LLM for a narrative answer.
+        """
+        self.max_rows = max_rows
+        self.summary_rows = summary_rows
+
+    @staticmethod
+    def needs_narrative(question: str) -> bool:
+        """
+        Whether the question asks for an explanation or analysis rather than the figures alone.
+        """
+        return any(word in NARRATIVE_WORDS for word in re.findall(r"[a-z]+", (question or "").lower()))
+
+    @staticmethod
+    def _columns(rows: Sequence[Dict[str, Any]]) -> List[str]:
+        columns: List[str] = []
+        for row in rows:
+            for key in row:
+                if key not in columns:
+                    columns.append(key)
+        return columns
+
+    def table(self, rows: Sequence[Dict[str, Any]], columns: List[str]) -> str:
+        def cell(column: str, value: Any) -> str:
+            return format_field(column, value).replace("|", "\\|").replace("\n", " ")
+
+        numeric = {
+            column
+            for column in columns
+            if all(_number(row.get(column)) is not None for row in rows if row.get(column) is not None)
+            and any(row.get(column) is not None for row in rows)
+        }
+        header = "| " + " | ".join(column_label(column) for column in columns) + " |"
+        separator = "|" + "|".join("---:" if column in numeric else "---" for column in columns) + "|"
+        lines = [header, separator]
+        for row in rows:
+            lines.append("| " + " | ".join(cell(column, row.get(column)) for column in columns) + " |")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _covered(rows: Sequence[Dict[str, Any]], truncated: bool) -> str:
+        # Statistics of truncated results only describe the rows that were returned.
+        return f"the {len(rows):,} returned rows only" if truncated else "all rows"
+
+    def statistics(self, rows: Sequence[Dict[str, Any]], columns: List[str]) -> List[str]:
+        lines = []
+        for column in columns:
+            # Years are labels, and margins of estimates do not add up.
+            if column.lower().endswith("year") or column.endswith("_margin"):
+                continue
+            values = [_number(row.get(column)) for row in rows]
+            values = [value for value in values if value is not None]
+            if len(values) < len(rows) / 2 or not values:
+                continue
+            lines.append(
+                f"- {column_label(column)}: total {format_value(sum(values))}, "
+                f"average {format_value(sum(values) / len(values))}, "
+                f"min {format_value(min(values))}, max {format_value(max(values))}"
+            )
+        return lines
+
+    def render(self, results: Sequence[Dict[str, Any]], truncated: bool = False) -> str:
+        """
+        :param truncated: Whether the query's default limit left out some of the results.
+        :return: The markdown answer presenting the results.
+        """
+        rows = [flatten_row(row) for row in results]
+        if not rows:
+            return "No matching records were found."
+        columns = self._columns(rows)
+        if len(rows) == 1 and len(columns) == 1 and not truncated:
+            return f"**{column_label(columns[0])}:** {format_field(columns[0], rows[0][columns[0]])}"
+
+        shown = rows[: self.max_rows]
+        intro = "Here is the result:" if len(rows) == 1 else "Here are the results:"
+        parts = [intro, self.table(shown, columns)]
+        if len(rows) > len(shown) or truncated:
+            total = f"at least {len(rows) + 1:,}" if truncated else f"{len(rows):,}"
+            parts.append(f"Showing the first {len(shown):,} of {total} rows.")
+            statistics = self.statistics(rows, columns)
+            if statistics:
+                parts.append(f"Summary of {self._covered(rows, truncated)}:\n" + "\n".join(statistics))
+        return "\n\n".join(parts)
+
+    def summarize(self, results: Sequence[Dict[str, Any]], truncated: bool = False) -> str:
+        """
+        :param truncated: Whether the query's default limit left out some of the results.
+        :return: A compact description of the results for the LLM: the row count, the first
+            rows and the statistics of the numeric columns.
+        """
+        rows = [flatten_row(row) for row in results]
+        if not rows:
+            return "The query returned no rows."
+        columns = self._columns(rows)
+        shown = rows[: self.summary_rows]
+        count = f"the first {len(rows):,} of at least {len(rows) + 1:,}" if truncated else f"{len(rows):,}"
+        parts = [
+            f"The query returned {count} rows with the columns: {', '.join(columns)}.",
+            f"First {len(shown)} rows:\n{self.table(shown, columns)}",
+        ]
+        statistics = self.statistics(rows, columns)
+        if (len(rows) > len(shown) or truncated) and statistics:
+            parts.append(f"Statistics of {self._covered(rows, truncated)}:\n" + "\n".join(statistics))
+        return "\n\n".join(parts)
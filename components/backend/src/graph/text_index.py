@@ -0,0 +1,83 @@
+import re
+import zlib
+from typing import Generic, List, Sequence, Tuple, TypeVar
+import numpy as np
+
+
+T = TypeVar("T")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please", "show", "the",
+    "to", "was", "we", "what", "which", "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases a text, splits camelCase identifiers and removes stopwords.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+
+def embed_text(text: str, dimension: int = 1024) -> np.ndarray:
+    """
+    Embeds a text as an L2-normalized hashed bag of words, word bigrams and character trigrams.
+
+    The character trigrams make the vectors robust to plurals and small misspellings, and the
+    hashing keeps the embedding stable across processes without a vocabulary or a model.
+
+    :param text: The text to embed.
+    :param dimension: Size of the embedding.
+    :return: A float32 vector of shape `(dimension,)`.
+    """
+    tokens = tokenize(text)
+    features = list(tokens)
+    features.extend(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    for token in tokens:
+        padded = f"#{token}#"
+        features.extend(f"~{padded[i:i + 3]}" for i in range(len(padded) - 2))
+
+    vector = np.zeros(dimension, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % dimension] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalTextIndex(Generic[T]):
+    """
+    A small in-memory nearest-neighbour index over hashed text embeddings.
+    """
+
+    def __init__(self, entries: Sequence[Tuple[str, T]], dimension: int = 1024):
+        """
+        :param entries: Pairs of indexed text and the payload returned for it.
+        :param dimension: Size of the embeddings.
+        """
+        self.dimension = dimension
+        self.payloads = [payload for _, payload in entries]
+        self.matrix = (
+            np.vstack([embed_text(text, dimension) for text, _ in entries])
+            if entries
+            else np.zeros((0, dimension), dtype=np.float32)
+        )
+
+    def search(self, query: str, k: int) -> List[Tuple[float, T]]:
+        """
+        Returns the `k` payloads whose text is most similar to the query, best first.
+
+        :param query: The text to search for.
+        :param k: Number of results.
+        :return: Pairs of cosine similarity and payload.
+        """
+        if not self.payloads or k <= 0:
+            return []
+        scores = self.matrix @ embed_text(query, self.dimension)
+        top = np.argsort(-scores)[:k]
+        return [(float(scores[i]), self.payloads[i]) for i in top]
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
@@ -1,9 +1,12 @@
 import datetime
+import logging
 from bson import ObjectId
 import re
-from typing import Callable, List
-from langchain_core.messages import SystemMessage
+from typing import Callable, List, Optional
 from langgraph.prebuilt import tools_condition, ToolNode
+from graph.context import ConversationContext
+
+logger = logging.getLogger(__name__)
 
 
 def create_tool_calling_agent(
@@ -12,21 +15,26 @@ def create_tool_calling_agent(
     agent_name: str,
     tools: List[Callable],
     call_after_tool: bool = True,
+    context: Optional[ConversationContext] = None,
 ):
     llm_with_tools = llm.bind_tools(tools)
-
-    def agent(state, config):
-        llm_response = llm_with_tools.invoke(
-            [SystemMessage(system_promt)] + state["messages"]
+    tool_node = ToolNode(tools)
+    context = context or ConversationContext()
+
+    async def agent(state, config):
+        messages, token_count, context_updates = context.build(system_promt, state)
+        state = {**state, **context_updates}
+        logger.info(
+            f"{agent_name} prompt: {len(messages)} messages, ~{token_count} tokens"
         )
+        llm_response = await llm_with_tools.ainvoke(messages, config)
         llm_response.name = agent_name
         # invoke agent
         state["messages"].append(llm_response)
 
         # if tool calls detected invoke the tools
         if tools_condition(state) == "tools":
-            tool_node = ToolNode(tools)
-            response = tool_node.invoke(state)
+            response = await tool_node.ainvoke(state, config)
 
             for tool_message in response["messages"]:
                 state["messages"].append(tool_message)
@@ -34,7 +42,7 @@ def create_tool_calling_agent(
                     state = {**state, **tool_message.artifact}
 
             if call_after_tool:
-                agent(state, config)
+                return await agent(state, config)
             else:
                 return state
 
@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Conversation state lives in the MongoDB checkpointer, so any worker can serve any thread.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Lets the app check that its checkpointer can be shared by this many workers, and split the
+# LLM rate and concurrency limits between them.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Each worker writes its Prometheus metrics to files in this directory, which /metrics sums.
+# Set before the workers import prometheus_client.
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus_multiproc")
+)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+chdir = os.path.dirname(os.path.abspath(__file__))
+timeout = 300
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Metrics left by a previous run would be added to the new ones.
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
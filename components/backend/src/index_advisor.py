@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import logging
+from config import Config
+from services.mognodb_service import MongoDBService
+from services.query_profiler import QueryProfiler, advise_indexes
+
+
+def format_keys(keys) -> str:
+    return "{" + ", ".join(f'"{field}": {direction}' for field, direction in keys) + "}"
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+
+    config = Config()
+    parser = argparse.ArgumentParser(
+        description="Recommend compound indexes for Orders from recorded pipeline profiles."
+    )
+    parser.add_argument(
+        "--slow-ms",
+        type=float,
+        default=config.query_profiling.SLOW_MS,
+        help="Average latency above which a pipeline shape counts as slow.",
+    )
+    args = parser.parse_args()
+
+    mongo_client = MongoDBService(
+        host=config.mongodb.HOST,
+        port=config.mongodb.PORT,
+        username=config.mongodb.USERNAME,
+        password=config.mongodb.PASSWORD,
+        db_name=config.mongodb.DB_NAME,
+        orders_collection="Orders",
+    )
+    profiler = QueryProfiler(mongo_client.db)
+    profiles = await profiler.load_profiles()
+    index_information = await mongo_client.orders_collection.index_information()
+    existing_indexes = [list(index["key"]) for index in index_information.values()]
+
+    report = advise_indexes(profiles, existing_indexes, args.slow_ms)
+
+    print(f"Analyzed {len(profiles)} pipeline shapes.\n")
+    print("Recommended indexes (ranked by time spent in matching shapes):")
+    if not report["recommendations"]:
+        print("  none")
+    for recommendation in report["recommendations"]:
+        print(
+            f"  db.Orders.createIndex({format_keys(recommendation['keys'])})  "
+            f"shapes={len(recommendation['shapes'])} "
+            f"executions={recommendation['executions']} "
+            f"total_latency_ms={recommendation['totalLatencyMs']:.0f}"
+        )
+
+    print("\nSlow shapes without a leading $match (no index can help):")
+    if not report["unindexable"]:
+        print("  none")
+    for shape in report["unindexable"]:
+        print(
+            f"  {shape['shape_hash']} executions={shape['executions']} "
+            f"total_latency_ms={shape['totalLatencyMs']:.0f}"
+        )
+
+    print("\nExisting index usage in sampled plans:")
+    if not report["index_usage"]:
+        print("  none")
+    for usage in report["index_usage"]:
+        print(
+            f"  {usage['index']} executions={usage['executions']} "
+            f"total_latency_ms={usage['totalLatencyMs']:.0f}"
+        )
+
+    await mongo_client.close_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
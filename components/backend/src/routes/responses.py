@@ -0,0 +1,13 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+from services.serialization import dumps
+
+
+class BSONJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson, accepting the ObjectIds, decimals and datetimes of
+    MongoDB results as they are.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
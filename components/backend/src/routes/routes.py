@@ -1,24 +1,157 @@
 import logging
-from fastapi import APIRouter, Request
+import re
+import time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from routes.responses import BSONJSONResponse
 from routes.schema import RequestSchema, ResponseSchema
 from graph.graph_builder import GraphBuilder
+from graph.utils import eval_mongodb_query
 from services.conversation_service import ConversationService
+from services.export import EXTENSIONS, MEDIA_TYPES, encode_batches
+from services.query_guardrails import QueryRejectedError
+from graph.llm import get_config
 
 
 router = APIRouter(prefix="/bot/v1")
 logger = logging.getLogger(__name__)
 
 
-@router.post("/chat", response_model=ResponseSchema.Conversation)
+@router.post(
+    "/chat", response_model=ResponseSchema.Conversation, response_class=BSONJSONResponse
+)
 async def chat(
     conversation_request: RequestSchema.Conversation, request: Request
-) -> ResponseSchema.Conversation:
+) -> BSONJSONResponse:
+    """
+    Answers a message of the thread. With `include_results`, the response also holds the rows
+    and column metadata of the query the turn ran, the hash of its pipeline and the timings.
+    """
+    config = get_config()
     graph = request.app.state.graph
-    conversation_service = ConversationService(graph)
-    bot_response = await conversation_service.standard_response(
-        conversation_request.user_message, conversation_request.thread_id
+    conversation_service = ConversationService(graph, request.app.state.question_flight)
+    if conversation_request.include_results:
+        structured = await conversation_service.structured_response(
+            conversation_request.user_message,
+            conversation_request.thread_id,
+            config.structured_responses.MAX_ROWS,
+        )
+        response = ResponseSchema.Conversation(
+            thread_id=conversation_request.thread_id, **structured
+        )
+    else:
+        bot_response = await conversation_service.standard_response(
+            conversation_request.user_message, conversation_request.thread_id
+        )
+        response = ResponseSchema.Conversation(
+            bot_response=bot_response, thread_id=conversation_request.thread_id
+        )
+
+    # Returned as is, the rows keep their datetimes, ObjectIds and decimals for the encoder.
+    return BSONJSONResponse(response.model_dump(exclude_none=True))
+
+
+@router.post("/chat/batch", response_model=ResponseSchema.ConversationBatch)
+async def chat_batch(
+    batch_request: RequestSchema.ConversationBatch, request: Request
+) -> ResponseSchema.ConversationBatch:
+    """
+    Answers many conversations in one request, running up to `BATCH_MAX_CONCURRENCY` graphs at
+    a time. Results are returned in request order with their own latency and error.
+    """
+    config = get_config()
+    if len(batch_request.conversations) > config.batch.MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can contain at most {config.batch.MAX_ITEMS} conversations.",
+        )
+
+    graph = request.app.state.graph
+    conversation_service = ConversationService(graph, request.app.state.question_flight)
+    start = time.perf_counter()
+    results = await conversation_service.batch_response(
+        [
+            (conversation.user_message, conversation.thread_id)
+            for conversation in batch_request.conversations
+        ],
+        config.batch.MAX_CONCURRENCY,
+    )
+
+    return ResponseSchema.ConversationBatch(
+        results=[ResponseSchema.BatchItem(**result) for result in results],
+        latency_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    conversation_request: RequestSchema.Conversation, request: Request
+) -> StreamingResponse:
+    """
+    Streams the conversation as Server-Sent Events, one `ResponseSchema.StreamEvent` per event.
+    """
+    graph = request.app.state.graph
+    conversation_service = ConversationService(graph, request.app.state.question_flight)
+
+    async def event_stream():
+        async for event in conversation_service.stream_response(
+            conversation_request.user_message, conversation_request.thread_id
+        ):
+            stream_event = ResponseSchema.StreamEvent(
+                thread_id=conversation_request.thread_id, **event
+            )
+            yield f"event: {stream_event.event.value}\ndata: {stream_event.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/export/{thread_id}")
+async def export(
+    thread_id: str,
+    request: Request,
+    format: RequestSchema.ExportFormat = RequestSchema.ExportFormat.CSV,
+) -> StreamingResponse:
+    """
+    Streams the complete results of the last pipeline the thread ran as CSV, NDJSON or an Arrow
+    IPC stream. The results go from the MongoDB cursor to the client batch by batch, without the
+    graph or the default `$limit` of chat answers.
+    """
+    graph = request.app.state.graph
+    state = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+    executed_query = state.values.get("executed_query")
+    if not executed_query:
+        raise HTTPException(
+            status_code=404, detail="The thread has not run a query to export."
+        )
+
+    config = get_config()
+    mongo_client = request.app.state.mongo_client
+    batches = mongo_client.stream_orders(
+        eval_mongodb_query(executed_query),
+        batch_size=config.export.BATCH_SIZE,
+        max_time_ms=config.export.MAX_TIME_MS,
     )
+    # The first batch is fetched before responding, so that a rejected pipeline gets an error status.
+    try:
+        first_batch = await anext(batches, None)
+    except QueryRejectedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def all_batches():
+        if first_batch is not None:
+            yield first_batch
+            async for batch in batches:
+                yield batch
 
-    return ResponseSchema.Conversation(
-        bot_response=bot_response, thread_id=conversation_request.thread_id
+    filename = re.sub(r"[^\w.-]", "_", thread_id)
+    return StreamingResponse(
+        encode_batches(all_batches(), format.value),
+        media_type=MEDIA_TYPES[format.value],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{EXTENSIONS[format.value]}"'
+        },
     )
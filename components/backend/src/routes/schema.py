@@ -1,3 +1,5 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -5,6 +7,7 @@ class RequestSchema:
     class Conversation(BaseModel):
         user_message: str = Field(..., title="User Message")
         thread_id: str = Field(..., title="Thread Identifier")
+        include_results: bool = Field(default=False, title="Include the Query Results")
 
         @field_validator("user_message", "thread_id", mode="before")
         def validate_non_empty_string(cls, value: str, info) -> str:
@@ -19,8 +22,64 @@ class RequestSchema:
                 )
             return stripped_value
 
+    class ExportFormat(str, Enum):
+        CSV = "csv"
+        NDJSON = "ndjson"
+        ARROW = "arrow"
+
+    class ConversationBatch(BaseModel):
+        conversations: List["RequestSchema.Conversation"] = Field(
+            ..., title="Conversations", min_length=1
+        )
+
 
 class ResponseSchema:
+    class Column(BaseModel):
+        name: str = Field(..., title="Field Name")
+        label: str = Field(..., title="Column Header")
+        type: str = Field(..., title="Value Type")
+
+    class QueryResult(BaseModel):
+        rows: List[Dict[str, Any]] = Field(..., title="Result Rows")
+        columns: List["ResponseSchema.Column"] = Field(..., title="Column Metadata")
+        row_count: int = Field(..., title="Number of Result Rows Returned by the Query")
+        truncated: bool = Field(
+            ..., title="Whether Rows Were Left Out, by the Response or the Query's Default Limit"
+        )
+        pipeline_hash: str = Field(..., title="Hash of the Executed Pipeline")
+        source: str = Field(..., title="Engine That Computed the Results")
+        estimate: Optional[Dict[str, Any]] = Field(default=None, title="Sample of an Estimate")
+
     class Conversation(BaseModel):
         bot_response: str = Field(..., title="Bot Response Message")
         thread_id: str = Field(..., title="Thread Identifier")
+        result: Optional["ResponseSchema.QueryResult"] = Field(default=None, title="Query Results")
+        timings: Optional[Dict[str, float]] = Field(default=None, title="Timings in Milliseconds")
+
+    class BatchItem(BaseModel):
+        thread_id: str = Field(..., title="Thread Identifier")
+        bot_response: Optional[str] = Field(default=None, title="Bot Response Message")
+        error: Optional[str] = Field(default=None, title="Error Message")
+        latency_ms: float = Field(..., title="Latency in Milliseconds")
+
+    class ConversationBatch(BaseModel):
+        results: List["ResponseSchema.BatchItem"] = Field(..., title="Results in Request Order")
+        latency_ms: float = Field(..., title="Batch Latency in Milliseconds")
+
+    class StreamEventType(str, Enum):
+        NODE_START = "node_start"
+        NODE_END = "node_end"
+        PIPELINE = "pipeline"
+        EXECUTION = "execution"
+        TOKEN = "token"
+        FINAL = "final"
+        ERROR = "error"
+
+    class StreamEvent(BaseModel):
+        event: "ResponseSchema.StreamEventType" = Field(..., title="Event Type")
+        thread_id: str = Field(..., title="Thread Identifier")
+        node: Optional[str] = Field(default=None, title="Graph Node")
+        content: Optional[str] = Field(
+            default=None, title="Token, Pipeline, Final Response or Error Message"
+        )
+        data: Optional[Dict[str, Any]] = Field(default=None, title="Event Details")
@@ -0,0 +1,327 @@
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Two-sided 95% normal quantile.
+Z_95 = 1.96
+
+MODES = ("off", "on_request", "auto")
+ESTIMATE_WORDS = {
+    "estimate", "estimated", "estimates", "estimation", "approximate", "approximately", "approx",
+    "roughly", "rough", "ballpark", "quick", "quickly", "fast",
+}
+EXACT_WORDS = {"exact", "exactly", "precise", "precisely", "accurate"}
+
+# Stages that may precede the `$group` of a sampled pipeline. They must keep the sample's stratum
+# and weight fields, which rules out `$project` and `$replaceRoot`.
+PRE_GROUP_STAGES = {"$match", "$unwind", "$addFields", "$set"}
+POST_GROUP_STAGES = {"$sort", "$limit", "$skip"}
+
+STRATUM_FIELD = "_stratum"
+WEIGHT_FIELD = "_weight"
+
+
+@dataclass
+class SampledPipeline:
+    """
+    A pipeline rewritten to estimate its `$group` accumulators from a sample.
+
+    Attributes:
+        pipeline: The stages to run on the sampled documents.
+        accumulators: Accumulator name to `sum` or `avg`, in output order.
+        drop_id: Whether the output has no `_id`, as for a `$count` stage.
+    """
+
+    pipeline: List[Dict[str, Any]]
+    accumulators: Dict[str, str]
+    drop_id: bool = False
+
+
+@dataclass
+class Stratum:
+    population: int
+    sampled: int
+
+
+@dataclass
+class Estimate:
+    """
+    The estimated results of a pipeline, each accumulator followed by the half-width of its
+    95% confidence interval as `<name>_margin`.
+    """
+
+    rows: List[Dict[str, Any]]
+    sampled: int
+    population: int
+    source: str
+    strata: Dict[Any, Stratum] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        return (
+            f"These figures are estimates from a {self.source} of {self.sampled:,} of "
+            f"{self.population:,} orders. Each `margin` column gives the 95% confidence interval "
+            "as estimate ± margin. Ask for the exact figures to compute them over all orders."
+        )
+
+
+def _accumulator(spec: Any) -> Optional[Tuple[str, Any]]:
+    if not isinstance(spec, dict) or len(spec) != 1:
+        return None
+    operator, expression = next(iter(spec.items()))
+    if operator == "$sum":
+        return "sum", expression
+    if operator == "$avg":
+        return "avg", expression
+    if operator == "$count" and expression == {}:
+        return "sum", 1
+    return None
+
+
+def rewrite_for_sample(
+    pipeline: List[Dict[str, Any]], weight: Any = f"${WEIGHT_FIELD}", stratum: Any = f"${STRATUM_FIELD}"
+) -> Optional[SampledPipeline]:
+    """
+    Rewrites a pipeline computing sums, counts or averages per group, optionally sorted and cut
+    to the top groups, into one computing their weighted estimates from sampled documents.
+
+    The `$group` is split in three: per order, group and stratum it sums the values, since the
+    order is the sampling unit even after an `$unwind` of its line items, then per group and
+    stratum it sums the order totals, their squares and their weights, then per group it adds up
+    the weighted estimates and keeps the per-stratum sums to compute the confidence intervals. The stages after the `$group` then sort and cut the
+    estimates as they would the exact values.
+
+    :param pipeline: The pipeline over the orders collection.
+    :param weight: Expression of a sampled document's weight, the number of orders it stands for.
+    :param stratum: Expression of a sampled document's stratum.
+    :return: The rewritten pipeline, or None when its results cannot be estimated from a sample,
+        e.g. with a `$min`, `$max` or `$push`, or with stages other than sorting after the group.
+    """
+    stages = list(pipeline)
+    drop_id = False
+    for index, stage in enumerate(stages):
+        if "$count" in stage and isinstance(stage["$count"], str):
+            if index != len(stages) - 1:
+                return None
+            stages[index] = {"$group": {"_id": None, stage["$count"]: {"$sum": 1}}}
+            drop_id = True
+
+    group_indexes = [index for index, stage in enumerate(stages) if "$group" in stage]
+    if len(group_indexes) != 1:
+        return None
+    group_index = group_indexes[0]
+    if any(len(stage) != 1 or next(iter(stage)) not in PRE_GROUP_STAGES for stage in stages[:group_index]):
+        return None
+    if any(len(stage) != 1 or next(iter(stage)) not in POST_GROUP_STAGES for stage in stages[group_index + 1:]):
+        return None
+
+    group = stages[group_index]["$group"]
+    # The sampling unit is the order, so after an `$unwind` the values are first summed per order
+    # and group: the variance is that of the per-order totals.
+    by_order: Dict[str, Any] = {
+        "_id": {"o": "$_id", "g": group.get("_id"), "s": stratum},
+        "__weight": {"$first": weight},
+    }
+    by_stratum: Dict[str, Any] = {"_id": {"g": "$_id.g", "s": "$_id.s"}}
+    by_group: Dict[str, Any] = {"_id": "$_id.g"}
+    stratum_stats: Dict[str, Any] = {"stratum": "$_id.s"}
+    estimates: Dict[str, Any] = {}
+    accumulators: Dict[str, str] = {}
+    for name, spec in group.items():
+        if name == "_id":
+            continue
+        parsed = _accumulator(spec)
+        if parsed is None:
+            return None
+        kind, expression = parsed
+        accumulators[name] = kind
+        total = f"$__v_{name}"
+        if kind == "avg":
+            # `$avg` ignores missing and non-numeric values, they are neither summed nor counted.
+            by_order[f"__v_{name}"] = {"$sum": {"$cond": [{"$isNumber": expression}, expression, 0]}}
+            by_order[f"__n_{name}"] = {"$sum": {"$cond": [{"$isNumber": expression}, 1, 0]}}
+            count = f"$__n_{name}"
+            by_stratum[f"__c_{name}"] = {"$sum": count}
+            by_stratum[f"__k_{name}"] = {"$sum": {"$multiply": [count, count]}}
+            by_stratum[f"__x_{name}"] = {"$sum": {"$multiply": [total, count]}}
+            by_stratum[f"__cw_{name}"] = {"$sum": {"$multiply": [count, "$__weight"]}}
+            by_group[f"__cw_{name}"] = {"$sum": f"$__cw_{name}"}
+            stratum_stats[f"c_{name}"] = f"$__c_{name}"
+            stratum_stats[f"k_{name}"] = f"$__k_{name}"
+            stratum_stats[f"x_{name}"] = f"$__x_{name}"
+        else:
+            by_order[f"__v_{name}"] = {"$sum": expression}
+        by_stratum[f"__s_{name}"] = {"$sum": total}
+        by_stratum[f"__q_{name}"] = {"$sum": {"$multiply": [total, total]}}
+        by_stratum[f"__w_{name}"] = {"$sum": {"$multiply": [total, "$__weight"]}}
+        by_group[f"__w_{name}"] = {"$sum": f"$__w_{name}"}
+        stratum_stats[f"s_{name}"] = f"$__s_{name}"
+        stratum_stats[f"q_{name}"] = f"$__q_{name}"
+        estimates[name] = (
+            {
+                "$cond": [
+                    {"$gt": [f"$__cw_{name}", 0]},
+                    {"$divide": [f"$__w_{name}", f"$__cw_{name}"]},
+                    None,
+                ]
+            }
+            if kind == "avg"
+            else f"$__w_{name}"
+        )
+    if not accumulators:
+        return None
+    by_group["__strata"] = {"$push": stratum_stats}
+
+    rewritten = [
+        *stages[:group_index],
+        {"$group": by_order},
+        {"$group": by_stratum},
+        {"$group": by_group},
+        {"$addFields": estimates},
+        *stages[group_index + 1:],
+    ]
+    return SampledPipeline(rewritten, accumulators, drop_id)
+
+
+def _variance(population: int, sampled: int, total: float, squares: float) -> float:
+    """
+    Variance of the estimated stratum total from a simple random sample without replacement,
+    given the sum and sum of squares of the sampled orders' values.
+    """
+    if sampled < 2 or population <= sampled:
+        return 0.0
+    sample_variance = max(squares - total * total / sampled, 0.0) / (sampled - 1)
+    return population * population * (1 - sampled / population) * sample_variance / sampled
+
+
+def estimate_rows(
+    rows: List[Dict[str, Any]], sampled: SampledPipeline, strata: Dict[Any, Stratum]
+) -> List[Dict[str, Any]]:
+    """
+    Adds the 95% confidence interval margin of each estimate to the rows of a sampled pipeline
+    and removes the intermediate fields.
+
+    Averages are ratio estimates, their variance is that of the linearized order values
+    `(total - average * count) / estimated count`.
+    """
+    results = []
+    for row in rows:
+        result = {} if sampled.drop_id else {"_id": row.get("_id")}
+        for name, kind in sampled.accumulators.items():
+            estimate = row.get(name)
+            variance = 0.0
+            for stats in row.get("__strata", []):
+                stratum = strata.get(stats.get("stratum"))
+                if stratum is None:
+                    continue
+                total, squares = stats[f"s_{name}"], stats[f"q_{name}"]
+                if kind == "avg":
+                    if estimate is None:
+                        continue
+                    count = stats[f"c_{name}"]
+                    total, squares = (
+                        total - estimate * count,
+                        squares
+                        - 2 * estimate * stats[f"x_{name}"]
+                        + estimate * estimate * stats[f"k_{name}"],
+                    )
+                variance += _variance(stratum.population, stratum.sampled, total, squares)
+            if kind == "avg":
+                weighted_count = row.get(f"__cw_{name}") or 0
+                variance = variance / (weighted_count * weighted_count) if weighted_count else 0.0
+            margin = Z_95 * math.sqrt(variance)
+            result[name] = estimate
+            result[f"{name}_margin"] = margin
+        results.append(result)
+    return results
+
+
+class ApproximateExecutor:
+    """
+    Runs eligible pipelines over a sample of the orders and returns estimates with confidence
+    intervals, in place of an exact aggregation over the whole collection.
+
+    The sample is either the ETL's stratified sample collection, whose documents carry their
+    stratum and weight and whose strata sizes are in `<collection>Strata`, or a uniform `$sample`
+    of `sample_size` orders drawn per query.
+    """
+
+    def __init__(
+        self,
+        mongo_client,
+        mode: str = "on_request",
+        sample_size: int = 20000,
+        sample_collection: Optional[str] = None,
+    ):
+        """
+        :param mongo_client: The MongoDB service.
+        :param mode: `off`, `on_request` to estimate only questions asking for an estimate, or
+            `auto` to estimate every eligible question not asking for exact figures.
+        :param sample_size: Orders drawn by `$sample` when there is no sample collection.
+        :param sample_collection: The ETL's stratified sample collection, if built.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown approximate mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.mongo_client = mongo_client
+        self.mode = mode
+        self.sample_size = sample_size
+        self.sample_collection = sample_collection
+        self._strata: Optional[Dict[Any, Stratum]] = None
+
+    def wants_estimate(self, question: str) -> bool:
+        words = set(re.findall(r"[a-z]+", (question or "").lower()))
+        if self.mode == "off" or words & EXACT_WORDS:
+            return False
+        return self.mode == "auto" or bool(words & ESTIMATE_WORDS)
+
+    async def _load_strata(self) -> Dict[Any, Stratum]:
+        if self._strata is None:
+            cursor = self.mongo_client.db[f"{self.sample_collection}Strata"].find({})
+            self._strata = {
+                document["_id"]: Stratum(document["population"], document["sampled"])
+                async for document in cursor
+            }
+        return self._strata
+
+    async def run(self, pipeline: List[Dict[str, Any]]) -> Optional[Estimate]:
+        """
+        :return: The estimated results, or None when the pipeline is not eligible or the
+            collection is small enough to aggregate exactly.
+        """
+        if self.sample_collection:
+            sampled = rewrite_for_sample(pipeline)
+            if sampled is None:
+                return None
+            strata = await self._load_strata()
+            if not strata:
+                logger.warning(f"The sample collection {self.sample_collection} has no strata")
+                return None
+            rows, _ = await self.mongo_client.aggregate_orders(
+                sampled.pipeline, collection=self.sample_collection
+            )
+            source = "stratified sample"
+        else:
+            population = await self.mongo_client.orders_collection.estimated_document_count()
+            if population <= self.sample_size:
+                return None
+            sampled = rewrite_for_sample(
+                pipeline, weight=population / self.sample_size, stratum={"$literal": "all"}
+            )
+            if sampled is None:
+                return None
+            strata = {"all": Stratum(population, self.sample_size)}
+            rows, _ = await self.mongo_client.aggregate_orders(
+                [{"$sample": {"size": self.sample_size}}, *sampled.pipeline]
+            )
+            source = "random sample"
+
+        return Estimate(
+            rows=estimate_rows(rows, sampled, strata),
+            sampled=sum(stratum.sampled for stratum in strata.values()),
+            population=sum(stratum.population for stratum in strata.values()),
+            source=source,
+            strata=strata,
+        )
@@ -0,0 +1,512 @@
+import asyncio
+import datetime
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Field path -> column kind of the snapshot, one row per line item.
+COLUMNS = {
+    "creationDate": "date",
+    "purchaseDate": "date",
+    "fiscalYear": "category",
+    "departmentName": "category",
+    "supplierName": "category",
+    "acquisitionType": "category",
+    "acquisitionMethod": "category",
+    "lineItems.itemName": "category",
+    "lineItems.commodityTitle": "category",
+    "lineItems.quantity": "number",
+    "lineItems.unitPrice": "number",
+    "lineItems.totalPrice": "number",
+}
+# Position of the line item in its order, to tell whether orders have a single line item.
+ITEM_INDEX_COLUMN = "lineItemIndex"
+
+COMPARISONS: Dict[str, Callable[[Any, Any], Any]] = {
+    "$eq": lambda column, value: column == value,
+    "$ne": lambda column, value: column != value,
+    "$gt": lambda column, value: column > value,
+    "$gte": lambda column, value: column >= value,
+    "$lt": lambda column, value: column < value,
+    "$lte": lambda column, value: column <= value,
+}
+ARITHMETIC = {
+    "$add": np.add,
+    "$subtract": np.subtract,
+    "$multiply": np.multiply,
+    "$divide": np.divide,
+}
+DATE_PARTS = {
+    "$year": lambda dates: dates.astype("datetime64[Y]").astype(np.int64) + 1970,
+    "$month": lambda dates: dates.astype("datetime64[M]").astype(np.int64) % 12 + 1,
+    "$dayOfMonth": lambda dates: (dates - dates.astype("datetime64[M]")).astype("timedelta64[D]").astype(np.int64) + 1,
+}
+DATE_STRING_UNITS = {"%Y": "Y", "%Y-%m": "M", "%Y-%m-%d": "D"}
+POST_GROUP_STAGES = {"$sort", "$limit", "$skip", "$project", "$count"}
+
+
+class UnsupportedPipeline(Exception):
+    """
+    Raised for a pipeline, or part of one, that the columnar engine does not implement.
+    """
+
+
+def _field(expression: Any) -> str:
+    if isinstance(expression, str) and expression.startswith("$") and not expression.startswith("$$"):
+        return expression[1:]
+    raise UnsupportedPipeline(f"Unsupported expression {expression!r}")
+
+
+def _python(value: Any) -> Any:
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else value.astype("datetime64[ms]").astype(datetime.datetime)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def _sort_key(value: Any) -> Tuple:
+    # BSON comparison order: null, numbers, strings, objects, dates.
+    if value is None:
+        return (0,)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, tuple(_sort_key(item) for item in value.values()))
+    if isinstance(value, datetime.datetime):
+        return (5, value)
+    return (4, str(value))
+
+
+_MISSING = object()
+
+
+def _lookup(document: Dict[str, Any], path: str, default: Any = None) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+class ColumnarEngine:
+    """
+    Answers common aggregation pipelines from an in-memory columnar snapshot of the line items,
+    with vectorized NumPy operations instead of a MongoDB round trip.
+
+    Categorical fields are stored as integer codes into their distinct values, so filters are
+    evaluated once per distinct value and group keys are small integers. The supported subset is
+    `$match` on equality, ranges, `$in`/`$nin` and `$regex` of snapshot fields, `$unwind` of
+    `$lineItems`, one `$group` by fields or date parts with `$sum`, `$avg`, `$min`, `$max` and
+    `$count`, and `$sort`, `$skip`, `$limit`, `$count` and simple `$project` stages after it.
+    `aggregate` returns None for anything else, to run on MongoDB.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param frame: One row per line item, with the `COLUMNS` field paths as column names and
+            optionally the item's position in its order as `lineItemIndex`.
+        """
+        self.rows = len(frame)
+        self.dates: Dict[str, np.ndarray] = {}
+        self.numbers: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for path, kind in COLUMNS.items():
+            if path not in frame:
+                continue
+            column = frame[path]
+            if kind == "date":
+                self.dates[path] = pd.to_datetime(column, errors="coerce").to_numpy(dtype="datetime64[ms]")
+            elif kind == "number":
+                self.numbers[path] = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                codes, values = pd.factorize(column, use_na_sentinel=True)
+                self.categories[path] = (codes.astype(np.int32), np.asarray(values, dtype=object))
+        self.single_item_orders = (
+            ITEM_INDEX_COLUMN not in frame or not (frame[ITEM_INDEX_COLUMN].to_numpy() > 0).any()
+        )
+
+    @classmethod
+    def from_parquet(cls, path: str) -> "ColumnarEngine":
+        """
+        Loads the line items snapshot written by the ETL.
+        """
+        frame = pd.read_parquet(path)
+        return cls(frame[[column for column in frame.columns if column in COLUMNS or column == ITEM_INDEX_COLUMN]])
+
+    @classmethod
+    async def from_mongo(cls, collection, batch_size: int = 10000) -> "ColumnarEngine":
+        """
+        Exports the snapshot fields of every line item from the orders collection.
+        """
+        projection = {path.replace(".", "_"): f"${path}" for path in COLUMNS}
+        projection[ITEM_INDEX_COLUMN] = 1
+        projection["_id"] = 0
+        cursor = collection.aggregate(
+            [
+                {"$unwind": {"path": "$lineItems", "includeArrayIndex": ITEM_INDEX_COLUMN}},
+                {"$project": projection},
+            ],
+            batchSize=batch_size,
+        )
+        frame = pd.DataFrame([document async for document in cursor])
+        return cls(frame.rename(columns={path.replace(".", "_"): path for path in COLUMNS}))
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        :return: The pipeline's results, or None when it uses anything outside the supported
+            subset.
+        """
+        try:
+            return self._aggregate(pipeline)
+        except UnsupportedPipeline as e:
+            logger.debug(f"Columnar engine fallback: {str(e)}")
+            return None
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        mask = np.ones(self.rows, dtype=bool)
+        unwound = False
+        results: Optional[List[Dict[str, Any]]] = None
+        for stage in pipeline:
+            if len(stage) != 1:
+                raise UnsupportedPipeline(f"Malformed stage {stage!r}")
+            operator, body = next(iter(stage.items()))
+            if results is not None:
+                if operator not in POST_GROUP_STAGES:
+                    raise UnsupportedPipeline(f"Unsupported stage {operator} after $group")
+                results = self._post_group(operator, body, results)
+            elif operator == "$match":
+                mask &= self._match(body, unwound)
+            elif operator == "$unwind":
+                path = body.get("path") if isinstance(body, dict) else body
+                if path != "$lineItems" or (isinstance(body, dict) and set(body) - {"path"}):
+                    raise UnsupportedPipeline(f"Unsupported $unwind {body!r}")
+                unwound = True
+            elif operator == "$group":
+                if not unwound and not self.single_item_orders:
+                    raise UnsupportedPipeline("Grouping orders with several line items")
+                results = self._group(body, mask, unwound)
+            elif operator == "$count":
+                if not unwound and not self.single_item_orders:
+                    raise UnsupportedPipeline("Counting orders with several line items")
+                count = int(mask.sum())
+                results = [{body: count}] if count else []
+            else:
+                raise UnsupportedPipeline(f"Unsupported stage {operator}")
+        if results is None:
+            # Returning documents needs the fields the snapshot does not have.
+            raise UnsupportedPipeline("Pipeline without $group or $count")
+        return results
+
+    def _match(self, query: Dict[str, Any], unwound: bool) -> np.ndarray:
+        mask = np.ones(self.rows, dtype=bool)
+        for key, condition in query.items():
+            if key == "$and":
+                for part in condition:
+                    mask &= self._match(part, unwound)
+            elif key == "$or":
+                any_mask = np.zeros(self.rows, dtype=bool)
+                for part in condition:
+                    any_mask |= self._match(part, unwound)
+                mask &= any_mask
+            elif key.startswith("$"):
+                raise UnsupportedPipeline(f"Unsupported query operator {key}")
+            else:
+                if key.startswith("lineItems.") and not unwound and not self.single_item_orders:
+                    raise UnsupportedPipeline("Matching line items of orders with several line items")
+                mask &= self._condition(key, condition)
+        return mask
+
+    def _condition(self, path: str, condition: Any) -> np.ndarray:
+        if not isinstance(condition, dict) or not condition or not all(key.startswith("$") for key in condition):
+            condition = {"$eq": condition}
+        options = condition.get("$options", "")
+        if path in self.categories:
+            codes, values = self.categories[path]
+            selected = np.ones(len(values), dtype=bool)
+            for operator, operand in condition.items():
+                if operator != "$options":
+                    selected &= self._category_condition(values, operator, operand, options)
+            # Missing values have the code -1, which selects the appended last entry.
+            return np.append(selected, self._missing_matches(condition))[codes]
+        if path in self.dates:
+            column = self.dates[path]
+            convert = lambda value: np.datetime64(value, "ms") if value is not None else np.datetime64("NaT")
+        elif path in self.numbers:
+            column = self.numbers[path]
+            convert = lambda value: value
+        else:
+            raise UnsupportedPipeline(f"Field {path} is not in the snapshot")
+        mask = np.ones(self.rows, dtype=bool)
+        for operator, operand in condition.items():
+            if operator in COMPARISONS:
+                if operand is None or isinstance(operand, (str, dict, list)):
+                    raise UnsupportedPipeline(f"Unsupported operand {operand!r} of {path}")
+                mask &= COMPARISONS[operator](column, convert(operand))
+            elif operator in ("$in", "$nin") and isinstance(operand, list):
+                if any(value is None or isinstance(value, (str, dict, list)) for value in operand):
+                    raise UnsupportedPipeline(f"Unsupported operand {operand!r} of {path}")
+                isin = np.isin(column, [convert(value) for value in operand])
+                mask &= isin if operator == "$in" else ~isin
+            else:
+                raise UnsupportedPipeline(f"Unsupported operator {operator} on {path}")
+        return mask
+
+    @staticmethod
+    def _missing_matches(condition: Dict[str, Any]) -> bool:
+        # A missing value only equals null, and is selected by `$ne`/`$nin` of other values.
+        for operator, operand in condition.items():
+            if operator == "$eq" and operand is not None:
+                return False
+            if operator == "$in" and None not in operand:
+                return False
+            if operator in ("$ne", "$nin") and (operand is None or (isinstance(operand, list) and None in operand)):
+                return False
+            if operator in ("$gt", "$gte", "$lt", "$lte", "$regex"):
+                return False
+        return True
+
+    @staticmethod
+    def _category_condition(values: np.ndarray, operator: str, operand: Any, options: str) -> np.ndarray:
+        if operator == "$regex":
+            pattern = operand if isinstance(operand, re.Pattern) else re.compile(
+                operand, re.IGNORECASE if "i" in options else 0
+            )
+            return np.array([isinstance(value, str) and bool(pattern.search(value)) for value in values], dtype=bool)
+        if operator in ("$in", "$nin") and isinstance(operand, list):
+            if any(isinstance(value, (dict, list, re.Pattern)) for value in operand):
+                raise UnsupportedPipeline(f"Unsupported operand {operand!r}")
+            isin = np.array([value in operand for value in values], dtype=bool)
+            return isin if operator == "$in" else ~isin
+        if operator in COMPARISONS:
+            if isinstance(operand, (dict, list)):
+                raise UnsupportedPipeline(f"Unsupported operand {operand!r}")
+            if operator in ("$eq", "$ne"):
+                equal = np.array([value == operand for value in values], dtype=bool)
+                return equal if operator == "$eq" else ~equal
+            if not isinstance(operand, str):
+                raise UnsupportedPipeline(f"Unsupported operand {operand!r}")
+            return np.array(
+                [isinstance(value, str) and COMPARISONS[operator](value, operand) for value in values],
+                dtype=bool,
+            )
+        raise UnsupportedPipeline(f"Unsupported operator {operator}")
+
+    @staticmethod
+    def _path(expression: Any, unwound: bool) -> str:
+        path = _field(expression)
+        if path.startswith("lineItems.") and not unwound:
+            # Before `$unwind`, a line item field is the array of the order's values.
+            raise UnsupportedPipeline(f"Expression on {path} before $unwind")
+        return path
+
+    def _values(self, expression: Any, mask: np.ndarray, unwound: bool) -> np.ndarray:
+        """
+        Evaluates a numeric expression over the selected rows.
+        """
+        if isinstance(expression, (int, float)) and not isinstance(expression, bool):
+            return np.full(int(mask.sum()), float(expression))
+        if isinstance(expression, dict) and len(expression) == 1:
+            operator, operands = next(iter(expression.items()))
+            if operator in ARITHMETIC and isinstance(operands, list) and len(operands) >= 2:
+                result = self._values(operands[0], mask, unwound)
+                for operand in operands[1:]:
+                    result = ARITHMETIC[operator](result, self._values(operand, mask, unwound))
+                return result
+        path = self._path(expression, unwound)
+        if path in self.numbers:
+            return self.numbers[path][mask]
+        raise UnsupportedPipeline(f"Field {path} is not numeric in the snapshot")
+
+    def _key(self, expression: Any, mask: np.ndarray, unwound: bool) -> Tuple[np.ndarray, Callable[[int], Any]]:
+        """
+        Evaluates a group key over the selected rows as integer codes and their decoder.
+        """
+        if expression is None:
+            return np.zeros(int(mask.sum()), dtype=np.int64), lambda code: None
+        if isinstance(expression, dict) and len(expression) == 1:
+            operator, operand = next(iter(expression.items()))
+            if operator in DATE_PARTS:
+                path = self._path(operand, unwound)
+                if path not in self.dates:
+                    raise UnsupportedPipeline(f"Field {path} is not a date in the snapshot")
+                dates = self.dates[path][mask]
+                parts = np.where(np.isnat(dates), -1, DATE_PARTS[operator](dates))
+                return parts, lambda code: None if code == -1 else int(code)
+            if operator == "$dateToString" and isinstance(operand, dict) and set(operand) <= {"format", "date"}:
+                unit = DATE_STRING_UNITS.get(operand.get("format"))
+                path = self._path(operand.get("date"), unwound)
+                if unit is None or path not in self.dates:
+                    raise UnsupportedPipeline(f"Unsupported $dateToString {operand!r}")
+                dates = self.dates[path][mask].astype(f"datetime64[{unit}]")
+                codes = np.where(np.isnat(dates), np.iinfo(np.int64).min, dates.astype(np.int64))
+                return codes, lambda code: (
+                    None
+                    if code == np.iinfo(np.int64).min
+                    else str(np.datetime64(int(code), unit))
+                )
+            raise UnsupportedPipeline(f"Unsupported group key {expression!r}")
+        path = self._path(expression, unwound)
+        if path in self.categories:
+            codes, values = self.categories[path]
+            return codes[mask].astype(np.int64), lambda code: None if code < 0 else values[code]
+        if path in self.dates:
+            dates = self.dates[path][mask]
+            return dates.astype(np.int64), lambda code: _python(np.datetime64(int(code), "ms"))
+        if path in self.numbers:
+            numbers = self.numbers[path][mask]
+            unique, codes = np.unique(numbers, return_inverse=True)
+            return codes, lambda code: _python(unique[code])
+        raise UnsupportedPipeline(f"Field {path} is not in the snapshot")
+
+    def _group(self, group: Dict[str, Any], mask: np.ndarray, unwound: bool) -> List[Dict[str, Any]]:
+        group_id = group.get("_id")
+        if isinstance(group_id, dict) and not any(key.startswith("$") for key in group_id):
+            names = list(group_id)
+            keys = [self._key(expression, mask, unwound) for expression in group_id.values()]
+        else:
+            names = None
+            keys = [self._key(group_id, mask, unwound)]
+
+        if not mask.any():
+            return []
+        stacked = np.stack([codes for codes, _ in keys], axis=1)
+        unique, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = len(unique)
+        counts = np.bincount(inverse, minlength=groups)
+
+        accumulated: Dict[str, np.ndarray] = {}
+        for name, spec in group.items():
+            if name == "_id":
+                continue
+            if not isinstance(spec, dict) or len(spec) != 1:
+                raise UnsupportedPipeline(f"Unsupported accumulator {spec!r}")
+            operator, expression = next(iter(spec.items()))
+            if operator == "$count" and expression == {} or operator == "$sum" and expression == 1:
+                accumulated[name] = counts
+            elif operator == "$sum":
+                accumulated[name] = np.bincount(
+                    inverse, weights=np.nan_to_num(self._values(expression, mask, unwound)), minlength=groups
+                )
+            elif operator == "$avg":
+                values = self._values(expression, mask, unwound)
+                present = ~np.isnan(values)
+                totals = np.bincount(inverse[present], weights=values[present], minlength=groups)
+                numbers = np.bincount(inverse[present], minlength=groups)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    accumulated[name] = np.where(numbers > 0, totals / np.maximum(numbers, 1), np.nan)
+            elif operator in ("$min", "$max"):
+                accumulated[name] = self._extreme(operator, expression, mask, unwound, inverse, groups)
+            else:
+                raise UnsupportedPipeline(f"Unsupported accumulator {operator}")
+
+        results = []
+        for index, codes in enumerate(unique):
+            decoded = [decode(code) for code, (_, decode) in zip(codes, keys)]
+            result = {"_id": dict(zip(names, decoded)) if names is not None else decoded[0]}
+            for name, values in accumulated.items():
+                result[name] = _python(values[index])
+            results.append(result)
+        return results
+
+    def _extreme(
+        self, operator: str, expression: Any, mask: np.ndarray, unwound: bool, inverse: np.ndarray, groups: int
+    ) -> np.ndarray:
+        path = self._path(expression, unwound)
+        if path in self.dates:
+            values = self.dates[path][mask].astype(np.int64)
+            present = values != np.iinfo(np.int64).min
+            fill = np.iinfo(np.int64).max if operator == "$min" else np.iinfo(np.int64).min + 1
+        else:
+            values = self._values(expression, mask, unwound)
+            present = ~np.isnan(values)
+            fill = np.inf if operator == "$min" else -np.inf
+        result = np.full(groups, fill, dtype=values.dtype)
+        (np.minimum if operator == "$min" else np.maximum).at(result, inverse[present], values[present])
+        if path in self.dates:
+            return np.where(result == fill, np.datetime64("NaT"), result.astype("datetime64[ms]"))
+        return np.where(np.isinf(result), np.nan, result)
+
+    @staticmethod
+    def _post_group(operator: str, body: Any, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if operator == "$sort":
+            for path, direction in reversed(list(body.items())):
+                if direction not in (1, -1):
+                    raise UnsupportedPipeline(f"Unsupported sort {body!r}")
+                results = sorted(
+                    results, key=lambda result: _sort_key(_lookup(result, path)), reverse=direction == -1
+                )
+            return results
+        if operator == "$limit":
+            return results[:body]
+        if operator == "$skip":
+            return results[body:]
+        if operator == "$count":
+            return [{body: len(results)}] if results else []
+        # `$project` of included, excluded and renamed fields.
+        included = {key: value for key, value in body.items() if value not in (0, False)}
+        if not all(value in (1, True) or (isinstance(value, str) and value.startswith("$")) for value in included.values()):
+            raise UnsupportedPipeline(f"Unsupported $project {body!r}")
+        if not included:
+            excluded = set(body)
+            return [{key: value for key, value in result.items() if key not in excluded} for result in results]
+        projected = []
+        for result in results:
+            document = {}
+            if body.get("_id", 1) not in (0, False):
+                document["_id"] = result.get("_id")
+            for key, value in included.items():
+                if key == "_id" and value in (1, True):
+                    continue
+                resolved = _lookup(result, key if value in (1, True) else value[1:], _MISSING)
+                if resolved is not _MISSING:
+                    document[key] = resolved
+            projected.append(document)
+        return projected
+
+
+SOURCES = ("off", "parquet", "mongo")
+
+
+async def load_columnar_engine(source: str, mongo_client, parquet_path: str = "") -> Optional[ColumnarEngine]:
+    """
+    Loads the snapshot from the ETL's Parquet file or from the orders collection.
+
+    :param source: `off`, `parquet` or `mongo`.
+    :param mongo_client: The MongoDB service, to export the snapshot from with `mongo`.
+    :param parquet_path: The ETL's line items snapshot, with `parquet`.
+    :return: The engine, or None when disabled or the snapshot cannot be loaded.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown columnar source {source!r}, expected one of {', '.join(SOURCES)}")
+    if source == "off":
+        return None
+    started = time.perf_counter()
+    try:
+        if source == "parquet":
+            if not parquet_path or not Path(parquet_path).exists():
+                logger.warning(f"No columnar snapshot at {parquet_path!r}, the columnar engine is disabled")
+                return None
+            engine = await asyncio.to_thread(ColumnarEngine.from_parquet, parquet_path)
+        else:
+            engine = await ColumnarEngine.from_mongo(mongo_client.orders_collection)
+    except Exception as e:
+        logger.warning(f"Loading the columnar snapshot failed, the columnar engine is disabled: {str(e)}")
+        return None
+    logger.info(
+        f"Loaded {engine.rows:,} line items from {source} into the columnar engine "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+    return engine
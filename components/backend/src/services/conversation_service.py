@@ -1,19 +1,60 @@
+import asyncio
 import logging
-from graph.graph_state import AgentState
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+from graph.graph_state import (
+    AgentState,
+    GREETING_AGENT,
+    ANALYTICS_AGENT,
+    VALIDATION_AGENT,
+    EXECUTION_AGENT,
+    INTENT_ROUTER,
+    QUERY_FIXER,
+)
 from langchain_core.messages import HumanMessage, AIMessage
 from graph.graph_builder import GraphBuilder
+from graph.result_renderer import describe_columns, flatten_row
+from services.single_flight import SingleFlight, normalize_question
+from services.tracing import current_span, end_span, record_cache, span, start_span
 
 
 logger = logging.getLogger(__name__)
 
+GRAPH_NODES = {
+    INTENT_ROUTER,
+    GREETING_AGENT,
+    ANALYTICS_AGENT,
+    VALIDATION_AGENT,
+    EXECUTION_AGENT,
+}
+# Nodes whose chat model output is addressed to the user and worth streaming token by token.
+STREAMING_NODES = {GREETING_AGENT, ANALYTICS_AGENT}
+# State written into the thread of a question answered by another thread's computation.
+SHARED_STATE_KEYS = (
+    "current_route",
+    "intent",
+    "user_query",
+    "generated_query",
+    "query_correct",
+    "query_trusted",
+    "query_result",
+    "executed_query",
+    "query_execution",
+)
+
 
 class ConversationService:
-    def __init__(self, graph: GraphBuilder):
+    def __init__(self, graph: GraphBuilder, single_flight: Optional[SingleFlight] = None):
         """
         A service for handling conversations with a user. It uses `graph` to simulate
         the conversation flow and predict bot responses.
+
+        When `single_flight` is given, identical first questions of new threads asked while one
+        of them is being answered share its graph run.
         """
         self.graph = graph
+        self.single_flight = single_flight
 
     async def standard_response(self, user_message: str, thread_id: str) -> str:
         """
@@ -23,27 +64,227 @@ class ConversationService:
         :param thread_id: A thread identifier for tracking conversation context.
         :return: The bot's response (as a string) or None if no response is generated.
         """
+        state = await self._run_turn(user_message, thread_id)
+        return self._last_ai_response(state["messages"])
 
-        input_message = HumanMessage(content=user_message, name="User")
-        response = await self.graph.ainvoke(
-            {"messages": [input_message]}, {"configurable": {"thread_id": thread_id}}
+    async def structured_response(
+        self, user_message: str, thread_id: str, max_rows: int
+    ) -> Dict[str, Any]:
+        """
+        Like `standard_response`, with the results of the query the turn ran, if any, as typed
+        rows and column metadata, and the timings of the turn.
+
+        :param max_rows: Rows of the results included, the others are only counted.
+        :return: The `bot_response`, the `timings` in milliseconds and, when the turn ran a
+            query, its `result`.
+        """
+        started = time.perf_counter()
+        state = await self._run_turn(user_message, thread_id)
+        response: Dict[str, Any] = {
+            "bot_response": self._last_ai_response(state["messages"]),
+            "timings": {"total_ms": (time.perf_counter() - started) * 1000},
+        }
+
+        execution = state.get("query_execution") or {}
+        query_result = state.get("query_result")
+        turn_id = next(
+            (message.id for message in reversed(state["messages"]) if isinstance(message, HumanMessage)),
+            None,
         )
+        # The results of an earlier turn stay in the state, only those of this turn are returned.
+        if execution.get("turn") != turn_id or query_result is None:
+            return response
+        rows = [flatten_row(row) for row in query_result[:max_rows]]
+        response["result"] = {
+            "rows": rows,
+            "columns": describe_columns(rows),
+            "row_count": len(query_result),
+            "truncated": len(query_result) > max_rows or execution.get("truncated", False),
+            "pipeline_hash": execution["pipeline_hash"],
+            "source": execution["source"],
+            "estimate": state.get("query_estimate"),
+        }
+        response["timings"]["execution_ms"] = execution["execution_ms"]
+        return response
 
-        last_response = None
-        for response in response['messages']:
-            if "tool_calls" in response.additional_kwargs:
-                for call in response.additional_kwargs["tool_calls"]:
-                    logging.info(
-                        f"({type(response).__name__}) "
-                        f"{call['function']['name']}: {call['function']['arguments']}"
-                    )
-            else:
-                logging.info(
-                    f"({type(response).__name__}) {response.name} : {response.content}"
+    async def _run_turn(self, user_message: str, thread_id: str) -> Dict[str, Any]:
+        input_message = HumanMessage(content=user_message, name="User")
+        config = {"configurable": {"thread_id": thread_id}}
+
+        async def run_graph():
+            return await self.graph.ainvoke({"messages": [input_message]}, config)
+
+        with span("turn", "chat", thread_id=thread_id) as turn:
+            # Only the first question of a thread can be shared, later answers depend on the history.
+            if self.single_flight is not None and not (await self.graph.aget_state(config)).values:
+                state, shared = await self.single_flight.do(
+                    normalize_question(user_message), run_graph
                 )
+                record_cache("question_flight", shared)
+                if shared:
+                    state = await self._write_shared_state(state, input_message, config)
+            else:
+                state = await run_graph()
+            turn.set(**self._turn_attributes(state))
+        return state
+
+    async def batch_response(
+        self, conversations: List[Tuple[str, str]], max_concurrency: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs the graph for many conversations concurrently, at most `max_concurrency` at a time.
+
+        Messages sharing a thread are run one after another in their input order, so each turn
+        sees the state left by the previous one. A failing message does not affect the others.
+
+        :param conversations: Pairs of user message and thread identifier.
+        :param max_concurrency: Maximum number of graph runs in flight.
+        :return: One result per conversation, in input order, with the bot response or the error
+            and the latency in milliseconds.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results: List[Dict[str, Any]] = [None] * len(conversations)
+
+        threads: Dict[str, List[int]] = {}
+        for index, (_, thread_id) in enumerate(conversations):
+            threads.setdefault(thread_id, []).append(index)
+
+        async def run(index: int):
+            user_message, thread_id = conversations[index]
+            async with semaphore:
+                start = time.perf_counter()
+                result = {"thread_id": thread_id, "bot_response": None, "error": None}
+                try:
+                    result["bot_response"] = await self.standard_response(user_message, thread_id)
+                except Exception as e:
+                    logger.error(f"An error occurred in batch item {index}: {str(e)}")
+                    result["error"] = str(e)
+                result["latency_ms"] = (time.perf_counter() - start) * 1000
+            results[index] = result
+
+        async def run_thread(indexes: List[int]):
+            for index in indexes:
+                await run(index)
 
-            if isinstance(response, AIMessage):
-                last_response = response.content
+        await asyncio.gather(*(run_thread(indexes) for indexes in threads.values()))
+        return results
 
+    async def stream_response(
+        self, user_message: str, thread_id: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Runs the conversation graph and yields events as they happen: node transitions,
+        the generated pipeline, execution progress, LLM tokens and the final response.
+
+        :param user_message: The input message from the user.
+        :param thread_id: A thread identifier for tracking conversation context.
+        :return: An async iterator of event dictionaries with an `event` key.
+        """
+        input_message = HumanMessage(content=user_message, name="User")
+        # Started and ended explicitly: the generator may be resumed or closed from another
+        # context than the one it started in. The turn is only the current span while waiting
+        # for the next event, so that the graph's spans nest under it without the consumer of
+        # the stream keeping it once it ended.
+        turn = start_span("turn", "chat_stream", thread_id=thread_id)
+        events = self.graph.astream_events(
+            {"messages": [input_message]},
+            {"configurable": {"thread_id": thread_id}},
+            version="v2",
+        )
+
+        async def next_event() -> Optional[Dict[str, Any]]:
+            token = current_span.set(turn)
+            try:
+                return await anext(events, None)
+            finally:
+                current_span.reset(token)
+
+        try:
+            while (event := await next_event()) is not None:
+                kind = event["event"]
+                name = event["name"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                data = event.get("data", {})
+
+                if kind == "on_chain_start" and name in GRAPH_NODES and name == node:
+                    yield {"event": "node_start", "node": name}
+                    if name == EXECUTION_AGENT:
+                        yield {"event": "execution", "node": name, "data": {"status": "running"}}
+
+                elif kind == "on_chain_end" and name in GRAPH_NODES and name == node:
+                    if name == EXECUTION_AGENT:
+                        query_result = (data.get("output") or {}).get("query_result")
+                        status = "failed" if query_result is None else "completed"
+                        rows = len(query_result) if query_result is not None else 0
+                        yield {
+                            "event": "execution",
+                            "node": name,
+                            "data": {"status": status, "rows": rows},
+                        }
+                    yield {"event": "node_end", "node": name}
+
+                elif kind == "on_tool_end" and name == "write_query_tool":
+                    artifact = getattr(data.get("output"), "artifact", None) or {}
+                    if artifact.get("generated_query"):
+                        yield {
+                            "event": "pipeline",
+                            "node": node,
+                            "content": artifact["generated_query"],
+                        }
+
+                elif kind == "on_chat_model_stream" and node in STREAMING_NODES:
+                    chunk = data.get("chunk")
+                    if chunk is not None and isinstance(chunk.content, str) and chunk.content:
+                        yield {"event": "token", "node": node, "content": chunk.content}
+
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    messages = (data.get("output") or {}).get("messages", [])
+                    yield {"event": "final", "content": self._last_ai_response(messages)}
+        except Exception as e:
+            logger.error(f"An error occurred while streaming the response: {str(e)}")
+            turn.status = "error"
+            turn.set(error=str(e))
+            yield {"event": "error", "content": str(e)}
+        finally:
+            end_span(turn)
+
+    async def _write_shared_state(
+        self, state: Dict[str, Any], input_message: HumanMessage, config: dict
+    ) -> Dict[str, Any]:
+        """
+        Records a turn computed for another thread in this thread: the user message, the answers
+        and the query state, as if the Analytics_Agent had produced them here.
+        """
+        answers = [
+            message.model_copy(update={"id": None})
+            for message in state["messages"]
+            if not isinstance(message, HumanMessage)
+        ]
+        input_message = input_message.model_copy(update={"id": str(uuid4())})
+        values = {key: state[key] for key in SHARED_STATE_KEYS if key in state}
+        if values.get("query_execution"):
+            values["query_execution"] = {**values["query_execution"], "turn": input_message.id}
+        values["messages"] = [input_message, *answers]
+        await self.graph.aupdate_state(config, values, as_node=ANALYTICS_AGENT)
+        return {**state, **values}
+
+    @staticmethod
+    def _turn_attributes(state: Dict[str, Any]) -> Dict[str, Any]:
+        messages = state.get("messages", [])
+        return {
+            "messages": len(messages),
+            "tool_calls": [
+                call["name"] for message in messages for call in getattr(message, "tool_calls", [])
+            ],
+            "route": state.get("current_route"),
+            "intent": state.get("intent"),
+            "rows": len(state["query_result"]) if state.get("query_result") is not None else None,
+        }
+
+    @staticmethod
+    def _last_ai_response(messages) -> str:
+        last_response = None
+        for message in messages:
+            if isinstance(message, AIMessage):
+                last_response = message.content
         return last_response
-    
\ No newline at end of file
@@ -0,0 +1,144 @@
+import csv
+import datetime
+import io
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional
+from bson import Decimal128, ObjectId
+from graph.result_renderer import flatten_row
+from services.serialization import bson_default, dumps
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "arrow": "arrows"}
+
+
+def _scalar(value: Any) -> Any:
+    """
+    Converts a BSON value to a flat column value: ObjectIds and nested documents as text,
+    decimals as floats.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (Decimal128, Decimal)):
+        return bson_default(value)
+    if isinstance(value, (dict, list, tuple)):
+        return dumps(value).decode("utf-8")
+    return value
+
+
+def _csv_value(value: Any) -> Any:
+    value = _scalar(value)
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _columns(batch: List[Dict[str, Any]]) -> List[str]:
+    columns: Dict[str, None] = {}
+    for row in batch:
+        columns.update(dict.fromkeys(row))
+    return list(columns)
+
+
+async def _csv(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    columns: Optional[List[str]] = None
+    async for batch in batches:
+        rows = [flatten_row(row) for row in batch]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if columns is None:
+            columns = _columns(rows)
+            writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_csv_value(row.get(column)) for column in columns])
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _ndjson(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+
+class _Chunks:
+    """
+    Writable file collecting what the Arrow stream writer writes, drained after every batch.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _arrow_field(field):
+    import pyarrow as pa
+
+    # Integers are widened to floats, since sums and averages mix them, and columns without
+    # values in the first batch are taken as text.
+    if pa.types.is_integer(field.type):
+        return pa.field(field.name, pa.float64())
+    if pa.types.is_null(field.type):
+        return pa.field(field.name, pa.string())
+    return field
+
+
+async def _arrow(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    # Imported here so that pyarrow only loads when Arrow is requested.
+    import pyarrow as pa
+
+    sink = _Chunks()
+    writer = None
+    schema = None
+    async for batch in batches:
+        rows = [{key: _scalar(value) for key, value in flatten_row(row).items()} for row in batch]
+        if schema is None:
+            schema = pa.schema([_arrow_field(field) for field in pa.RecordBatch.from_pylist(rows).schema])
+            writer = pa.ipc.new_stream(sink, schema)
+        for field in schema:
+            if pa.types.is_string(field.type):
+                for row in rows:
+                    if row.get(field.name) is not None and not isinstance(row[field.name], str):
+                        row[field.name] = str(row[field.name])
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.schema([]))
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": _csv, "ndjson": _ndjson, "arrow": _arrow}
+
+
+def encode_batches(
+    batches: AsyncIterator[List[Dict[str, Any]]], export_format: str
+) -> AsyncIterator[bytes]:
+    """
+    Encodes batches of query results as they arrive, one chunk per batch, so that an export
+    holds a single batch in memory whatever the size of the results.
+
+    CSV and Arrow flatten a compound `_id` into columns and take their columns from the first
+    batch. NDJSON writes every document as is.
+
+    :param batches: Batches of documents, as yielded by `MongoDBService.stream_orders`.
+    :param export_format: `csv`, `ndjson` or `arrow` (Arrow IPC stream).
+    """
+    if export_format not in ENCODERS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(ENCODERS)}")
+    return ENCODERS[export_format](batches)
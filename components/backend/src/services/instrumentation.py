@@ -0,0 +1,143 @@
+import math
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Returns the `q`-th percentile (0-100) of the values with the nearest-rank method.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def latency_summary(values: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies with their count, mean and p50/p95/p99.
+    """
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+class NodeTimer(AsyncCallbackHandler):
+    """
+    Callback handler recording the wall time of each graph node run, in milliseconds.
+
+    Attach it to the compiled graph, e.g. `graph.with_config(callbacks=[NodeTimer(nodes)])`.
+    """
+
+    def __init__(self, nodes: Iterable[str]):
+        """
+        :param nodes: Names of the graph nodes to time.
+        """
+        self.nodes = set(nodes)
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._started: Dict[UUID, tuple] = {}
+
+    async def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name")
+        if name in self.nodes and (metadata or {}).get("langgraph_node") == name:
+            self._started[run_id] = (name, time.perf_counter())
+
+    async def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started:
+            name, started_at = started
+            self.timings[name].append((time.perf_counter() - started_at) * 1000)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started:
+            self.errors[started[0]] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: The latency summary of each node that ran, with its error count.
+        """
+        return {
+            node: {**latency_summary(values), "errors": self.errors.get(node, 0)}
+            for node, values in sorted(self.timings.items())
+        }
+
+
+@dataclass
+class RunStats:
+    """
+    Cost counters of one graph run.
+    """
+
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    mongo_queries: int = 0
+    mongo_ms: float = 0.0
+
+
+current_run_stats: ContextVar[Optional[RunStats]] = ContextVar("current_run_stats", default=None)
+
+
+def record_mongo_query(latency_ms: float) -> None:
+    """
+    Adds an aggregation to the stats of the current run, if any is being tracked.
+    """
+    stats = current_run_stats.get()
+    if stats is not None:
+        stats.mongo_queries += 1
+        stats.mongo_ms += latency_ms
+
+
+def token_usage(response: LLMResult) -> Tuple[int, int]:
+    """
+    :return: The input and output tokens of an LLM call, as reported by the provider.
+    """
+    usage = next(
+        (
+            generation.message.usage_metadata
+            for generations in response.generations
+            for generation in generations
+            if getattr(getattr(generation, "message", None), "usage_metadata", None)
+        ),
+        None,
+    )
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class RunStatsHandler(AsyncCallbackHandler):
+    """
+    Callback handler counting the LLM calls and tokens of a run into its `RunStats`.
+    """
+
+    def __init__(self, stats: RunStats):
+        self.stats = stats
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        input_tokens, output_tokens = token_usage(response)
+        self.stats.llm_calls += 1
+        self.stats.input_tokens += input_tokens
+        self.stats.output_tokens += output_tokens
@@ -1,7 +1,20 @@
+import asyncio
 import logging
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ExecutionTimeout
 from urllib.parse import quote_plus
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from services.query_guardrails import (
+    QueryRejectedError,
+    check_forbidden_stages,
+    ensure_limit_with_lookahead,
+    estimate_docs_examined,
+    truncate_results,
+)
+from services.instrumentation import record_mongo_query
+from services.query_profiler import QueryProfiler
+from services.tracing import MONGO_ROWS, span
 
 
 logger = logging.getLogger(__name__)
@@ -20,6 +33,13 @@ class MongoDBService:
         password: str,
         db_name: str,
         orders_collection: str = "orders",
+        max_time_ms: Optional[int] = None,
+        default_limit: Optional[int] = None,
+        allow_disk_use: bool = False,
+        explain_before_run: bool = False,
+        max_docs_examined: Optional[int] = None,
+        profile_sample_rate: Optional[float] = None,
+        min_pool_size: int = 0,
     ):
         """
         Initializes the MongoDB connection with authentication.
@@ -31,6 +51,14 @@ class MongoDBService:
             password (str): Password for MongoDB authentication.
             db_name (str): Name of the database.
             orders_collection (str): Collection name for combined orders and line items.
+            max_time_ms (Optional[int]): Server-side time limit applied to every aggregation.
+            default_limit (Optional[int]): `$limit` appended to pipelines that have none.
+            allow_disk_use (bool): Whether aggregations may spill to disk.
+            explain_before_run (bool): Run `explain` first and gate on the estimated cost.
+            max_docs_examined (Optional[int]): Reject pipelines estimated to examine more documents.
+            profile_sample_rate (Optional[float]): Enables query profiling and sets the fraction of
+                executions whose explain plan is captured.
+            min_pool_size (int): Connections the driver keeps open to the server.
         """
         username_quoted = quote_plus(username)
         password_quoted = quote_plus(password)
@@ -39,24 +67,180 @@ class MongoDBService:
             f"{db_name}?authSource=admin&directConnection=true"
             f"&serverSelectionTimeoutMS=2000&appName=mongosh+2.3.8"
         )
-        self.client = AsyncIOMotorClient(mongo_uri)
+        self.client = AsyncIOMotorClient(mongo_uri, minPoolSize=min_pool_size)
+        self.min_pool_size = min_pool_size
         self.db = self.client[db_name]
         self.orders_collection = self.db[orders_collection]
+        self.max_time_ms = max_time_ms
+        self.default_limit = default_limit
+        self.allow_disk_use = allow_disk_use
+        self.explain_before_run = explain_before_run
+        self.max_docs_examined = max_docs_examined
+        self.profiler = (
+            QueryProfiler(self.db, sample_rate=profile_sample_rate)
+            if profile_sample_rate is not None
+            else None
+        )
 
     async def aggregate_orders(
-        self, pipeline: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        self, pipeline: List[Dict[str, Any]], collection: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Runs an aggregation query on the orders collection with the configured guardrails.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+            collection (Optional[str]): Collection to run it on instead, such as a sample of the
+                orders.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], bool]: Aggregated results, and whether the default
+                `$limit` left out some of them.
+
+        Raises:
+            QueryRejectedError: If the pipeline is refused or exceeds the time limit.
+        """
+        with span("mongo", "aggregate", stages=len(pipeline)) as aggregation:
+            check_forbidden_stages(pipeline)
+            pipeline, keep = ensure_limit_with_lookahead(pipeline, self.default_limit)
+            if self.explain_before_run and self.max_docs_examined:
+                await self._check_estimated_cost(pipeline, collection)
+
+            options = {"allowDiskUse": self.allow_disk_use}
+            if self.max_time_ms:
+                options["maxTimeMS"] = self.max_time_ms
+            try:
+                started = time.perf_counter()
+                target = self.db[collection] if collection else self.orders_collection
+                cursor = target.aggregate(pipeline, **options)
+                results, truncated = truncate_results([doc async for doc in cursor], keep)
+            except ExecutionTimeout:
+                raise QueryRejectedError(
+                    f"The query exceeded the time limit of {self.max_time_ms} ms. "
+                    "Narrow it with a selective `$match` (for example on `creationDate`) "
+                    "at the start of the pipeline or avoid unnecessary `$unwind` stages."
+                )
+            latency_ms = (time.perf_counter() - started) * 1000
+            record_mongo_query(latency_ms)
+            aggregation.set(rows=len(results), truncated=truncated)
+            MONGO_ROWS.observe(len(results))
+            if self.profiler and not collection:
+                self.profiler.observe(pipeline, latency_ms, self.explain_aggregation)
+            return results, truncated
+
+    async def stream_orders(
+        self,
+        pipeline: List[Dict[str, Any]],
+        batch_size: int = 1000,
+        max_time_ms: Optional[int] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Runs an aggregation query on the orders collection and yields its results batch by batch,
+        for exports of the complete results. Unlike `aggregate_orders`, no default `$limit` is
+        appended.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+            batch_size (int): Documents fetched from the server per batch.
+            max_time_ms (Optional[int]): Server-side time limit of the whole aggregation.
+
+        Yields:
+            List[Dict[str, Any]]: The next batch of results.
+
+        Raises:
+            QueryRejectedError: If the pipeline is refused or exceeds the time limit.
+        """
+        check_forbidden_stages(pipeline)
+        options = {"allowDiskUse": self.allow_disk_use, "batchSize": batch_size}
+        if max_time_ms:
+            options["maxTimeMS"] = max_time_ms
+        cursor = self.orders_collection.aggregate(pipeline, **options)
+        rows = 0
+        try:
+            while True:
+                batch = await cursor.to_list(length=batch_size)
+                if not batch:
+                    break
+                rows += len(batch)
+                yield batch
+        except ExecutionTimeout:
+            raise QueryRejectedError(
+                f"The export exceeded the time limit of {max_time_ms} ms."
+            )
+        finally:
+            await cursor.close()
+            logger.info(f"Streamed {rows} documents")
+
+    async def explain_aggregation(
+        self,
+        pipeline: List[Dict[str, Any]],
+        verbosity: str = "queryPlanner",
+        collection: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
-        Runs an aggregation query on the orders collection.
+        Runs the `explain` command for an aggregation on the orders collection.
 
         Args:
             pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+            verbosity (str): Explain verbosity, `queryPlanner` does not execute the pipeline.
+            collection (Optional[str]): Collection to explain it on instead.
+
+        Returns:
+            Dict[str, Any]: The explain output.
+        """
+        command = {
+            "explain": {
+                "aggregate": collection or self.orders_collection.name,
+                "pipeline": pipeline,
+                "cursor": {},
+            },
+            "verbosity": verbosity,
+        }
+        if self.max_time_ms:
+            command["maxTimeMS"] = self.max_time_ms
+        return await self.db.command(command)
+
+    async def _check_estimated_cost(
+        self, pipeline: List[Dict[str, Any]], collection: Optional[str] = None
+    ) -> None:
+        explain = await self.explain_aggregation(pipeline, collection=collection)
+        target = self.db[collection] if collection else self.orders_collection
+        collection_count = await target.estimated_document_count()
+        docs_examined = estimate_docs_examined(explain, collection_count)
+        if docs_examined > self.max_docs_examined:
+            logger.warning(
+                f"Rejected pipeline estimated to examine {docs_examined} documents."
+            )
+            raise QueryRejectedError(
+                f"The query would scan about {docs_examined} documents, more than the "
+                f"allowed {self.max_docs_examined}. Add a selective `$match` on an indexed "
+                "field such as `creationDate` as the first stage of the pipeline."
+            )
+
+    async def ping(self) -> bool:
+        """
+        Checks that the server is reachable.
+
+        Returns:
+            bool: Whether the server answered the `ping` command.
+        """
+        try:
+            await self.client.admin.command("ping")
+            return True
+        except Exception as e:
+            logger.warning(f"MongoDB ping failed: {str(e)}")
+            return False
+
+    async def warm_up(self) -> bool:
+        """
+        Pings the server over `min_pool_size` concurrent connections, so that the first requests
+        find them open.
 
         Returns:
-            List[Dict[str, Any]]: Aggregated results.
+            bool: Whether the server is reachable.
         """
-        cursor = self.orders_collection.aggregate(pipeline)
-        return [doc async for doc in cursor]
+        results = await asyncio.gather(*(self.ping() for _ in range(max(self.min_pool_size, 1))))
+        return all(results)
 
     async def close_connection(self) -> None:
         """
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+FORBIDDEN_STAGES = {"$out", "$merge"}
+
+
+class QueryRejectedError(Exception):
+    """
+    Raised when a generated pipeline is refused by the server-side guardrails.
+    The message is written for the Analytics Agent so it can regenerate a cheaper query.
+    """
+
+
+def check_forbidden_stages(pipeline: List[Dict[str, Any]]) -> None:
+    """
+    Rejects pipelines that contain stages writing to the database.
+
+    Args:
+        pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+
+    Raises:
+        QueryRejectedError: If a write stage such as `$out` or `$merge` is present.
+    """
+    for stage in pipeline:
+        forbidden = FORBIDDEN_STAGES.intersection(stage)
+        if forbidden:
+            raise QueryRejectedError(
+                f"The pipeline uses the write stage {', '.join(sorted(forbidden))}, "
+                "only read-only aggregation stages are allowed."
+            )
+
+
+def _is_bounded(pipeline: List[Dict[str, Any]], limit: int) -> bool:
+    """
+    Whether the last stage already returns at most `limit` documents: a `$limit` no larger than
+    it, a `$count` or a `$group` on a null `_id`. A `$limit` earlier in the pipeline does not
+    bound what later stages such as `$unwind` or `$lookup` return.
+    """
+    if not pipeline:
+        return False
+    last = pipeline[-1]
+    if "$limit" in last:
+        return isinstance(last["$limit"], int) and last["$limit"] <= limit
+    if "$count" in last:
+        return True
+    group = last.get("$group")
+    return isinstance(group, dict) and "_id" in group and group["_id"] is None
+
+
+def ensure_limit(
+    pipeline: List[Dict[str, Any]], limit: Optional[int]
+) -> List[Dict[str, Any]]:
+    """
+    Appends a trailing `$limit` stage unless the last stage already returns at most `limit`
+    documents.
+
+    Args:
+        pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+        limit (Optional[int]): Maximum number of documents to return; disabled when falsy.
+
+    Returns:
+        List[Dict[str, Any]]: The pipeline with a `$limit` guaranteed, the input is not mutated.
+    """
+    if not limit or _is_bounded(pipeline, limit):
+        return list(pipeline)
+    return [*pipeline, {"$limit": limit}]
+
+
+def ensure_limit_with_lookahead(
+    pipeline: List[Dict[str, Any]], limit: Optional[int]
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Like `ensure_limit`, but the appended `$limit` lets one more document through, so that
+    `truncate_results` can tell whether the limit cut the results.
+
+    Args:
+        pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+        limit (Optional[int]): Maximum number of documents to return; disabled when falsy.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[int]]: The pipeline and the number of documents to
+            keep, None when no `$limit` was appended.
+    """
+    if not limit or _is_bounded(pipeline, limit):
+        return list(pipeline), None
+    return [*pipeline, {"$limit": limit + 1}], limit
+
+
+def truncate_results(results: List[Any], keep: Optional[int]) -> Tuple[List[Any], bool]:
+    """
+    Cuts the results of a pipeline from `ensure_limit_with_lookahead` to the documents to keep.
+
+    Returns:
+        Tuple[List[Any], bool]: The results and whether documents were left out.
+    """
+    if keep is None or len(results) <= keep:
+        return results, False
+    return results[:keep], True
+
+
+def _find_plan_stages(node: Any) -> List[str]:
+    stages = []
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stages.append(node["stage"])
+        for value in node.values():
+            stages.extend(_find_plan_stages(value))
+    elif isinstance(node, list):
+        for value in node:
+            stages.extend(_find_plan_stages(value))
+    return stages
+
+
+def _find_winning_plans(explain: Any) -> List[Dict[str, Any]]:
+    plans = []
+    if isinstance(explain, dict):
+        if isinstance(explain.get("winningPlan"), dict):
+            plans.append(explain["winningPlan"])
+        for key, value in explain.items():
+            if key != "winningPlan":
+                plans.extend(_find_winning_plans(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            plans.extend(_find_winning_plans(value))
+    return plans
+
+
+def estimate_docs_examined(explain: Dict[str, Any], collection_count: int) -> int:
+    """
+    Estimates how many documents a pipeline will examine from its `queryPlanner` explain output.
+
+    A winning plan that contains a `COLLSCAN` reads the whole collection, so the estimate is the
+    collection size. Index-backed plans are bounded by the index and estimated as zero.
+
+    Args:
+        explain (Dict[str, Any]): Output of the `explain` command for an aggregation.
+        collection_count (int): Estimated number of documents in the collection.
+
+    Returns:
+        int: Estimated number of documents examined.
+    """
+    winning_plans = _find_winning_plans(explain)
+    if not winning_plans:
+        # Pipelines that cannot use the query layer at all fall back to a full scan.
+        return collection_count
+    for plan in winning_plans:
+        if "COLLSCAN" in _find_plan_stages(plan):
+            return collection_count
+    return 0
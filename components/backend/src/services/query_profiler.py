@@ -0,0 +1,288 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+# Stage bodies whose literals describe the structure rather than user-provided values.
+STRUCTURAL_STAGES = {"$sort", "$project"}
+
+
+def _placeholder(value: Any) -> Any:
+    if isinstance(value, bool):
+        return "?bool"
+    if isinstance(value, (int, float)):
+        return "?num"
+    if isinstance(value, datetime.datetime):
+        return "?date"
+    if value is None:
+        return "?null"
+    if isinstance(value, str):
+        # Strings starting with `$` are field paths and part of the shape.
+        return value if value.startswith("$") else "?str"
+    return f"?{type(value).__name__}"
+
+
+def _shape(node: Any) -> Any:
+    if isinstance(node, dict):
+        return {
+            key: value if key in STRUCTURAL_STAGES else _shape(value)
+            for key, value in node.items()
+        }
+    if isinstance(node, list):
+        items = [_shape(item) for item in node]
+        if all(isinstance(item, str) and item.startswith("?") for item in items):
+            return sorted(set(items))
+        return items
+    return _placeholder(node)
+
+
+def pipeline_shape(pipeline: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Normalizes a pipeline by replacing literal values with typed placeholders.
+
+    Args:
+        pipeline (List[Dict[str, Any]]): MongoDB aggregation pipeline.
+
+    Returns:
+        Tuple[str, List[Dict[str, Any]]]: The shape hash and the normalized shape.
+    """
+    shape = _shape(pipeline)
+    encoded = json.dumps(shape, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest(), shape
+
+
+def _walk(node: Any):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extracts the figures used by the index advisor from an `executionStats` explain output.
+
+    Args:
+        explain (Dict[str, Any]): Output of the `explain` command.
+
+    Returns:
+        Dict[str, Any]: Documents and keys examined, returned documents, plan stages and indexes.
+    """
+    summary = {
+        "totalDocsExamined": 0,
+        "totalKeysExamined": 0,
+        "nReturned": 0,
+        "stages": set(),
+        "indexes": set(),
+    }
+    for node in _walk(explain):
+        if "executionStats" in node and isinstance(node["executionStats"], dict):
+            stats = node["executionStats"]
+            for key in ("totalDocsExamined", "totalKeysExamined", "nReturned"):
+                summary[key] += stats.get(key, 0)
+        if isinstance(node.get("stage"), str):
+            summary["stages"].add(node["stage"])
+        if isinstance(node.get("indexName"), str):
+            summary["indexes"].add(node["indexName"])
+    summary["stages"] = sorted(summary["stages"])
+    summary["indexes"] = sorted(summary["indexes"])
+    summary["collscan"] = "COLLSCAN" in summary["stages"]
+    return summary
+
+
+class QueryProfiler:
+    """
+    Records the latency of executed pipelines keyed by their shape and samples their explain plans.
+    """
+
+    def __init__(
+        self,
+        db,
+        sample_rate: float = 0.1,
+        collection_name: str = "QueryProfiles",
+    ):
+        """
+        Args:
+            db: Motor database where the profiles are stored.
+            sample_rate (float): Fraction of executions whose `executionStats` explain is captured.
+            collection_name (str): Collection holding one document per pipeline shape.
+        """
+        self.collection = db[collection_name]
+        self.sample_rate = sample_rate
+        self._tasks = set()
+
+    def observe(
+        self,
+        pipeline: List[Dict[str, Any]],
+        latency_ms: float,
+        explain_fn: Callable[[List[Dict[str, Any]], str], Awaitable[Dict[str, Any]]],
+    ) -> None:
+        """
+        Schedules the recording of an executed pipeline without delaying the caller.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): The executed pipeline.
+            latency_ms (float): Wall time of the aggregation.
+            explain_fn: Coroutine function running `explain` with the given verbosity.
+        """
+        sampled = random.random() < self.sample_rate
+        task = asyncio.create_task(self._record(pipeline, latency_ms, explain_fn, sampled))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _record(self, pipeline, latency_ms, explain_fn, sampled: bool) -> None:
+        shape_hash, shape = pipeline_shape(pipeline)
+        update = {
+            "$inc": {"count": 1, "totalLatencyMs": latency_ms},
+            "$max": {"maxLatencyMs": latency_ms},
+            "$set": {
+                "shape": json.dumps(shape, sort_keys=True, default=str),
+                "lastPipeline": json.dumps(pipeline, default=str),
+                "lastSeen": datetime.datetime.now(datetime.timezone.utc),
+            },
+        }
+        try:
+            if sampled:
+                explain = await explain_fn(pipeline, "executionStats")
+                update["$set"]["lastExplain"] = summarize_explain(explain)
+                update["$set"]["lastExplainLatencyMs"] = latency_ms
+                update["$inc"]["explainSamples"] = 1
+            await self.collection.update_one({"_id": shape_hash}, update, upsert=True)
+        except Exception as e:
+            logger.warning(f"Failed to record the query profile: {str(e)}")
+
+    async def load_profiles(self) -> List[Dict[str, Any]]:
+        """
+        Returns all recorded profiles.
+        """
+        return [doc async for doc in self.collection.find({})]
+
+
+def _leading_match_fields(shape: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    equality, ranges = [], []
+    for stage in shape:
+        if "$match" not in stage:
+            break
+        for field, condition in stage["$match"].items():
+            if field.startswith("$"):
+                continue
+            operators = set(condition) if isinstance(condition, dict) else set()
+            target = ranges if operators & RANGE_OPERATORS else equality
+            if field not in equality and field not in ranges:
+                target.append(field)
+    return equality, ranges
+
+
+def _sort_keys(shape: List[Dict[str, Any]]) -> List[Tuple[str, int]]:
+    for stage in shape:
+        if "$match" in stage:
+            continue
+        if "$sort" in stage:
+            return [
+                (field, direction)
+                for field, direction in stage["$sort"].items()
+                if not field.startswith("$") and direction in (1, -1)
+            ]
+        break
+    return []
+
+
+def recommend_index(shape: List[Dict[str, Any]]) -> Optional[List[Tuple[str, int]]]:
+    """
+    Recommends a compound index for a pipeline shape following the Equality, Sort, Range rule.
+
+    Only the leading `$match` stages (and a `$sort` directly after them) can use an index.
+
+    Args:
+        shape (List[Dict[str, Any]]): A normalized pipeline shape.
+
+    Returns:
+        Optional[List[Tuple[str, int]]]: Index keys in order, or None when no index applies.
+    """
+    equality, ranges = _leading_match_fields(shape)
+    if not equality and not ranges:
+        return None
+    keys = [(field, 1) for field in equality]
+    for field, direction in _sort_keys(shape):
+        if field not in equality and field not in ranges:
+            keys.append((field, direction))
+    keys.extend((field, 1) for field in ranges)
+    return keys
+
+
+def _is_covered(keys: List[Tuple[str, int]], existing: List[List[Tuple[str, int]]]) -> bool:
+    fields = [field for field, _ in keys]
+    return any([field for field, _ in index[: len(fields)]] == fields for index in existing)
+
+
+def advise_indexes(
+    profiles: List[Dict[str, Any]],
+    existing_indexes: List[List[Tuple[str, int]]],
+    slow_ms: float,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Groups slow pipeline shapes and recommends compound indexes ranked by the time they cost.
+
+    Args:
+        profiles (List[Dict[str, Any]]): Documents recorded by `QueryProfiler`.
+        existing_indexes (List[List[Tuple[str, int]]]): Key lists of the indexes already on the collection.
+        slow_ms (float): Average latency above which a shape counts as slow.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: `recommendations` for new indexes, `unindexable` slow shapes
+        and `index_usage` describing how much traffic each existing index serves.
+    """
+    recommendations: Dict[Tuple[Tuple[str, int], ...], Dict[str, Any]] = {}
+    unindexable = []
+    index_usage: Dict[str, Dict[str, Any]] = {}
+
+    for profile in profiles:
+        count = profile.get("count", 0) or 1
+        total_latency = profile.get("totalLatencyMs", 0.0)
+        explain = profile.get("lastExplain") or {}
+        for index_name in explain.get("indexes", []):
+            usage = index_usage.setdefault(
+                index_name, {"index": index_name, "executions": 0, "totalLatencyMs": 0.0}
+            )
+            usage["executions"] += count
+            usage["totalLatencyMs"] += total_latency
+
+        slow = total_latency / count > slow_ms or explain.get("collscan", False)
+        if not slow:
+            continue
+        shape = json.loads(profile["shape"])
+        keys = recommend_index(shape)
+        if keys is None:
+            unindexable.append(
+                {"shape_hash": profile["_id"], "executions": count, "totalLatencyMs": total_latency}
+            )
+            continue
+        if _is_covered(keys, existing_indexes):
+            continue
+        entry = recommendations.setdefault(
+            tuple(keys),
+            {"keys": keys, "shapes": [], "executions": 0, "totalLatencyMs": 0.0},
+        )
+        entry["shapes"].append(profile["_id"])
+        entry["executions"] += count
+        entry["totalLatencyMs"] += total_latency
+
+    return {
+        "recommendations": sorted(
+            recommendations.values(), key=lambda r: r["totalLatencyMs"], reverse=True
+        ),
+        "unindexable": sorted(unindexable, key=lambda r: r["totalLatencyMs"], reverse=True),
+        "index_usage": sorted(
+            index_usage.values(), key=lambda r: r["totalLatencyMs"], reverse=True
+        ),
+    }
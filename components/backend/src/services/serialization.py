@@ -0,0 +1,29 @@
+from decimal import Decimal
+from typing import Any
+import orjson
+from bson import Decimal128, ObjectId
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def bson_default(value: Any) -> Any:
+    """
+    Converts the BSON and Python values orjson does not serialize natively: ObjectIds as their
+    hex string, decimals as floats.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes to JSON with orjson, datetimes as ISO 8601 strings and NaN as null.
+    """
+    return orjson.dumps(content, default=bson_default, option=OPTIONS)
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so that trivially different spellings of it share a key.
+    """
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+def pipeline_hash(pipeline: Any) -> str:
+    """
+    Returns a stable hash of an aggregation pipeline, literal values included.
+    """
+    canonical = json.dumps(pipeline, sort_keys=True, default=repr)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key into one in-flight computation.
+
+    The first caller of a key runs the computation, callers arriving while it is in flight wait
+    for its result, or its exception, instead of starting their own. If the caller running the
+    computation is cancelled, a waiting caller runs it instead. Nothing is cached once the
+    computation finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        :param key: Identifies the computation.
+        :param fn: Starts the computation, only called when none is in flight for the key.
+        :return: The result and whether it was shared from another caller's computation.
+        """
+        while (future := self._calls.get(key)) is not None:
+            logger.info(f"Joining the in-flight computation {key}")
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # The follower was cancelled itself, rather than the caller running the computation.
+                if not future.cancelled():
+                    raise
+                logger.info(f"The in-flight computation {key} was cancelled, retrying")
+
+        future = asyncio.get_running_loop().create_future()
+        # Retrieve the exception when no follower did, to avoid "never retrieved" warnings.
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
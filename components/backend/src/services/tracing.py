@@ -0,0 +1,245 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from uuid import UUID, uuid4
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Histogram
+from services.instrumentation import token_usage
+
+
+# Structured events, one JSON object per line, emitted for the sampled traces only.
+events_logger = logging.getLogger("assistant.events")
+
+SPAN_SECONDS = Histogram(
+    "assistant_span_duration_seconds",
+    "Duration of the traced operations.",
+    ["kind", "name", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_TOKENS = Counter(
+    "assistant_llm_tokens_total", "Tokens used by the LLM calls.", ["node", "type"]
+)
+MONGO_ROWS = Histogram(
+    "assistant_mongo_result_rows",
+    "Rows returned by the MongoDB aggregations.",
+    buckets=(0, 1, 10, 100, 1000, 10000),
+)
+CACHE_LOOKUPS = Counter(
+    "assistant_cache_lookups_total",
+    "Lookups of the caches and shared computations.",
+    ["cache", "result"],
+)
+
+_sample_rate = 0.1
+
+
+def configure(sample_rate: float) -> None:
+    """
+    Sets the fraction of traces whose spans are emitted as structured events. Metrics are
+    recorded for every span.
+    """
+    global _sample_rate
+    _sample_rate = sample_rate
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    trace_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    span_id: str = field(default_factory=lambda: uuid4().hex[:16])
+    started_at: float = field(default_factory=time.perf_counter)
+    status: str = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def start_span(kind: str, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+    """
+    Starts a span under `parent`, by default the current span. A span without parent starts a
+    trace, sampled at the configured rate.
+    """
+    parent = parent or current_span.get()
+    return Span(
+        kind=kind,
+        name=name,
+        trace_id=parent.trace_id if parent else uuid4().hex,
+        parent_id=parent.span_id if parent else None,
+        sampled=parent.sampled if parent else random.random() < _sample_rate,
+        attributes=attributes,
+    )
+
+
+def end_span(span: Span, error: Optional[BaseException] = None) -> None:
+    """
+    Records the span duration and emits the span as an event if its trace is sampled.
+    """
+    duration = time.perf_counter() - span.started_at
+    if error is not None:
+        span.status = "error"
+        span.attributes.setdefault("error", repr(error))
+    SPAN_SECONDS.labels(span.kind, span.name, span.status).observe(duration)
+    if span.sampled:
+        emit_event(
+            "span",
+            trace_id=span.trace_id,
+            span_id=span.span_id,
+            parent_id=span.parent_id,
+            kind=span.kind,
+            name=span.name,
+            status=span.status,
+            duration_ms=round(duration * 1000, 3),
+            **span.attributes,
+        )
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Traces the enclosed block as the current span.
+    """
+    current = start_span(kind, name, **attributes)
+    token = current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        current_span.reset(token)
+        end_span(current, error)
+
+
+def emit_event(event: str, **fields: Any) -> None:
+    events_logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    Counts a cache lookup and notes it on the current span.
+    """
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+    current = current_span.get()
+    if current is not None:
+        current.attributes[f"{cache}_hit"] = hit
+
+
+class TracingHandler(AsyncCallbackHandler):
+    """
+    Callback handler tracing the graph nodes, LLM calls and tool calls of the runs it is attached
+    to, e.g. `RunnableBinding(bound=graph, config={"callbacks": [TracingHandler(nodes)]})`, under
+    the current span.
+    """
+
+    def __init__(self, nodes: Iterable[str]):
+        """
+        :param nodes: Names of the graph nodes to trace.
+        """
+        self.nodes = set(nodes)
+        self._spans: Dict[UUID, Span] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _parent(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return self._spans[parent_run_id]
+            parent_run_id = self._parents.get(parent_run_id)
+        return current_span.get()
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: Optional[UUID], **attributes):
+        self._parents[run_id] = parent_run_id
+        self._spans[run_id] = start_span(kind, name, self._parent(parent_run_id), **attributes)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            end_span(span, error)
+        return span
+
+    async def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name")
+        if name in self.nodes and (metadata or {}).get("langgraph_node") == name:
+            self._start("node", name, run_id, parent_run_id)
+        else:
+            self._parents[run_id] = parent_run_id
+
+    async def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        invocation_params = kwargs.get("invocation_params") or {}
+        self._start(
+            "llm",
+            (metadata or {}).get("langgraph_node", "llm"),
+            run_id,
+            parent_run_id,
+            model=invocation_params.get("model") or invocation_params.get("model_name"),
+            messages=sum(len(batch) for batch in messages),
+        )
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            input_tokens, output_tokens = token_usage(response)
+            span.set(input_tokens=input_tokens, output_tokens=output_tokens)
+            LLM_TOKENS.labels(span.name, "input").inc(input_tokens)
+            LLM_TOKENS.labels(span.name, "output").inc(output_tokens)
+        self._end(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    async def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or serialized.get("name", "tool")
+        self._start("tool", name, run_id, parent_run_id)
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
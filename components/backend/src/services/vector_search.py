@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+from services.tracing import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    k: int
+    future: asyncio.Future
+
+
+class VectorSearchService:
+    """
+    Nearest-neighbour search over a vector index loaded once, for many concurrent callers.
+
+    Embedding and index search run on a worker thread, never in the event loop. Requests arriving
+    while a batch runs, or within `max_wait_ms` of each other, are embedded together and answered
+    by a single `index.search` call over the matrix of their vectors. Query embeddings are kept
+    in an LRU cache, as the same phrases come back across questions.
+    """
+
+    def __init__(
+        self,
+        index,
+        embed: Callable[[List[str]], Sequence[Sequence[float]]],
+        max_batch_size: int = 256,
+        max_wait_ms: float = 2.0,
+        cache_size: int = 4096,
+    ):
+        """
+        :param index: A FAISS index, or any object with its `search(matrix, k)` method, of
+            L2-normalized vectors.
+        :param embed: Embeds a batch of texts with the model the index was built with.
+        :param max_batch_size: Texts per batch above which a batch starts without waiting.
+        :param max_wait_ms: Time a request waits for others to join its batch.
+        :param cache_size: Query embeddings kept.
+        """
+        self.index = index
+        self.embed = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.batches = 0
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # One worker: the model and the index are used by one batch at a time, and the requests
+        # arriving meanwhile form the next batch.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-search")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[_Request] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Optional[asyncio.Task] = None
+
+    async def search(self, texts: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: The squared L2 distances and index positions of the `k` nearest vectors of each
+            text, as FAISS returns them, position -1 marking missing neighbours.
+        """
+        if not texts:
+            return np.zeros((0, k), dtype=np.float32), np.zeros((0, k), dtype=np.int64)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Batches do not outlive their event loop, e.g. across `asyncio.run` calls.
+            self._loop, self._pending, self._timer, self._running = loop, [], None, None
+        request = _Request(list(texts), k, loop.create_future())
+        self._pending.append(request)
+        self._schedule()
+        return await request.future
+
+    def _schedule(self):
+        if self._running is not None:
+            return  # The running batch starts the next one when it finishes.
+        if sum(len(request.texts) for request in self._pending) >= self.max_batch_size:
+            self._start()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self.max_wait, self._start)
+
+    def _start(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending or self._running is not None:
+            return
+        batch, size = [], 0
+        while self._pending and size < self.max_batch_size:
+            request = self._pending.pop(0)
+            batch.append(request)
+            size += len(request.texts)
+        self._running = self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[_Request]):
+        texts = [text for request in batch for text in request.texts]
+        try:
+            distances, ids = await self._loop.run_in_executor(
+                self._executor, self._search, texts, max(request.k for request in batch)
+            )
+        except Exception as e:
+            logger.error(f"Vector search failed: {str(e)}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        else:
+            offset = 0
+            for request in batch:
+                end = offset + len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(
+                        (distances[offset:end, : request.k], ids[offset:end, : request.k])
+                    )
+                offset = end
+        finally:
+            self._running = None
+            if self._pending:
+                self._start()
+
+    def _search(self, texts: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        self.batches += 1
+        return self.index.search(self.embed_queries(texts), k)
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds the texts not in the cache in one call and returns the L2-normalized matrix of all
+        their embeddings.
+        """
+        vectors = {}
+        with self._cache_lock:
+            for text in texts:
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    vectors[text] = self._cache[text]
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        for text in texts:
+            record_cache("query_embedding", text not in missing)
+        if missing:
+            embedded = np.asarray(self.embed(missing), dtype=np.float32)
+            embedded /= np.maximum(np.linalg.norm(embedded, axis=1, keepdims=True), 1e-12)
+            with self._cache_lock:
+                for text, vector in zip(missing, embedded):
+                    vectors[text] = vector
+                    self._cache[text] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return np.vstack([vectors[text] for text in texts])
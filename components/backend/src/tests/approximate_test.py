@@ -0,0 +1,104 @@
+import math
+import random
+
+import pytest
+
+from services.approximate import ApproximateExecutor, Stratum, estimate_rows, rewrite_for_sample
+
+TOP_SUPPLIERS = [
+    {"$match": {"fiscalYear": "2013-2014"}},
+    {"$group": {"_id": "$supplierName", "total": {"$sum": "$lineItems.totalPrice"}, "orders": {"$sum": 1}}},
+    {"$sort": {"total": -1}},
+    {"$limit": 5},
+]
+
+
+def test_rewrites_sums_counts_and_top_k_only():
+    sampled = rewrite_for_sample(TOP_SUPPLIERS)
+
+    assert sampled.accumulators == {"total": "sum", "orders": "sum"}
+    assert [next(iter(stage)) for stage in sampled.pipeline] == [
+        "$match", "$group", "$group", "$group", "$addFields", "$sort", "$limit",
+    ]
+    assert sampled.pipeline[1]["$group"]["_id"] == {"o": "$_id", "g": "$supplierName", "s": "$_stratum"}
+    assert sampled.pipeline[4]["$addFields"] == {"total": "$__w_total", "orders": "$__w_orders"}
+
+    assert rewrite_for_sample([{"$count": "orders"}]).drop_id
+    assert rewrite_for_sample([{"$group": {"_id": None, "top": {"$max": "$lineItems.totalPrice"}}}]) is None
+    assert rewrite_for_sample([*TOP_SUPPLIERS[:2], {"$project": {"share": {"$divide": ["$total", 10]}}}]) is None
+
+
+def test_estimates_carry_confidence_interval_margins():
+    sampled = rewrite_for_sample(
+        [{"$group": {"_id": "$departmentName", "total": {"$sum": "$price"}, "average": {"$avg": "$price"}}}]
+    )
+    # Two of the four sampled orders of a 40-order stratum are in the group, priced 2 and 4.
+    row = {
+        "_id": "health",
+        "total": 60.0,
+        "average": 3.0,
+        "__cw_average": 20.0,
+        "__strata": [
+            {
+                "stratum": "2013",
+                "s_total": 6.0,
+                "q_total": 20.0,
+                "s_average": 6.0,
+                "q_average": 20.0,
+                "c_average": 2,
+                "k_average": 2,
+                "x_average": 6.0,
+            }
+        ],
+    }
+
+    [estimate] = estimate_rows([row], sampled, {"2013": Stratum(population=40, sampled=4)})
+
+    # s² = (20 - 36 / 4) / 3 and Var = 40² (1 - 4 / 40) s² / 4.
+    assert estimate["total"] == 60.0
+    assert estimate["total_margin"] == pytest.approx(1.96 * math.sqrt(1600 * 0.9 * (11 / 3) / 4))
+    # Linearized values (2 - 3, 4 - 3) sum to 0 with squares summing to 2.
+    assert estimate["average_margin"] == pytest.approx(1.96 * math.sqrt(1600 * 0.9 * (2 / 3) / 4) / 20)
+
+    [exact] = estimate_rows([row], sampled, {"2013": Stratum(population=4, sampled=4)})
+    assert exact["total_margin"] == 0.0
+
+
+def test_estimates_only_when_asked_unless_automatic():
+    on_request = ApproximateExecutor(mongo_client=None)
+    automatic = ApproximateExecutor(mongo_client=None, mode="auto")
+
+    assert on_request.wants_estimate("Roughly how much did we spend in 2013?")
+    assert not on_request.wants_estimate("How much did we spend in 2013?")
+    assert automatic.wants_estimate("How much did we spend in 2013?")
+    assert not automatic.wants_estimate("What is the exact figure?")
+    with pytest.raises(ValueError):
+        ApproximateExecutor(mongo_client=None, mode="sometimes")
+
+
+def test_intervals_cover_totals_of_orders_with_several_line_items():
+    mongomock = pytest.importorskip("mongomock")
+    rng = random.Random(7)
+    orders = [
+        {"_id": index, "lineItems": [{"totalPrice": rng.uniform(1, 200)} for _ in range(rng.randint(1, 20))]}
+        for index in range(2000)
+    ]
+    true_total = sum(item["totalPrice"] for order in orders for item in order["lineItems"])
+    sampled = rewrite_for_sample(
+        [{"$unwind": "$lineItems"}, {"$group": {"_id": None, "spend": {"$sum": "$lineItems.totalPrice"}}}],
+        weight=len(orders) / 100,
+        stratum={"$literal": "all"},
+    )
+
+    covered = 0
+    for _ in range(40):
+        collection = mongomock.MongoClient().db.sample
+        collection.insert_many(rng.sample(orders, 100))
+        [estimate] = estimate_rows(
+            list(collection.aggregate(sampled.pipeline)), sampled, {"all": Stratum(len(orders), 100)}
+        )
+        assert estimate["spend_margin"] > 0
+        covered += abs(estimate["spend"] - true_total) <= estimate["spend_margin"]
+
+    # A nominal 95% interval, the per line item variance covered none.
+    assert covered >= 32
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from fastapi.testclient import TestClient
@@ -11,6 +12,7 @@ def client():
     Pytest fixture to initialize the FastAPI TestClient.
     This client will be used to make requests to the app in our tests.
     """
+    app.state.question_flight = None
     return TestClient(app)
 
 
@@ -57,4 +59,85 @@ async def test_chat_endpoint(client, mocker):
     mock_standard_response.assert_awaited_once_with(
         payload["user_message"],
         payload["thread_id"]
-    )
\ No newline at end of file
+    )
+
+@pytest.mark.asyncio
+async def test_chat_stream_endpoint(client, mocker):
+    """
+    Tests the /bot/v1/chat/stream endpoint to ensure events are sent as Server-Sent Events.
+    """
+    async def mock_stream_response(self, user_message, thread_id):
+        yield {"event": "node_start", "node": "Analytics_Agent"}
+        yield {"event": "token", "node": "Analytics_Agent", "content": "Hello"}
+        yield {"event": "final", "content": "Hello there"}
+
+    mocker.patch(
+        "services.conversation_service.ConversationService.stream_response",
+        new=mock_stream_response
+    )
+    app.state.graph = "mocked_graph"
+
+    payload = {
+        "user_message": "Hi there!",
+        "thread_id": "test-thread-123"
+    }
+
+    response = client.post("/bot/v1/chat/stream", json=payload)
+    assert response.status_code == 200, f"Expected status 200, got {response.status_code}"
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block for block in response.text.split("\n\n") if block]
+    assert [block.splitlines()[0] for block in events] == [
+        "event: node_start",
+        "event: token",
+        "event: final",
+    ], "Events are not streamed in order"
+    assert '"content":"Hello there"' in events[-1]
+    assert '"thread_id":"test-thread-123"' in events[0]
+
+
+@pytest.mark.asyncio
+async def test_chat_batch_endpoint(client, mocker):
+    """
+    Tests the /bot/v1/chat/batch endpoint to ensure results keep the request order, failures are
+    reported per item and messages of the same thread run one after another.
+    """
+    calls = []
+
+    async def mock_standard_response(self, user_message, thread_id):
+        calls.append(("start", user_message))
+        await asyncio.sleep(0.05 if user_message == "slow" else 0)
+        calls.append(("end", user_message))
+        if user_message == "boom":
+            raise RuntimeError("LLM unavailable")
+        return f"answer to {user_message}"
+
+    mocker.patch(
+        "services.conversation_service.ConversationService.standard_response",
+        new=mock_standard_response
+    )
+    app.state.graph = "mocked_graph"
+
+    payload = {
+        "conversations": [
+            {"user_message": "slow", "thread_id": "thread-1"},
+            {"user_message": "follow-up", "thread_id": "thread-1"},
+            {"user_message": "boom", "thread_id": "thread-2"},
+            {"user_message": "fast", "thread_id": "thread-3"},
+        ]
+    }
+
+    response = client.post("/bot/v1/chat/batch", json=payload)
+    assert response.status_code == 200, f"Expected status 200, got {response.status_code}"
+    results = response.json()["results"]
+
+    assert [result["thread_id"] for result in results] == [
+        "thread-1", "thread-1", "thread-2", "thread-3"
+    ], "Results are not in request order"
+    assert results[0]["bot_response"] == "answer to slow"
+    assert results[2]["bot_response"] is None and results[2]["error"] == "LLM unavailable"
+    assert all(result["latency_ms"] >= 0 for result in results)
+    assert calls.index(("start", "follow-up")) > calls.index(("end", "slow")), \
+        "Messages of the same thread must run sequentially"
+    assert calls.index(("end", "fast")) < calls.index(("end", "slow")), \
+        "Independent threads must run concurrently"
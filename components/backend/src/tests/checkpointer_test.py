@@ -0,0 +1,163 @@
+import datetime
+from typing import Annotated, TypedDict
+
+import pytest
+from bson import Decimal128, ObjectId
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph, add_messages
+
+from config import Checkpointer
+from graph.checkpointer import CompactSerializer, MongoCheckpointSaver, create_checkpointer
+
+
+def test_compact_serializer_encodes_query_results_as_bson():
+    serializer = CompactSerializer(compress_threshold=10_000)
+    rows = [
+        {
+            "_id": ObjectId(),
+            "creationDate": datetime.datetime(2013, 1, 1),
+            "total": Decimal128("12.50"),
+        }
+    ]
+
+    type_, data = serializer.dumps_typed(rows)
+
+    assert type_ == "bson"
+    assert serializer.loads_typed((type_, data)) == rows
+
+
+def test_compact_serializer_compresses_large_payloads():
+    serializer = CompactSerializer(compress_threshold=1024)
+    messages = [HumanMessage(content="Hi"), AIMessage(content="spend " * 1000)]
+
+    type_, data = serializer.dumps_typed(messages)
+
+    assert type_.endswith("+zlib"), "Large payloads should be compressed"
+    assert len(data) < 1024
+    assert serializer.loads_typed((type_, data)) == messages
+
+    small_type, _ = serializer.dumps_typed({"current_route": "Analytics_Agent"})
+    assert not small_type.endswith("+zlib"), "Small payloads should not be compressed"
+
+
+def test_compact_serializer_encodes_bson_values_without_pickle():
+    serializer = CompactSerializer()
+    row = {"_id": ObjectId(), "total": Decimal128("12.50"), "creationDate": datetime.datetime(2013, 1, 1)}
+    metadata = {
+        "writes": {"Execution_Agent": {"query_result": [row], "messages": [AIMessage(content="Done")]}}
+    }
+
+    type_, data = serializer.dumps_typed(metadata)
+
+    assert type_ == "bson+msgpack"
+    assert serializer.loads_typed((type_, data)) == metadata
+    with pytest.raises(NotImplementedError):
+        serializer.loads_typed(("pickle", data))
+
+
+@pytest.mark.asyncio
+async def test_memory_checkpointer_refuses_several_workers():
+    settings = Checkpointer(CHECKPOINTER_BACKEND="memory")
+
+    assert isinstance(await create_checkpointer(settings, db=None), MemorySaver)
+    with pytest.raises(ValueError, match="2 workers"):
+        await create_checkpointer(settings, db=None, workers=2)
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime.datetime.now(datetime.timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+
+def build_graph(checkpointer):
+    class State(TypedDict):
+        messages: Annotated[list, add_messages]
+        query_result: list
+        topic: str
+
+    async def answer(state: State):
+        question = state["messages"][-1].content
+        update = {"messages": [AIMessage(content=f"Answer to {question}")]}
+        if "spend" in question:
+            update["query_result"] = [{"_id": ObjectId(), "spend": Decimal128("12.50")}]
+        return update
+
+    builder = StateGraph(State)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+async def create_saver():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    saver = MongoCheckpointSaver(
+        mongomock_motor.AsyncMongoMockClient()["test"], ttl_seconds=3600, max_checkpoints_per_thread=2
+    )
+    saver._now = Clock()
+    await saver.setup()
+    return saver
+
+
+@pytest.mark.asyncio
+async def test_mongo_saver_restores_the_latest_state():
+    saver = await create_saver()
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+
+    await graph.ainvoke({"messages": [HumanMessage(content="spend in 2013")], "topic": "spend"}, config)
+    await graph.ainvoke({"messages": [HumanMessage(content="thanks")]}, config)
+
+    latest = await saver.aget_tuple(config)
+    values = latest.checkpoint["channel_values"]
+    assert [message.content for message in values["messages"]] == [
+        "spend in 2013",
+        "Answer to spend in 2013",
+        "thanks",
+        "Answer to thanks",
+    ]
+    assert values["query_result"][0]["spend"] == Decimal128("12.50") and values["topic"] == "spend"
+    assert (await saver.aget_tuple({"configurable": {"thread_id": "thread-2"}})) is None
+
+
+@pytest.mark.asyncio
+async def test_mongo_saver_prunes_checkpoints_and_unreferenced_blobs():
+    saver = await create_saver()
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+
+    for question in ("spend in 2013", "spend in 2014", "thanks"):
+        await graph.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+
+    checkpoints = [doc async for doc in saver.checkpoints.find({"thread_id": "thread-1"})]
+    assert len(checkpoints) == 2
+    referenced = {tuple(pair) for doc in checkpoints for pair in doc["channel_versions"]}
+    blobs = {(blob["channel"], blob["version"]) async for blob in saver.blobs.find({"thread_id": "thread-1"})}
+    assert blobs == referenced
+    kept_ids = {doc["checkpoint_id"] for doc in checkpoints}
+    assert {write["checkpoint_id"] async for write in saver.writes.find({})} <= kept_ids
+
+
+@pytest.mark.asyncio
+async def test_mongo_saver_keeps_referenced_blobs_alive():
+    saver = await create_saver()
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    assert (await saver.blobs.index_information())["updatedAt_ttl"]["expireAfterSeconds"] == 3600
+
+    saver._now.now -= datetime.timedelta(minutes=50)
+    await graph.ainvoke({"messages": [HumanMessage(content="spend in 2013")], "topic": "spend"}, config)
+    saver._now.now += datetime.timedelta(minutes=50)
+    await graph.ainvoke({"messages": [HumanMessage(content="thanks")]}, config)
+
+    # The topic and query results did not change in the second turn, but expire with the thread.
+    latest = await saver.checkpoints.find_one({"thread_id": "thread-1"}, sort=[("checkpoint_id", -1)])
+    channels = {channel for channel, _ in latest["channel_versions"]}
+    assert {"topic", "query_result"} <= channels
+    for channel, version in latest["channel_versions"]:
+        blob = await saver.blobs.find_one({"thread_id": "thread-1", "channel": channel, "version": version})
+        assert blob["updatedAt"] == latest["updatedAt"], channel
@@ -0,0 +1,64 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from services.columnar_engine import ColumnarEngine
+
+LINE_ITEMS = pd.DataFrame(
+    {
+        "creationDate": pd.to_datetime(["2013-01-15", "2013-02-03", "2013-02-20", "2014-07-01", "2014-07-09"]),
+        "departmentName": ["health", "health", "corrections", None, "corrections"],
+        "supplierName": ["office depot inc", "grainger", "office depot inc", "grainger", "grainger"],
+        "lineItems.quantity": [2.0, 1.0, 10.0, 3.0, 1.0],
+        "lineItems.unitPrice": [5.0, 100.0, 2.5, 10.0, 40.0],
+        "lineItems.totalPrice": [10.0, 100.0, 25.0, 30.0, 40.0],
+    }
+)
+
+
+@pytest.fixture
+def engine():
+    return ColumnarEngine(LINE_ITEMS)
+
+
+def test_groups_sorts_and_limits(engine):
+    results = engine.aggregate(
+        [
+            {"$match": {"creationDate": {"$gte": datetime.datetime(2013, 1, 1), "$lt": datetime.datetime(2014, 1, 1)}}},
+            {"$unwind": "$lineItems"},
+            {"$group": {"_id": "$supplierName", "spend": {"$sum": "$lineItems.totalPrice"}, "orders": {"$sum": 1}}},
+            {"$sort": {"spend": -1}},
+            {"$limit": 1},
+        ]
+    )
+
+    assert results == [{"_id": "grainger", "spend": 100.0, "orders": 1}]
+
+
+def test_filters_and_groups_by_date_parts(engine):
+    results = engine.aggregate(
+        [
+            {"$match": {"supplierName": {"$regex": "GRAIN", "$options": "i"}, "departmentName": {"$ne": "health"}}},
+            {"$unwind": "$lineItems"},
+            {
+                "$group": {
+                    "_id": {"year": {"$year": "$creationDate"}, "month": {"$month": "$creationDate"}},
+                    "average": {"$avg": {"$multiply": ["$lineItems.quantity", "$lineItems.unitPrice"]}},
+                    "largest": {"$max": "$lineItems.totalPrice"},
+                }
+            },
+        ]
+    )
+
+    # The order without a department matches `$ne`, as in MongoDB.
+    assert results == [{"_id": {"year": 2014, "month": 7}, "average": 35.0, "largest": 40.0}]
+    assert engine.aggregate([{"$match": {"departmentName": None}}, {"$count": "orders"}]) == [{"orders": 1}]
+
+
+def test_unsupported_pipelines_fall_back(engine):
+    # Stages, operators and fields outside the snapshot, and line items fields before `$unwind`.
+    assert engine.aggregate([{"$match": {"supplierName": "grainger"}}, {"$limit": 5}]) is None
+    assert engine.aggregate([{"$lookup": {"from": "suppliers"}}]) is None
+    assert engine.aggregate([{"$group": {"_id": "$calCardUsed", "n": {"$sum": 1}}}]) is None
+    assert engine.aggregate([{"$group": {"_id": None, "spend": {"$sum": "$lineItems.totalPrice"}}}]) is None
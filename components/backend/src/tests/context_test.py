@@ -0,0 +1,65 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from graph.context import ConversationContext, estimate_tokens
+
+
+def exchange(index: int):
+    return [
+        HumanMessage(content=f"question {index}", name="User"),
+        AIMessage(
+            content="",
+            name="Analytics_Agent",
+            tool_calls=[{"name": "write_query_tool", "args": {"user_query": f"q{index}"}, "id": f"call-{index}"}],
+        ),
+        ToolMessage(content="MongoDB query has been generated successfully.", tool_call_id=f"call-{index}"),
+        AIMessage(content="The generated query is valid.", name="Validation_Agent"),
+        AIMessage(content=f"raw results {index}", name="Execution_Agent"),
+        AIMessage(content=f"answer {index}", name="Analytics_Agent"),
+    ]
+
+
+def test_context_keeps_recent_exchanges_and_summarizes_older_ones():
+    history = [message for index in range(5) for message in exchange(index)]
+    current = [HumanMessage(content="question 5", name="User")]
+    context = ConversationContext(max_exchanges=2, max_tokens=10_000)
+
+    messages, token_count, updates = context.build("system", {"messages": history + current})
+
+    assert isinstance(messages[0], SystemMessage) and messages[0].content == "system"
+    assert "question 0" in messages[1].content and "answer 2" in messages[1].content
+    assert [message.content for message in messages[2:]] == [
+        "question 3",
+        "answer 3",
+        "question 4",
+        "answer 4",
+        "question 5",
+    ], "Recent exchanges should be reduced to question and final answer"
+    assert updates["summarized_exchanges"] == 3
+    assert token_count == estimate_tokens(messages)
+
+
+def test_context_reuses_cached_summary_and_keeps_current_exchange_intact():
+    history = [message for index in range(3) for message in exchange(index)]
+    current = exchange(3)[:3]
+    context = ConversationContext(max_exchanges=1, max_tokens=10_000)
+    state = {
+        "messages": history + current,
+        "context_summary": "- cached summary",
+        "summarized_exchanges": 1,
+    }
+
+    messages, _, updates = context.build("system", state)
+
+    assert updates["context_summary"].startswith("- cached summary\n- User: question 1")
+    assert updates["summarized_exchanges"] == 2
+    assert messages[-3:] == current, "The exchange in progress must be sent in full"
+
+
+def test_context_drops_recent_exchanges_over_the_token_budget():
+    history = [message for index in range(3) for message in exchange(index)]
+    current = [HumanMessage(content="question 3", name="User")]
+    context = ConversationContext(max_exchanges=3, max_tokens=20)
+
+    messages, _, _ = context.build("system", {"messages": history + current})
+
+    assert [message.content for message in messages[1:]] == ["question 3"]
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from graph.entity_resolver import EntityResolver, candidate_mentions
+from graph.text_index import embed_text
+from services.vector_search import VectorSearchService
+
+
+class FlatIndex:
+    """
+    The part of a FAISS `IndexFlatL2` used by the resolver.
+    """
+
+    def __init__(self, vectors):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+
+    def search(self, queries, k):
+        distances = ((queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=2)
+        ids = np.argsort(distances, axis=1)[:, :k]
+        return np.take_along_axis(distances, ids, axis=1), ids
+
+
+def embed(texts):
+    return [embed_text(text) for text in texts]
+
+
+ENTRIES = [
+    ("supplierName", "office depot inc"),
+    ("supplierName", "grainger"),
+    ("departmentName", "corrections and rehabilitation, department of"),
+    ("lineItems.itemName", "office chairs"),
+    ("lineItems.itemName", "paper"),
+]
+
+
+def test_candidate_mentions_skip_dates_and_field_words():
+    phrases = [text for _, _, text in candidate_mentions("Spend with ofice depot in Q1 2013 per department")]
+
+    assert "ofice depot" in phrases
+    assert all("2013" not in phrase and "department" not in phrase for phrase in phrases)
+
+
+@pytest.mark.asyncio
+async def test_resolves_misspelled_and_partial_names():
+    search = VectorSearchService(FlatIndex(embed([value for _, value in ENTRIES])), embed)
+    resolver = EntityResolver(search, ENTRIES, min_score=0.6)
+
+    entities = await resolver.resolve("How much did we spend with ofice depot inc on office chair in 2014?")
+
+    assert [(entity.field, entity.value) for entity in entities] == [
+        ("supplierName", "office depot inc"),
+        ("lineItems.itemName", "office chairs"),
+    ]
+    assert await resolver.resolve("Total spending in 2013") == []
+    assert '"office chair" is lineItems.itemName "office chairs"' in EntityResolver.describe(entities)
+
+
+class StubSearch:
+    """
+    Returns the same neighbours, nearest first, for every query.
+    """
+
+    def __init__(self, distances, ids):
+        self.distances = distances
+        self.ids = ids
+
+    async def search(self, texts, k):
+        return [self.distances[:k]] * len(texts), [self.ids[:k]] * len(texts)
+
+
+@pytest.mark.asyncio
+async def test_exact_match_wins_over_nearer_neighbours():
+    entries = [
+        ("notes", "grainger"),
+        ("supplierName", "Office Depot Inc"),
+        ("supplierName", "Grainger"),
+    ]
+    resolver = EntityResolver(StubSearch([0.0, 0.3, 0.35], [0, 1, 2]), entries)
+
+    entities = await resolver.resolve("Spend with Grainger")
+
+    assert [(entity.field, entity.value, entity.score) for entity in entities] == [
+        ("supplierName", "Grainger", 1.0)
+    ]
@@ -0,0 +1,72 @@
+import copy
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from evaluation import check_regressions, run_evaluation, summarize
+from graph.fake_llm import FakeChatModel
+from graph.graph_state import ANALYTICS_AGENT, AgentState
+from services.instrumentation import record_mongo_query
+
+
+@pytest.mark.asyncio
+async def test_runs_are_isolated_and_measured():
+    model = FakeChatModel()
+
+    async def analytics_agent(state: AgentState):
+        # Each run must start from a new thread holding only its own question.
+        assert len(state["messages"]) == 1
+        answer = await model.ainvoke(state["messages"])
+        record_mongo_query(5.0)
+        question = state["messages"][-1].content
+        return {
+            "messages": [AIMessage(content=answer.content, name=ANALYTICS_AGENT)],
+            "query_result": [{"total_orders": 11 if "2013" in question else 0}],
+        }
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_edge(ANALYTICS_AGENT, END)
+    graph = builder.compile(checkpointer=MemorySaver())
+
+    questions = {
+        "Total orders in 2013": [{"total_orders": 11}],
+        "Total orders in 2014": [{"total_orders": 5}],
+        "Hello": None,
+    }
+    runs = await run_evaluation(graph, questions, repeats=3, concurrency=2)
+    assert len(runs) == 9 and not any(run["error"] for run in runs)
+    assert all(run["llm_calls"] == 1 and run["input_tokens"] > 0 for run in runs)
+    assert all(run["mongo_queries"] == 1 and run["mongo_ms"] == 5.0 for run in runs)
+
+    report = summarize(runs)
+    assert report["Total orders in 2013"]["accuracy"] == 1.0
+    assert report["Total orders in 2014"]["accuracy"] == 0.0
+    assert report["Hello"]["accuracy"] is None
+    assert report["Hello"]["runs"] == 3 and report["Hello"]["llm_calls"] == 1
+
+
+def test_regression_gate():
+    baseline = {
+        "q": {
+            "accuracy": 1.0,
+            "errors": 0,
+            "wall_ms": {"p50": 1000.0},
+            "llm_calls": 4,
+            "input_tokens": 2000,
+            "output_tokens": 100,
+        }
+    }
+    current = copy.deepcopy(baseline)
+    current["q"]["wall_ms"]["p50"] = 1100.0
+    assert check_regressions(current, baseline) == []
+
+    current["q"]["wall_ms"]["p50"] = 1500.0
+    current["q"]["llm_calls"] = 6
+    current["q"]["accuracy"] = 0.5
+    regressions = check_regressions(current, baseline)
+    assert len(regressions) == 3
+    assert any("p50 wall time" in regression for regression in regressions)
@@ -0,0 +1,58 @@
+import datetime
+import json
+
+import pytest
+from bson import ObjectId
+
+from services.export import encode_batches
+
+BATCHES = [
+    [
+        {"_id": {"year": 2013, "supplier": "grainger"}, "spend": 1250.5, "first": datetime.datetime(2013, 2, 1)},
+        {"_id": {"year": 2013, "supplier": "office depot, inc"}, "spend": 80, "first": None},
+    ],
+    [{"_id": {"year": 2014, "supplier": "grainger"}, "spend": 10.0, "first": datetime.datetime(2014, 1, 3)}],
+]
+
+
+async def batches(items=BATCHES):
+    for batch in items:
+        yield batch
+
+
+async def encode(export_format, items=BATCHES):
+    return [chunk async for chunk in encode_batches(batches(items), export_format)]
+
+
+@pytest.mark.asyncio
+async def test_csv_writes_one_chunk_per_batch_with_a_single_header():
+    chunks = await encode("csv")
+
+    assert len(chunks) == 2
+    assert b"".join(chunks).decode().splitlines() == [
+        "year,supplier,spend,first",
+        "2013,grainger,1250.5,2013-02-01T00:00:00",
+        '2013,"office depot, inc",80,',
+        "2014,grainger,10.0,2014-01-03T00:00:00",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_keeps_documents_and_bson_values():
+    object_id = ObjectId()
+    chunks = await encode("ndjson", [[{"_id": object_id, "creationDate": datetime.datetime(2013, 2, 1)}]])
+
+    assert [json.loads(line) for line in b"".join(chunks).decode().splitlines()] == [
+        {"_id": str(object_id), "creationDate": "2013-02-01T00:00:00"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_arrow_streams_record_batches():
+    pa = pytest.importorskip("pyarrow")
+
+    table = pa.ipc.open_stream(b"".join(await encode("arrow"))).read_all()
+
+    assert table.column_names == ["year", "supplier", "spend", "first"]
+    assert table.column("spend").to_pylist() == [1250.5, 80.0, 10.0]
+    assert table.num_rows == 3
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from graph.agents.analytics_agent import MongoSchema, write_query_tool
+from graph.agents.greeting_agent import redirect_tool
+from graph.agents.validation_agent import QueryValidation
+from graph.fake_llm import DEFAULT_PIPELINE, FakeChatModel
+from graph.graph_state import ANALYTICS_AGENT, EXECUTION_AGENT, GREETING_AGENT, AgentState
+from services.instrumentation import NodeTimer, percentile
+
+
+@pytest.mark.asyncio
+async def test_fake_model_answers_each_agent(tmp_path):
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps({"pipelines": {"Orders by supplier?": "[{'$limit': 1}]"}}))
+    model = FakeChatModel.from_script(str(script))
+
+    greeting = model.bind_tools([redirect_tool])
+    redirect = await greeting.ainvoke([HumanMessage(content="How many orders in 2013?")])
+    assert redirect.tool_calls[0]["args"] == {"next_agent": ANALYTICS_AGENT}
+    hello = await greeting.ainvoke([HumanMessage(content="Hi there")])
+    assert hello.content and not hello.tool_calls
+
+    analytics = model.bind_tools([write_query_tool])
+    question = HumanMessage(content="How many orders in 2013?")
+    call = await analytics.ainvoke([question])
+    assert call.tool_calls[0]["args"] == {"user_query": "How many orders in 2013?"}
+    execution = AIMessage(content="The query results are as follows: 11", name=EXECUTION_AGENT)
+    answer = await analytics.ainvoke([question, call, execution])
+    assert "11" in answer.content and not answer.tool_calls
+
+    writer = model.with_structured_output(MongoSchema)
+    scripted = await writer.ainvoke([HumanMessage(content="Input: orders by  supplier")])
+    assert scripted.mongodb_query == "[{'$limit': 1}]"
+    unknown = await writer.ainvoke([HumanMessage(content="Input: something unusual")])
+    assert unknown.mongodb_query == DEFAULT_PIPELINE
+
+    validation = await model.with_structured_output(QueryValidation).ainvoke("Validate it")
+    assert validation.is_valid
+
+
+@pytest.mark.asyncio
+async def test_node_timer_times_graph_nodes():
+    async def greeting_agent(state: AgentState):
+        return {"messages": [AIMessage(content="Hello!", name=GREETING_AGENT)]}
+
+    builder = StateGraph(AgentState)
+    builder.add_node(GREETING_AGENT, greeting_agent)
+    builder.add_edge(START, GREETING_AGENT)
+    builder.add_edge(GREETING_AGENT, END)
+    timer = NodeTimer([GREETING_AGENT])
+    graph = builder.compile(checkpointer=MemorySaver()).with_config(callbacks=[timer])
+
+    for thread_id in ("thread-1", "thread-2"):
+        await graph.ainvoke(
+            {"messages": [HumanMessage(content="Hi")]}, {"configurable": {"thread_id": thread_id}}
+        )
+
+    summary = timer.summary()
+    assert list(summary) == [GREETING_AGENT]
+    assert summary[GREETING_AGENT]["count"] == 2 and summary[GREETING_AGENT]["errors"] == 0
+    assert percentile([5, 1, 4, 2, 3], 50) == 3 and percentile([5, 1, 4, 2, 3], 99) == 5
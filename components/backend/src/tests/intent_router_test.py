@@ -0,0 +1,39 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from graph.graph_routes import intent_routing
+from graph.graph_state import ANALYTICS_AGENT, GREETING_AGENT
+from graph.intent_router import ANALYTICS, GREETING, OTHER, IntentClassifier, create_intent_router
+
+
+@pytest.mark.parametrize(
+    "message,label",
+    [
+        ("Hello!", GREETING),
+        ("good morning Penny", GREETING),
+        ("How many orders were created in Q1 2013?", ANALYTICS),
+        ("Which supplier got the most money", ANALYTICS),
+        ("tell me about the corrections department", ANALYTICS),
+        ("what can you do?", OTHER),
+    ],
+)
+def test_classifier_labels(message, label):
+    assert IntentClassifier().classify(message).label == label
+
+
+@pytest.mark.asyncio
+async def test_router_answers_greetings_and_routes_questions():
+    router = create_intent_router(IntentClassifier())
+
+    greeting = await router({"messages": [HumanMessage(content="hi there", name="User")]})
+    assert greeting["messages"][0].name == GREETING_AGENT
+    assert intent_routing(greeting) == "__end__"
+
+    question = await router(
+        {"messages": [HumanMessage(content="Total spending in 2014", name="User")]}
+    )
+    assert question["current_route"] == ANALYTICS_AGENT
+    assert intent_routing(question) == ANALYTICS_AGENT
+
+    other = await router({"messages": [HumanMessage(content="who are you?", name="User")]})
+    assert intent_routing(other) == GREETING_AGENT
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from config import LLMGateway as LLMGatewaySettings
+from graph.llm_gateway import LLMGateway, retry_after_seconds
+
+
+def gateway_with(handler, **kwargs) -> LLMGateway:
+    gateway = LLMGateway(requests_per_second=1000, burst=1000, **kwargs)
+    gateway.transport = httpx.MockTransport(handler)
+    return gateway
+
+
+@pytest.mark.asyncio
+async def test_gateway_retries_rate_limited_requests_after_retry_after():
+    responses = [
+        httpx.Response(429, headers={"retry-after-ms": "10"}),
+        httpx.Response(503),
+        httpx.Response(200, json={"ok": True}),
+    ]
+    gateway = gateway_with(lambda request: responses.pop(0), backoff_base_seconds=0.001)
+
+    response = await gateway.client("gpt-4o").post("https://llm.test/chat", json={})
+
+    assert response.json() == {"ok": True}
+    metrics = gateway.metrics()["gpt-4o"]
+    assert metrics["retries"] == 2 and metrics["rate_limited"] == 1
+    assert metrics["requests"] == 1 and metrics["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_gateway_limits_concurrent_requests_per_model():
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    gateway = gateway_with(handler, max_concurrency_per_model=2)
+    client = gateway.client("gpt-4o")
+    await asyncio.gather(*(client.post("https://llm.test/chat", json={}) for _ in range(6)))
+
+    assert peak == 2
+    assert gateway.metrics()["gpt-4o"]["max_queue_wait_ms"] > 0
+
+
+class SlowStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        for chunk in (b"data: 1\n\n", b"data: 2\n\n"):
+            await asyncio.sleep(0.02)
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_gateway_holds_the_slot_until_a_stream_is_closed():
+    gateway = gateway_with(lambda request: httpx.Response(200, stream=SlowStream()), max_concurrency_per_model=1)
+    client = gateway.client("gpt-4o")
+
+    async with client.stream("POST", "https://llm.test/chat", json={}) as response:
+        assert gateway.model_semaphore("gpt-4o").locked()
+        assert gateway.metrics()["gpt-4o"]["in_flight"] == 1
+        chunks = [chunk async for chunk in response.aiter_bytes()]
+
+    assert len(chunks) == 2
+    assert not gateway.model_semaphore("gpt-4o").locked() and not gateway.semaphore.locked()
+    metrics = gateway.metrics()["gpt-4o"]
+    assert metrics["in_flight"] == 0 and metrics["requests"] == 1
+    assert metrics["model_ms"] >= 40, "The model time should cover the whole stream"
+
+
+def test_gateway_splits_limits_between_workers():
+    settings = LLMGatewaySettings(LLM_MAX_CONCURRENCY=16, LLM_REQUESTS_PER_SECOND=5, LLM_BURST=10)
+
+    gateway = LLMGateway.from_settings(settings, workers=4)
+
+    assert gateway.semaphore._value == 4 and gateway.model_semaphore("gpt-4o")._value == 2
+    assert gateway.bucket.rate == 1.25 and gateway.bucket.capacity == 2
+    assert LLMGateway.from_settings(settings, workers=32).semaphore._value == 1
+
+
+def test_retry_after_header_formats():
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(httpx.Response(429)) is None
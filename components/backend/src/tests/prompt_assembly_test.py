@@ -0,0 +1,31 @@
+from graph.config_llm import ConfigLLM
+from graph.prompt_assembly import create_prompt_assembler
+from graph.text_index import LocalTextIndex
+
+
+def test_local_text_index_tolerates_plurals():
+    index = LocalTextIndex([("supplier name", "supplier"), ("department name", "department")])
+    [(score, payload)] = index.search("which suppliers", 1)
+    assert payload == "supplier" and score > 0
+
+
+def test_assembler_selects_relevant_examples_and_fields():
+    assembler = create_prompt_assembler(examples_k=2, sections_k=4)
+
+    examples = assembler.select_examples("Top suppliers by total spending in 2015")
+    assert len(examples) == 2
+    assert examples[0] is ConfigLLM.FEW_SHOT_EXAMPLE_6
+
+    fields = assembler.select_fields("Which suppliers received the most money?")
+    assert "supplierName" in fields and "creationDate" in fields
+    assert len(fields) < len(ConfigLLM.ORDER_FIELD_DESCRIPTIONS)
+
+    rendered = assembler.few_shot_examples("Top suppliers by total spending in 2015")
+    assert "datetime.datetime(2014, 1, 1, 0, 0)" in rendered
+
+
+def test_assembler_includes_fields_referenced_by_a_pipeline():
+    assembler = create_prompt_assembler()
+    fields = assembler.select_fields("", "[{'$group': {'_id': '$lineItems.commodityTitle'}}]")
+    assert "lineItems.commodityTitle" in fields
+    assert "lineItems.commodityTitleUUID" not in fields
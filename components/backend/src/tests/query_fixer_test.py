@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from graph.graph_state import ANALYTICS_AGENT, EXECUTION_AGENT, VALIDATION_AGENT
+from graph.query_fixer import QueryFixer, create_query_fixer
+from graph.utils import eval_mongodb_query
+
+
+def test_fixes_field_paths_dates_and_unwind():
+    pipeline = [
+        {"$match": {"creationdate": {"$gte": "2013-01-01"}, "itemName": "paper"}},
+        {"$group": {"_id": "$suplierName", "total": {"$sum": "$lineItems.totalPrice"}}},
+        {"$sort": {"total": -1}},
+        {"$project": {"month": {"$dateToString": {"format": "%Y-%m", "date": "$creationDate"}}}},
+    ]
+
+    fixed, fixes = QueryFixer().fix(pipeline)
+
+    assert fixed == [
+        {
+            "$match": {
+                "creationDate": {"$gte": datetime.datetime(2013, 1, 1)},
+                "lineItems.itemName": "paper",
+            }
+        },
+        {"$unwind": "$lineItems"},
+        {"$group": {"_id": "$supplierName", "total": {"$sum": "$lineItems.totalPrice"}}},
+        {"$sort": {"total": -1}},
+        {"$project": {"month": {"$dateToString": {"format": "%Y-%m", "date": "$creationDate"}}}},
+    ]
+    assert len(fixes) == 5
+
+
+def test_leaves_valid_pipelines_alone():
+    pipeline = [
+        {"$match": {"creationDate": {"$gte": datetime.datetime(2013, 1, 1)}}},
+        {"$unwind": "$lineItems"},
+        {"$group": {"_id": "$lineItems.itemName", "order_count": {"$sum": 1}}},
+        {"$sort": {"order_count": -1}},
+        {"$limit": 3},
+    ]
+
+    assert QueryFixer().fix(pipeline) == (pipeline, [])
+
+
+def test_unwinds_only_for_line_item_keys():
+    per_order = [
+        {"$project": {"total": {"$sum": "$lineItems.totalPrice"}}},
+        {
+            "$group": {
+                "_id": None,
+                "items": {"$push": "$lineItems.itemName"},
+                "total": {"$sum": {"$sum": "$lineItems.totalPrice"}},
+            }
+        },
+    ]
+    sorted_items = [{"$sort": {"lineItems.totalPrice": -1}}, {"$limit": 5}]
+
+    assert QueryFixer().fix(per_order) == (per_order, [])
+    assert QueryFixer().fix(sorted_items)[0] == [{"$unwind": "$lineItems"}] + sorted_items
+
+
+def apply(state, update, **values):
+    messages = state["messages"] + update.get("messages", [])
+    state.update(update, messages=messages, **values)
+
+
+@pytest.mark.asyncio
+async def test_repairs_are_bounded_per_turn():
+    fixer = create_query_fixer(QueryFixer(), max_attempts=2)
+    question = HumanMessage(content="Spending per supplier in 2013", id="turn-1")
+    state = {
+        "messages": [question],
+        "current_route": EXECUTION_AGENT,
+        "generated_query": "[{'$group': {'_id': '$supplier_name', 'total': {'$sum': 1}}}]",
+    }
+
+    update = await fixer(state)
+    assert update["repair_route"] == VALIDATION_AGENT and update["repair_attempts"] == 1
+    assert eval_mongodb_query(update["generated_query"])[0]["$group"]["_id"] == "$supplierName"
+
+    apply(state, update, current_route=VALIDATION_AGENT)
+    update = await fixer(state)
+    assert update["repair_route"] == ANALYTICS_AGENT and update["repair_attempts"] == 2
+
+    apply(state, update)
+    update = await fixer(state)
+    assert update["repair_route"] is None
+    assert isinstance(update["messages"][0], AIMessage)
+
+    # A new question gets a new budget.
+    apply(state, update)
+    state["messages"].append(HumanMessage(content="And in 2014?", id="turn-2"))
+    assert (await fixer(state))["repair_attempts"] == 1
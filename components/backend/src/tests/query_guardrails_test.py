@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import ExecutionTimeout
+
+from services.mognodb_service import MongoDBService
+from services.query_guardrails import (
+    QueryRejectedError,
+    ensure_limit,
+    estimate_docs_examined,
+)
+
+
+class AsyncCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self.docs:
+                yield doc
+
+        return gen()
+
+
+@pytest.fixture
+def mongo_service():
+    """
+    A MongoDBService with guardrails enabled and a mocked orders collection.
+    """
+    service = MongoDBService(
+        host="localhost",
+        port=27017,
+        username="root",
+        password="password",
+        db_name="procurementDB",
+        orders_collection="Orders",
+        max_time_ms=1000,
+        default_limit=50,
+        explain_before_run=True,
+        max_docs_examined=100,
+    )
+    service.orders_collection = MagicMock(name="Orders")
+    service.orders_collection.name = "Orders"
+    service.orders_collection.aggregate.return_value = AsyncCursor([{"total": 1}])
+    service.orders_collection.estimated_document_count = AsyncMock(return_value=500)
+    return service
+
+
+def test_ensure_limit_appends_only_when_missing():
+    pipeline = [{"$match": {"fiscalYear": "2013-2014"}}]
+    assert ensure_limit(pipeline, 10) == pipeline + [{"$limit": 10}]
+    assert pipeline == [{"$match": {"fiscalYear": "2013-2014"}}], "Input pipeline must not be mutated"
+
+    limited = [{"$sort": {"total": -1}}, {"$limit": 3}]
+    assert ensure_limit(limited, 10) == limited
+    for bounded in ([{"$match": {}}, {"$count": "orders"}], [{"$group": {"_id": None, "n": {"$sum": 1}}}]):
+        assert ensure_limit(bounded, 10) == bounded
+
+    # A `$limit` before stages that multiply documents, or above the default, is capped.
+    early = [{"$limit": 5}, {"$unwind": "$lineItems"}, {"$lookup": {"from": "Suppliers"}}]
+    assert ensure_limit(early, 10) == early + [{"$limit": 10}]
+    assert ensure_limit([{"$limit": 100}], 10) == [{"$limit": 100}, {"$limit": 10}]
+
+
+def test_estimate_docs_examined():
+    collscan = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}}]}
+    ixscan = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}
+    assert estimate_docs_examined(collscan, 500) == 500
+    assert estimate_docs_examined(ixscan, 500) == 0
+
+
+@pytest.mark.asyncio
+async def test_aggregate_orders_applies_guardrails(mongo_service):
+    mongo_service.explain_aggregation = AsyncMock(
+        return_value={"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}
+    )
+    result = await mongo_service.aggregate_orders([{"$match": {"departmentName": "x"}}])
+
+    assert result == ([{"total": 1}], False)
+    mongo_service.orders_collection.aggregate.assert_called_once_with(
+        [{"$match": {"departmentName": "x"}}, {"$limit": 51}],
+        allowDiskUse=False,
+        maxTimeMS=1000,
+    )
+
+
+@pytest.mark.asyncio
+async def test_aggregate_orders_reports_results_cut_by_the_default_limit(mongo_service):
+    mongo_service.explain_before_run = False
+    mongo_service.orders_collection.aggregate.return_value = AsyncCursor([{"n": n} for n in range(51)])
+
+    rows, truncated = await mongo_service.aggregate_orders([{"$match": {}}])
+    assert len(rows) == 50 and truncated
+
+    # A pipeline ending with a smaller `$limit` gets all the documents it asked for.
+    mongo_service.orders_collection.aggregate.return_value = AsyncCursor([{"n": n} for n in range(30)])
+    rows, truncated = await mongo_service.aggregate_orders([{"$limit": 30}])
+    assert len(rows) == 30 and not truncated
+    mongo_service.orders_collection.aggregate.assert_called_with([{"$limit": 30}], allowDiskUse=False, maxTimeMS=1000)
+
+    # Earlier limits do not bound the documents returned after `$unwind`.
+    mongo_service.orders_collection.aggregate.return_value = AsyncCursor([{"n": n} for n in range(51)])
+    rows, truncated = await mongo_service.aggregate_orders([{"$limit": 5}, {"$unwind": "$lineItems"}])
+    assert len(rows) == 50 and truncated
+
+
+@pytest.mark.asyncio
+async def test_aggregate_orders_rejects_expensive_pipeline(mongo_service):
+    mongo_service.explain_aggregation = AsyncMock(
+        return_value={"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+    )
+    with pytest.raises(QueryRejectedError, match="selective `\\$match`"):
+        await mongo_service.aggregate_orders([{"$unwind": "$lineItems"}])
+    mongo_service.orders_collection.aggregate.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_aggregate_orders_rejects_write_stages_and_timeouts(mongo_service):
+    mongo_service.explain_before_run = False
+    with pytest.raises(QueryRejectedError):
+        await mongo_service.aggregate_orders([{"$out": "Stolen"}])
+
+    mongo_service.orders_collection.aggregate.side_effect = ExecutionTimeout("timeout")
+    with pytest.raises(QueryRejectedError, match="time limit"):
+        await mongo_service.aggregate_orders([{"$match": {}}])
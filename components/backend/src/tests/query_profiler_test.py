@@ -0,0 +1,97 @@
+import datetime
+import json
+
+from services.query_profiler import (
+    advise_indexes,
+    pipeline_shape,
+    recommend_index,
+    summarize_explain,
+)
+
+
+def test_pipeline_shape_ignores_literal_values():
+    def pipeline(year, department):
+        return [
+            {
+                "$match": {
+                    "departmentName": department,
+                    "creationDate": {
+                        "$gte": datetime.datetime(year, 1, 1),
+                        "$lte": datetime.datetime(year, 12, 31),
+                    },
+                }
+            },
+            {"$group": {"_id": "$supplierName", "total": {"$sum": 1}}},
+            {"$sort": {"total": -1}},
+        ]
+
+    hash_2013, shape = pipeline_shape(pipeline(2013, "corrections"))
+    hash_2014, _ = pipeline_shape(pipeline(2014, "education"))
+
+    assert hash_2013 == hash_2014, "Pipelines differing only in literals must share a shape"
+    assert shape[0]["$match"]["creationDate"]["$gte"] == "?date"
+    assert shape[1]["$group"]["_id"] == "$supplierName"
+    assert shape[2]["$sort"] == {"total": -1}
+
+
+def test_recommend_index_follows_equality_sort_range():
+    _, shape = pipeline_shape(
+        [
+            {
+                "$match": {
+                    "creationDate": {"$gte": datetime.datetime(2013, 1, 1)},
+                    "acquisitionType": "it goods",
+                }
+            },
+            {"$sort": {"purchaseDate": -1}},
+        ]
+    )
+    assert recommend_index(shape) == [
+        ("acquisitionType", 1),
+        ("purchaseDate", -1),
+        ("creationDate", 1),
+    ]
+    assert recommend_index([{"$unwind": "$lineItems"}]) is None
+
+
+def test_summarize_explain_and_advise_indexes():
+    explain = {
+        "stages": [
+            {
+                "$cursor": {
+                    "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+                    "executionStats": {"totalDocsExamined": 900, "nReturned": 10},
+                }
+            }
+        ]
+    }
+    summary = summarize_explain(explain)
+    assert summary["collscan"] is True
+    assert summary["totalDocsExamined"] == 900
+
+    _, shape = pipeline_shape([{"$match": {"departmentName": "x"}}])
+    profiles = [
+        {
+            "_id": "slow",
+            "shape": json.dumps(shape),
+            "count": 4,
+            "totalLatencyMs": 4000.0,
+            "lastExplain": summary,
+        },
+        {
+            "_id": "fast",
+            "shape": json.dumps(shape),
+            "count": 10,
+            "totalLatencyMs": 100.0,
+            "lastExplain": {"indexes": ["_id_"], "collscan": False},
+        },
+    ]
+    report = advise_indexes(profiles, existing_indexes=[[("_id", 1)]], slow_ms=500)
+
+    assert len(report["recommendations"]) == 1
+    assert report["recommendations"][0]["keys"] == [("departmentName", 1)]
+    assert report["recommendations"][0]["shapes"] == ["slow"]
+    assert report["index_usage"][0]["index"] == "_id_"
+
+    covered = advise_indexes(profiles, existing_indexes=[[("departmentName", 1)]], slow_ms=500)
+    assert covered["recommendations"] == []
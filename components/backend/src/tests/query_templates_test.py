@@ -0,0 +1,64 @@
+import datetime
+
+from graph.graph_routes import analytics_routing
+from graph.graph_state import ANALYTICS_AGENT, EXECUTION_AGENT, VALIDATION_AGENT
+from graph.query_templates import match_template, render_pipeline
+from graph.utils import eval_mongodb_query
+
+
+def test_order_count_in_a_quarter():
+    template = match_template("Total number of orders created during Q1 of 2013.")
+    assert template.name == "order_count"
+    assert template.pipeline == [
+        {
+            "$match": {
+                "creationDate": {
+                    "$gte": datetime.datetime(2013, 1, 1),
+                    "$lte": datetime.datetime(2013, 3, 31, 23, 59, 59),
+                }
+            }
+        },
+        {"$count": "total_orders"},
+    ]
+
+
+def test_top_items_and_grouped_spending():
+    items = match_template(
+        "Find the top 3 most frequently ordered line items in 2013, including their order count"
+    )
+    assert items.slots["group_field"] == "lineItems.itemName"
+    assert {"$limit": 3} in items.pipeline
+    assert items.pipeline[-1] == {"$project": {"_id": 0, "itemName": "$_id", "order_count": 1}}
+
+    spending = match_template("Which supplier received the most money in 2014?")
+    assert spending.slots["group_field"] == "supplierName"
+    assert {"$sort": {"total_spending": -1}} in spending.pipeline
+    assert {"$limit": 1} in spending.pipeline
+
+    quarters = match_template("Identification of the quarter with the highest spending.")
+    assert quarters.name == "spend_by_quarter"
+
+
+def test_unsupported_questions_fall_back_to_the_llm():
+    assert match_template("How many orders did the Department of Corrections place in 2013?") is None
+    assert match_template("What is the average unit price?") is None
+    assert match_template("Orders in 2013 and 2014") is None
+
+
+def test_years_outside_the_data_fall_back_to_the_llm():
+    # The year is neither a period nor a limit.
+    assert match_template("Top 5 suppliers by spend in 1999") is None
+    assert match_template("How many orders in 2016") is None
+    assert match_template("Total spending in 2011") is None
+    assert match_template("Total spending from 2011 to 2013") is None
+    assert match_template("Total spending from 2012 to 2015") is not None
+
+
+def test_rendered_template_is_evaluated_and_skips_validation():
+    template = match_template("Total spending grouped by acquisition type in 2013")
+    generated_query = render_pipeline(template.pipeline)
+    assert eval_mongodb_query(generated_query) == template.pipeline
+
+    state = {"current_route": ANALYTICS_AGENT, "generated_query": generated_query}
+    assert analytics_routing({**state, "query_trusted": True}) == EXECUTION_AGENT
+    assert analytics_routing({**state, "query_trusted": False}) == VALIDATION_AGENT
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+from bson import Decimal128, ObjectId
+from langchain_core.messages import HumanMessage
+
+from graph.agents.execution_agent import execution_agent
+from graph.result_renderer import ResultRenderer, format_value
+
+
+def test_formats_bson_values():
+    assert format_value(Decimal128("1234567.891")) == "1,234,567.89"
+    assert format_value(2500.0) == "2,500"
+    assert format_value(datetime.datetime(2013, 3, 1)) == "2013-03-01"
+    assert format_value(datetime.datetime(2013, 3, 1, 9, 30)) == "2013-03-01 09:30:00"
+    assert format_value(ObjectId("5f1d7f1e9b1e8b3a4c8b4567")) == "5f1d7f1e9b1e8b3a4c8b4567"
+    assert format_value(None) == ""
+
+
+def test_renders_scalars_tables_and_large_results():
+    renderer = ResultRenderer(max_rows=2, summary_rows=1)
+
+    assert renderer.render([{"total_orders": 11}]) == "**Total orders:** 11"
+    assert renderer.render([]) == "No matching records were found."
+
+    rows = [
+        {"_id": {"year": 2013, "supplierName": "A|B"}, "totalSpent": 1500.5},
+        {"_id": {"year": 2013, "supplierName": "C"}, "totalSpent": 500},
+        {"_id": {"year": 2014, "supplierName": "D"}, "totalSpent": 1000},
+    ]
+    rendered = renderer.render(rows)
+    assert "| Year | Supplier name | Total spent |" in rendered
+    assert "| 2013 | A\\|B | 1,500.50 |" in rendered
+    assert "| D |" not in rendered
+    assert "Showing the first 2 of 3 rows." in rendered
+    assert "Total spent: total 3,000.50, average 1,000.17, min 500, max 1,500.50" in rendered
+
+    summary = renderer.summarize(rows)
+    assert summary.startswith("The query returned 3 rows")
+    assert "| C |" not in summary
+    assert "Total spent: total 3,000.50" in summary
+
+
+def test_labels_results_cut_by_the_query_limit():
+    renderer = ResultRenderer(max_rows=2, summary_rows=1)
+    rows = [{"_id": "A", "totalSpent": 1500.5}, {"_id": "B", "totalSpent": 500}, {"_id": "C", "totalSpent": 100}]
+
+    rendered = renderer.render(rows, truncated=True)
+    assert "Showing the first 2 of at least 4 rows." in rendered
+    assert "Summary of the 3 returned rows only:" in rendered
+    assert "Showing the first 2 of at least 3 rows." in renderer.render(rows[:2], truncated=True)
+
+    summary = renderer.summarize(rows, truncated=True)
+    assert summary.startswith("The query returned the first 3 of at least 4 rows")
+    assert "Statistics of the 3 returned rows only:" in summary
+
+
+class FakeMongo:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def aggregate_orders(self, pipeline):
+        return self.rows, False
+
+
+@pytest.mark.asyncio
+async def test_execution_agent_answers_or_summarizes():
+    renderer = ResultRenderer()
+    mongo = FakeMongo([{"_id": "paper", "order_count": 4}, {"_id": "pens", "order_count": 2}])
+    state = {"messages": [], "generated_query": "[{'$limit': 2}]"}
+
+    state["messages"] = [HumanMessage(content="Top line items in 2013")]
+    result = await execution_agent(state, {}, mongo, renderer=renderer)
+    assert result["result_rendered"]
+    assert "| paper | 4 |" in result["messages"][0].content
+
+    state["messages"] = [HumanMessage(content="Explain why paper is ordered the most")]
+    result = await execution_agent(state, {}, mongo, renderer=renderer)
+    assert not result["result_rendered"]
+    assert "The query returned 2 rows" in result["messages"][0].content
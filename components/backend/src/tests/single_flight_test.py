@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from graph.graph_state import ANALYTICS_AGENT, AgentState
+from services.conversation_service import ConversationService
+from services.single_flight import SingleFlight, normalize_question, pipeline_hash
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_results_and_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", compute) for _ in range(3)))
+    assert results == [("result", False), ("result", True), ("result", True)]
+    assert len(calls) == 1 and len(flight) == 0
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    outcomes = await asyncio.gather(
+        flight.do("key", fail), flight.do("key", fail), return_exceptions=True
+    )
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_follower_takes_over_a_cancelled_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    leader = asyncio.create_task(flight.do("key", compute))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ("result", False)
+    assert leader.cancelled() and len(calls) == 2 and len(flight) == 0
+
+
+def test_keys():
+    assert normalize_question("Total orders in 2013?") == normalize_question("total  ORDERS in 2013")
+    pipeline = [{"$match": {"creationDate": {"$gte": datetime.datetime(2013, 1, 1)}}}]
+    other = [{"$match": {"creationDate": {"$gte": datetime.datetime(2014, 1, 1)}}}]
+    assert pipeline_hash(pipeline) == pipeline_hash(list(pipeline))
+    assert pipeline_hash(pipeline) != pipeline_hash(other)
+
+
+@pytest.mark.asyncio
+async def test_identical_questions_share_one_graph_run():
+    runs = []
+
+    async def analytics_agent(state: AgentState):
+        runs.append(state["messages"][-1].content)
+        await asyncio.sleep(0.01)
+        return {
+            "messages": [AIMessage(content="There were 11 orders.", name=ANALYTICS_AGENT)],
+            "generated_query": "[{'$count': 'total_orders'}]",
+        }
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_edge(ANALYTICS_AGENT, END)
+    graph = builder.compile(checkpointer=MemorySaver())
+    service = ConversationService(graph, SingleFlight())
+
+    answers = await asyncio.gather(
+        service.standard_response("How many orders in 2013?", "thread-1"),
+        service.standard_response("how many orders in 2013", "thread-2"),
+    )
+
+    assert answers == ["There were 11 orders.", "There were 11 orders."]
+    assert len(runs) == 1
+    shared = await graph.aget_state({"configurable": {"thread_id": "thread-2"}})
+    assert [message.content for message in shared.values["messages"]] == [
+        "how many orders in 2013",
+        "There were 11 orders.",
+    ]
+    assert shared.values["generated_query"] == "[{'$count': 'total_orders'}]"
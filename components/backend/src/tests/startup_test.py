@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi.testclient import TestClient
+
+from app import app
+
+
+def test_importing_the_graph_does_not_create_the_llm():
+    code = (
+        "import app, graph.llm\n"
+        "assert graph.llm.get_config.cache_info().currsize == 0\n"
+        "assert graph.llm.get_llm.cache_info().currsize == 0\n"
+        "assert graph.llm.get_gateway.cache_info().currsize == 0\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, env={"AZURE_API_KEY": "x"})
+
+
+def test_ready_waits_for_warm_up_and_mongo():
+    client = TestClient(app)
+    mongo_client = MagicMock(name="MongoDBService")
+    mongo_client.ping = AsyncMock(return_value=True)
+    app.state.mongo_client = mongo_client
+
+    app.state.ready = False
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"] == {"warm": False, "mongo": True}
+
+    app.state.ready = True
+    assert client.get("/ready").status_code == 200
+
+    mongo_client.ping.return_value = False
+    assert client.get("/ready").status_code == 503
+    app.state.ready = False
@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+from bson import Decimal128, ObjectId
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from graph.agents.execution_agent import execution_agent
+from graph.graph_state import ANALYTICS_AGENT, EXECUTION_AGENT, AgentState
+from graph.result_renderer import ResultRenderer, describe_columns
+from routes.responses import BSONJSONResponse
+from services.conversation_service import ConversationService
+from services.single_flight import SingleFlight
+
+ROWS = [
+    {"_id": {"year": 2013, "supplier": "grainger"}, "spend": 1250.5, "first": datetime.datetime(2013, 2, 1)},
+    {"_id": {"year": 2014, "supplier": "office depot"}, "spend": 80, "first": datetime.datetime(2014, 1, 3)},
+    {"_id": {"year": 2014, "supplier": "staples"}, "spend": 12.25, "first": None},
+]
+
+
+class MongoClient:
+    default_limit = None
+    truncated = False
+
+    async def aggregate_orders(self, pipeline):
+        return ROWS, self.truncated
+
+
+def build_service(mongo_client=None, single_flight=None):
+    mongo_client = mongo_client or MongoClient()
+
+    async def analytics_agent(state: AgentState):
+        await asyncio.sleep(0.01)
+        if "spend" not in state["messages"][-1].content.lower():
+            return {"messages": [AIMessage(content="Hello!", name=ANALYTICS_AGENT)], "current_route": END}
+        return {"generated_query": "[{'$group': {'_id': '$supplierName'}}]", "current_route": EXECUTION_AGENT}
+
+    async def run_query(state: AgentState, config):
+        return await execution_agent(state, config, mongo_client, renderer=ResultRenderer())
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_node(EXECUTION_AGENT, run_query)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_conditional_edges(ANALYTICS_AGENT, lambda state: state["current_route"], [EXECUTION_AGENT, END])
+    builder.add_edge(EXECUTION_AGENT, END)
+    return ConversationService(builder.compile(checkpointer=MemorySaver()), single_flight)
+
+
+def test_describe_columns_merges_numeric_types():
+    rows = [{"year": 2013, "spend": 1.5, "note": None, "id": ObjectId()}, {"year": 2014, "spend": 3, "id": "x"}]
+
+    assert describe_columns(rows) == [
+        {"name": "year", "label": "Year", "type": "integer"},
+        {"name": "spend", "label": "Spend", "type": "number"},
+        {"name": "note", "label": "Note", "type": "null"},
+        {"name": "id", "label": "Id", "type": "mixed"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_includes_only_the_results_of_the_turn():
+    service = build_service()
+
+    answer = await service.structured_response("Spend per supplier and year", "thread-1", max_rows=2)
+    follow_up = await service.structured_response("Thanks", "thread-1", max_rows=2)
+
+    result = answer["result"]
+    assert [row["supplier"] for row in result["rows"]] == ["grainger", "office depot"]
+    assert result["row_count"] == 3 and result["truncated"]
+    assert result["source"] == "mongo" and len(result["pipeline_hash"]) == 40
+    assert [column["type"] for column in result["columns"]] == ["integer", "string", "number", "datetime"]
+    assert set(answer["timings"]) == {"total_ms", "execution_ms"}
+    assert "result" not in follow_up and follow_up["bot_response"] == "Hello!"
+
+
+@pytest.mark.asyncio
+async def test_reports_results_cut_by_the_query_limit():
+    mongo_client = MongoClient()
+    mongo_client.truncated = True
+    service = build_service(mongo_client)
+
+    answer = await service.structured_response("Spend per supplier and year", "thread-1", max_rows=10)
+
+    assert answer["result"]["row_count"] == 3 and answer["result"]["truncated"]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_questions_both_include_the_results():
+    service = build_service(single_flight=SingleFlight())
+
+    first, follower = await asyncio.gather(
+        service.structured_response("Spend per supplier and year", "thread-1", max_rows=10),
+        service.structured_response("spend per supplier and year", "thread-2", max_rows=10),
+    )
+
+    assert first["result"]["row_count"] == follower["result"]["row_count"] == 3
+    assert follower["result"]["pipeline_hash"] == first["result"]["pipeline_hash"]
+
+
+def test_response_serializes_bson_values():
+    object_id = ObjectId()
+
+    body = BSONJSONResponse({"rows": [{"_id": object_id, "spend": Decimal128("12.25"), "at": datetime.datetime(2013, 2, 1)}]}).body
+
+    assert json.loads(body) == {"rows": [{"_id": str(object_id), "spend": 12.25, "at": "2013-02-01T00:00:00"}]}
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableBinding
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from prometheus_client import REGISTRY
+
+from graph.fake_llm import FakeChatModel
+from graph.graph_state import ANALYTICS_AGENT, AgentState
+from services import tracing
+from services.conversation_service import ConversationService
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_under_the_turn(caplog):
+    model = FakeChatModel()
+
+    async def analytics_agent(state: AgentState):
+        answer = await model.ainvoke(state["messages"])
+        with tracing.span("mongo", "aggregate") as aggregation:
+            aggregation.set(rows=3)
+        tracing.record_cache("question_flight", False)
+        return {"messages": [AIMessage(content=answer.content, name=ANALYTICS_AGENT)]}
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_edge(ANALYTICS_AGENT, END)
+    graph = builder.compile(checkpointer=MemorySaver()).with_config(
+        callbacks=[tracing.TracingHandler([ANALYTICS_AGENT])]
+    )
+
+    def node_count():
+        return REGISTRY.get_sample_value(
+            "assistant_span_duration_seconds_count",
+            {"kind": "node", "name": ANALYTICS_AGENT, "status": "ok"},
+        ) or 0
+
+    before = node_count()
+    tracing.configure(1.0)
+    try:
+        with caplog.at_level(logging.INFO, logger="assistant.events"):
+            with tracing.span("turn", "chat") as turn:
+                await graph.ainvoke(
+                    {"messages": [HumanMessage(content="Hi")]},
+                    {"configurable": {"thread_id": "thread-1"}},
+                )
+    finally:
+        tracing.configure(0.1)
+
+    assert node_count() == before + 1
+    spans = {
+        event["kind"]: event
+        for event in (json.loads(record.getMessage()) for record in caplog.records)
+    }
+    assert set(spans) == {"turn", "node", "llm", "mongo"}
+    assert {span["trace_id"] for span in spans.values()} == {turn.trace_id}
+    assert spans["node"]["parent_id"] == turn.span_id
+    assert spans["llm"]["parent_id"] == spans["node"]["span_id"]
+    assert spans["llm"]["input_tokens"] > 0
+    assert spans["mongo"]["rows"] == 3
+    assert spans["turn"]["question_flight_hit"] is False
+
+
+@pytest.mark.asyncio
+async def test_stream_span_ends_when_closed_from_another_context():
+    async def analytics_agent(state: AgentState):
+        return {"messages": [AIMessage(content="Hello!", name=ANALYTICS_AGENT)]}
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_edge(ANALYTICS_AGENT, END)
+    service = ConversationService(builder.compile(checkpointer=MemorySaver()))
+
+    def stream_count():
+        return REGISTRY.get_sample_value(
+            "assistant_span_duration_seconds_count",
+            {"kind": "turn", "name": "chat_stream", "status": "ok"},
+        ) or 0
+
+    before = stream_count()
+    stream = service.stream_response("Hi", "thread-1")
+    assert (await stream.__anext__())["event"] == "node_start"
+    # A client disconnecting closes the stream from another task than the one iterating it.
+    await asyncio.create_task(stream.aclose())
+
+    assert stream_count() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_stream_turn_is_not_left_current(caplog):
+    async def analytics_agent(state: AgentState):
+        return {"messages": [AIMessage(content="Hello!", name=ANALYTICS_AGENT)]}
+
+    builder = StateGraph(AgentState)
+    builder.add_node(ANALYTICS_AGENT, analytics_agent)
+    builder.add_edge(START, ANALYTICS_AGENT)
+    builder.add_edge(ANALYTICS_AGENT, END)
+    graph = RunnableBinding(
+        bound=builder.compile(checkpointer=MemorySaver()),
+        config={"callbacks": [tracing.TracingHandler([ANALYTICS_AGENT])]},
+    )
+    service = ConversationService(graph)
+
+    tracing.configure(1.0)
+    try:
+        with caplog.at_level(logging.INFO, logger="assistant.events"):
+            async for event in service.stream_response("Hi", "thread-1"):
+                assert tracing.current_span.get() is None
+    finally:
+        tracing.configure(0.1)
+
+    assert event["event"] == "final"
+    assert tracing.current_span.get() is None
+    spans = {
+        event["kind"]: event
+        for event in (json.loads(record.getMessage()) for record in caplog.records)
+    }
+    assert spans["node"]["parent_id"] == spans["turn"]["span_id"]
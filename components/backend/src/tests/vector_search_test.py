@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from services.vector_search import VectorSearchService
+from tests.entity_resolver_test import FlatIndex, embed
+
+
+class CountingIndex(FlatIndex):
+    def __init__(self, vectors):
+        super().__init__(vectors)
+        self.calls = []
+
+    def search(self, queries, k):
+        self.calls.append(len(queries))
+        return super().search(queries, k)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_share_one_index_call_and_cached_embeddings():
+    values = ["office chairs", "paper", "grainger"]
+    index = CountingIndex(embed(values))
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    search = VectorSearchService(index, counting_embed, max_wait_ms=20)
+
+    results = await asyncio.gather(
+        search.search(["paper"], 1), search.search(["office chair", "grainger"], 2)
+    )
+
+    assert index.calls == [3]
+    assert [values[i] for i in results[0][1][:, 0]] == ["paper"]
+    assert [values[i] for i in results[1][1][:, 0]] == ["office chairs", "grainger"]
+    assert results[1][1].shape == (2, 2)
+
+    await search.search(["paper"], 1)
+    assert embedded == ["paper", "office chair", "grainger"]
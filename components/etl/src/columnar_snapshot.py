@@ -0,0 +1,59 @@
+import logging
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# CSV column -> field path and type of the line items snapshot loaded by the backend's columnar engine.
+SNAPSHOT_COLUMNS = {
+    "Creation Date": ("creationDate", pa.timestamp("ms")),
+    "Purchase Date": ("purchaseDate", pa.timestamp("ms")),
+    "Fiscal Year": ("fiscalYear", pa.string()),
+    "Department Name": ("departmentName", pa.string()),
+    "Supplier Name": ("supplierName", pa.string()),
+    "Acquisition Type": ("acquisitionType", pa.string()),
+    "Acquisition Method": ("acquisitionMethod", pa.string()),
+    "Item Name": ("lineItems.itemName", pa.string()),
+    "Commodity Title": ("lineItems.commodityTitle", pa.string()),
+    "Quantity": ("lineItems.quantity", pa.float64()),
+    "Unit Price": ("lineItems.unitPrice", pa.float64()),
+    "Total Price": ("lineItems.totalPrice", pa.float64()),
+}
+
+
+class ParquetSnapshotWriter:
+    """
+    Writes the transformed line items to a Parquet file, one row group per chunk, so that the
+    snapshot is built as the chunks are loaded without holding the dataset in memory.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or Path(__file__).resolve().parent / "columnar" / "line_items.parquet"
+        self.schema = pa.schema([(field, kind) for field, kind in SNAPSHOT_COLUMNS.values()])
+        self.writer: Optional[pq.ParquetWriter] = None
+        self.rows = 0
+
+    def write_chunk(self, df: pd.DataFrame) -> None:
+        """
+        Appends a transformed chunk to the snapshot.
+        """
+        if self.writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        frame = pd.DataFrame(
+            {field: df[column] for column, (field, _) in SNAPSHOT_COLUMNS.items()}
+        )
+        for field, kind in SNAPSHOT_COLUMNS.values():
+            if pa.types.is_timestamp(kind):
+                frame[field] = pd.to_datetime(frame[field], errors="coerce")
+        self.writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+        self.rows += len(frame)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            logger.info(f"Wrote {self.rows} line items to {self.path}")
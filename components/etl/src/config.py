@@ -24,6 +24,17 @@ class Embedding(BaseSettings):
     )
 
 
+class Sampling(BaseSettings):
+    """
+    Stratified sample of the orders for the backend's approximate queries.
+    """
+
+    COLLECTION: str = Field(default="OrdersSample", alias="APPROXIMATE_SAMPLE_COLLECTION")
+    FRACTION: float = Field(default=0.05, alias="SAMPLE_FRACTION")
+    MIN_PER_STRATUM: int = Field(default=100, alias="SAMPLE_MIN_PER_STRATUM")
+
+
 class Config(BaseSettings):
     mongodb: MongoDB = Field(default_factory=MongoDB)
     embedding: Embedding = Field(default_factory=Embedding)
+    sampling: Sampling = Field(default_factory=Sampling)
@@ -1,14 +1,25 @@
 import asyncio
 from pathlib import Path
+from typing import Dict, Optional, Set
 
+from columnar_snapshot import ParquetSnapshotWriter
 from extractor import CSVDataExtractor
 from mongodb_loader import MongoDBLoader
 from vector_store import FaissVectorDB
 from transformer import DataTransformer
-from config import Config
+from config import Config, Sampling
 from langchain_huggingface import HuggingFaceEmbeddings
 
 
+# CSV column -> field path of the values indexed for entity resolution.
+ENTITY_COLUMNS = {
+    "Supplier Name": "supplierName",
+    "Department Name": "departmentName",
+    "Item Name": "lineItems.itemName",
+    "Commodity Title": "lineItems.commodityTitle",
+}
+
+
 class ETLProcess:
     """
     Orchestrates the ETL pipeline: extract from CSV, transform, load into MongoDB and FAISS.
@@ -20,11 +31,15 @@ class ETLProcess:
         transformer: DataTransformer,
         mongodb_loader: MongoDBLoader,
         faiss_vectordb: FaissVectorDB,
+        sampling: Optional[Sampling] = None,
+        snapshot_writer: Optional[ParquetSnapshotWriter] = None,
     ):
         self.extractor = extractor
         self.transformer = transformer
         self.mongodb_loader = mongodb_loader
         self.faiss_vectordb = faiss_vectordb
+        self.sampling = sampling
+        self.snapshot_writer = snapshot_writer
 
     async def run(self, clear_existing: bool = True):
         """
@@ -40,10 +55,29 @@ class ETLProcess:
             self.faiss_vectordb.clear_indexes()
 
         print("Starting ETL process...")
+        entities: Dict[str, Set[str]] = {field: set() for field in ENTITY_COLUMNS.values()}
         for i, chunk_df in enumerate(self.extractor.extract_data(), start=1):
             print(f"Processing batch {i}...")
             transformed_df = self.transformer.transform_chunk(chunk_df)
+            for column, field in ENTITY_COLUMNS.items():
+                entities[field].update(transformed_df[column].dropna())
             await self.mongodb_loader.insert_documents(transformed_df)
+            if self.snapshot_writer is not None:
+                self.snapshot_writer.write_chunk(transformed_df)
+
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.close()
+
+        print("Indexing entity values...")
+        await self.faiss_vectordb.index_entities(entities)
+
+        if self.sampling is not None:
+            print("Building the stratified sample...")
+            await self.mongodb_loader.build_stratified_sample(
+                self.sampling.COLLECTION,
+                self.sampling.FRACTION,
+                min_per_stratum=self.sampling.MIN_PER_STRATUM,
+            )
         print("ETL process complete!")
 
         await self.mongodb_loader.close_connection()
@@ -55,9 +89,10 @@ async def main():
 
     extractor = CSVDataExtractor(csv_file=data_file, chunk_size=100)
     print("Loading HuggingFace Embedding model...")
-    model_name = "sentence-transformers/all-mpnet-base-v2"
+    model_name = config.embedding.EMBEDDING_MODEL
     model_kwargs = {"device": "cpu"}
-    encode_kwargs = {"normalize_embeddings": False}
+    # Unit vectors make the L2 distances of the index equivalent to cosine similarities.
+    encode_kwargs = {"normalize_embeddings": True}
     embeddings = HuggingFaceEmbeddings(
         model_name=model_name,
         model_kwargs=model_kwargs,
@@ -82,7 +117,14 @@ async def main():
         vectordb=faiss_vectordb,
     )
 
-    etl = ETLProcess(extractor, transformer, mongodb_loader, faiss_vectordb)
+    etl = ETLProcess(
+        extractor,
+        transformer,
+        mongodb_loader,
+        faiss_vectordb,
+        config.sampling,
+        ParquetSnapshotWriter(),
+    )
     await etl.run(clear_existing=True)
 
 
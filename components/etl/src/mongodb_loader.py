@@ -203,6 +203,55 @@ class MongoDBLoader:
                 f"Failed to insert documents into MongoDB or vector DB: {e}"
             )
 
+    async def build_stratified_sample(
+        self,
+        sample_collection: str,
+        fraction: float,
+        stratum_field: str = "fiscalYear",
+        min_per_stratum: int = 100,
+    ) -> None:
+        """
+        Draws a stratified random sample of the orders for approximate queries. Each stratum,
+        a value of `stratum_field`, is sampled in proportion to its size with at least
+        `min_per_stratum` orders. Sampled orders carry their stratum as `_stratum` and the
+        number of orders they stand for as `_weight`, and the size of each stratum and of its
+        sample is stored in `<sample_collection>Strata`.
+
+        Args:
+            sample_collection (str): Name of the sample collection, replaced if it exists.
+            fraction (float): Fraction of each stratum to sample.
+            stratum_field (str): Order field defining the strata.
+            min_per_stratum (int): Smallest sample of a stratum, or the whole stratum if smaller.
+        """
+        orders = self.db[self.orders_collection]
+        strata_collection = self.db[f"{sample_collection}Strata"]
+        await self.db[sample_collection].drop()
+        await strata_collection.drop()
+
+        strata = await orders.aggregate(
+            [{"$group": {"_id": f"${stratum_field}", "population": {"$sum": 1}}}]
+        ).to_list(None)
+        for stratum in strata:
+            population = stratum["population"]
+            sampled = min(population, max(min_per_stratum, round(population * fraction)))
+            await orders.aggregate(
+                [
+                    {"$match": {stratum_field: stratum["_id"]}},
+                    {"$sample": {"size": sampled}},
+                    {
+                        "$addFields": {
+                            "_stratum": stratum["_id"],
+                            "_weight": population / sampled,
+                        }
+                    },
+                    {"$merge": {"into": sample_collection}},
+                ]
+            ).to_list(None)
+            await strata_collection.insert_one(
+                {"_id": stratum["_id"], "population": population, "sampled": sampled}
+            )
+        logger.info(f"Built the {sample_collection} sample over {len(strata)} strata.")
+
     async def close_connection(self) -> None:
         """
         Closes the MongoDB connection.
@@ -1,7 +1,11 @@
+import asyncio
 import logging
 import shutil
 from pathlib import Path
+from typing import Dict, Set
+from uuid import uuid4
 import faiss
+from langchain_core.documents import Document
 from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
@@ -30,14 +34,15 @@ class FaissVectorDB:
 
     async def search(self, query: str, top_k: int, source: str):
         """
-        Search for the top-k similar embeddings in the specified FAISS index.
+        Search for the top-k documents of `source` most similar to the query, with their L2
+        distance. Embedding and index search run on a worker thread.
         """
-        retriever = self.vector_store.as_retriever(
-            search_type="similarity_score_threshold", search_kwargs={"k": top_k}
+        return await asyncio.to_thread(
+            self.vector_store.similarity_search_with_score,
+            query,
+            k=top_k,
+            filter={"source": source},
         )
-        res = await retriever.ainvoke(query, filter={"source": source})
-
-        return res
 
     async def add_documents_in_batches(self, documents, ids, batch_size=200):
         """
@@ -56,6 +61,25 @@ class FaissVectorDB:
             except Exception as e:
                 print(f"Error during aadd_documents: {e}")
             
+    async def index_entities(self, entities: Dict[str, Set[str]], batch_size: int = 200):
+        """
+        Indexes each distinct value of the entity fields once, with the field path as `source`,
+        for the backend to resolve the names mentioned in questions.
+
+        :param entities: Field path to its distinct values.
+        :param batch_size: The size of each batch.
+        """
+        documents = [
+            Document(page_content=value, metadata={"source": field})
+            for field, values in entities.items()
+            for value in sorted(values)
+            if value
+        ]
+        ids = [str(uuid4()) for _ in documents]
+        logger.info(f"Indexing {len(documents)} entity values...")
+        await self.add_documents_in_batches(documents, ids, batch_size)
+        self.save_indexes()
+
     def save_indexes(self):
         self.vector_store.save_local(self.vector_store_path)
 